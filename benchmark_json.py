@@ -0,0 +1,123 @@
+"""Expense list encoding: dicts vs ExpenseRecord vs columnar, stdlib json vs orjson.
+
+    python benchmark_json.py --rows 10000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+warnings.filterwarnings('ignore')
+
+from records import ExpenseRecord, to_columns
+import fastjson
+
+WORDS = ['swiggy', 'uber', 'amazon', 'netflix', 'rent', 'groceries', 'coffee', 'lunch', 'petrol']
+MERCHANTS = ['Big Bazaar', 'DMart', 'Starbucks', 'Shell', 'Apollo Pharmacy', 'PVR Cinemas', '']
+LOCATIONS = ['Bangalore', 'Mumbai', 'Delhi', 'Pune', '']
+
+
+def populate(db_path, rows, user_id=1):
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO expenses (date, time, amount, description, category_id, subcategory,
+                              payment_method, merchant, location, is_essential, user_id)
+        VALUES (?, ?, ?, ?, (SELECT id FROM categories WHERE user_id = ?11 AND name = ?5),
+                ?6, ?7, ?8, ?9, ?10, ?11)
+    ''', [(
+        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+        round(rng.uniform(10, 5000), 2), ' '.join(rng.sample(WORDS, 2)),
+        rng.choice(['Food', 'Transport', 'Bills', 'Shopping']), None, rng.choice(['UPI', 'Card', None]),
+        rng.choice(MERCHANTS), rng.choice(LOCATIONS), rng.randint(0, 1), user_id
+    ) for _ in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_dicts(rows):
+    # What get_expenses_list returned before: one 11-key dict per row
+    return [{
+        'id': row[0], 'date': row[1], 'time': row[2], 'amount': row[3], 'description': row[4],
+        'category': row[5], 'subcategory': row[6] or '', 'payment_method': row[7] or 'Cash',
+        'merchant': row[8] or '', 'location': row[9] or '', 'is_essential': row[10] or 0
+    } for row in rows]
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=fastjson.default, sort_keys=True, separators=(',', ':')).encode()
+
+
+def orjson_dumps(obj):
+    return fastjson.orjson.dumps(obj, default=fastjson.default, option=fastjson.orjson.OPT_SORT_KEYS)
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    body = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='expense-json-')
+    os.chdir(workdir)
+    from app import app, db
+    populate(db.db_path, args.rows)
+
+    rows = db._expense_list_rows(1, args.rows)
+    print(f"{len(rows):,} rows, orjson {'available' if fastjson.orjson else 'not installed'}\n")
+
+    variants = [
+        ('dicts + json', lambda: stdlib_dumps(legacy_dicts(rows))),
+        ('records + json', lambda: stdlib_dumps(ExpenseRecord.from_rows(rows))),
+        ('columnar + json', lambda: stdlib_dumps(to_columns(rows)))
+    ]
+    if fastjson.orjson:
+        variants += [
+            ('dicts + orjson', lambda: orjson_dumps(legacy_dicts(rows))),
+            ('records + orjson', lambda: orjson_dumps(ExpenseRecord.from_rows(rows))),
+            ('columnar + orjson', lambda: orjson_dumps(to_columns(rows)))
+        ]
+
+    print(f"{'build + encode':<20} {'median ms':>10} {'peak KiB':>10} {'body KiB':>10}")
+    for name, fn in variants:
+        ms, peak, size = measure(fn, args.repeat)
+        print(f"{name:<20} {ms:>10.2f} {peak / 1024:>10,.0f} {size / 1024:>10,.0f}")
+
+    # Whole request through Flask (query, records/columns, jsonify); no compression
+    client = app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    headers = {'Accept-Encoding': 'identity'}
+    print(f"\n{'GET /api/expenses':<34} {'median ms':>10} {'body KiB':>10}")
+    for backend in (['stdlib', 'orjson'] if fastjson.orjson else ['stdlib']):
+        app.json.backend = backend
+        for fmt in ('', '&format=columnar'):
+            url = f'/api/expenses?limit={args.rows}{fmt}'
+            ms, _, size = measure(lambda: client.get(url, headers=headers).get_data(), args.repeat)
+            print(f"{backend + (' columnar' if fmt else ' objects'):<34} {ms:>10.2f} {size / 1024:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Expense classifier: sklearn pickle vs compiled NumPy tree (import time, prediction latency, parity).
+
+    python src/compiled_model.py export
+    python benchmark_model.py --rows 10000
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from pathlib import Path
+
+SRC = Path(__file__).parent / 'src'
+sys.path.insert(0, str(SRC))
+warnings.filterwarnings('ignore')
+
+from compiled_model import COMPILED_PATH, CompiledTree, parity_frame, verify
+from predict import MODEL_PATH
+
+LOAD_PICKLE = f"import joblib; joblib.load({MODEL_PATH!r})"
+LOAD_COMPILED = (f"import sys; sys.path.insert(0, {str(SRC)!r}); "
+                 f"from compiled_model import CompiledTree; CompiledTree({COMPILED_PATH!r})")
+
+
+def cold_start_ms(code, repeat):
+    """Median wall time of a fresh interpreter running `code`, minus an empty one"""
+    def run(source):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-W', 'ignore', '-c', source], check=True)
+        return (time.perf_counter() - started) * 1000
+    return statistics.median(run(code) for _ in range(repeat)) - statistics.median(run('pass') for _ in range(repeat))
+
+
+def per_call_us(fn, items):
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--single', type=int, default=500, help='rows predicted one at a time')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', nargs='*', default=['data/user_expenses.db'])
+    args = parser.parse_args()
+
+    import joblib
+    pipeline = joblib.load(MODEL_PATH)
+    compiled = CompiledTree()
+    frame = parity_frame(compiled, args.db, rows=args.rows)
+
+    mismatches = verify(pipeline, compiled, frame)
+    print(f"parity: {len(frame) - len(mismatches):,} of {len(frame):,} predictions identical\n")
+
+    print(f"{'load in a new process':<28} {'ms':>10}")
+    print(f"{'pickle (joblib + sklearn)':<28} {cold_start_ms(LOAD_PICKLE, args.repeat):>10.1f}")
+    print(f"{'compiled (numpy)':<28} {cold_start_ms(LOAD_COMPILED, args.repeat):>10.1f}")
+
+    records = frame.head(args.single).to_dict('records')
+    single_frames = [frame.iloc[[i]] for i in range(min(args.single, len(frame)))]
+    print(f"\n{'prediction':<28} {'us / row':>10}")
+    print(f"{'pipeline, one row':<28} {per_call_us(pipeline.predict, single_frames):>10.1f}")
+    print(f"{'compiled, one row':<28} {per_call_us(compiled.predict_one, records):>10.2f}")
+    for name, fn in (('pipeline', pipeline.predict), ('compiled', compiled.predict)):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fn(frame)
+            samples.append(time.perf_counter() - started)
+        print(f"{name + f', {len(frame):,} rows':<28} {statistics.median(samples) / len(frame) * 1e6:>10.2f}")
+
+    if len(mismatches):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
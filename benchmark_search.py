@@ -0,0 +1,113 @@
+"""Search latency at scale: FTS5 index vs LIKE scans.
+
+    python benchmark_search.py --rows 2000000 --users 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+import search
+
+WORDS = ['swiggy', 'zomato', 'uber', 'ola', 'amazon', 'flipkart', 'netflix', 'spotify', 'rent',
+         'electricity', 'water', 'internet', 'groceries', 'coffee', 'lunch', 'dinner', 'petrol',
+         'pharmacy', 'gym', 'movie', 'books', 'shoes', 'insurance', 'school', 'taxi', 'metro']
+MERCHANTS = ['Big Bazaar', 'Reliance Fresh', 'DMart', 'Starbucks', 'Cafe Coffee Day', 'Shell',
+             'Apollo Pharmacy', 'PVR Cinemas', 'Decathlon', 'Croma']
+LOCATIONS = ['Bangalore', 'Mumbai', 'Delhi', 'Chennai', 'Hyderabad', 'Pune', 'Kolkata']
+
+QUERIES = ['coffee', 'swig', '"cafe coffee"', 'petrol shell', 'bang', 'netflix OR spotify']
+
+
+def populate(db_path, rows, users):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute('''
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, time TEXT, amount REAL NOT NULL,
+            category_id INTEGER, description TEXT, payment_method TEXT, merchant TEXT, location TEXT,
+            user_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE TABLE categories (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT)")
+    cursor.execute("CREATE INDEX idx_expenses_user_date ON expenses (user_id, date, time)")
+    search.create_table(cursor)
+
+    rng = random.Random(42)
+    started = time.perf_counter()
+    batch = []
+    for i in range(rows):
+        batch.append((
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", '12:00:00',
+            round(rng.uniform(10, 5000), 2), None,
+            ' '.join(rng.sample(WORDS, rng.randint(1, 3))), 'UPI',
+            rng.choice(MERCHANTS), rng.choice(LOCATIONS), rng.randint(1, users)
+        ))
+        if len(batch) == 50000:
+            cursor.executemany('''
+                INSERT INTO expenses (date, time, amount, category_id, description, payment_method,
+                                      merchant, location, user_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+            batch = []
+    if batch:
+        cursor.executemany('''
+            INSERT INTO expenses (date, time, amount, category_id, description, payment_method,
+                                  merchant, location, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+    search.optimize(cursor)
+    conn.commit()
+    print(f"Inserted {rows:,} expenses for {users:,} users in {time.perf_counter() - started:.1f}s "
+          f"(FTS triggers included)")
+    return conn
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = populate(os.path.join(tmp, 'bench.db'), args.rows, args.users)
+        cursor = conn.cursor()
+        rng = random.Random(7)
+
+        print(f"\n{'query':<22} {'FTS5 p50/p95 ms':>18} {'LIKE (user) p50/p95 ms':>24} {'LIKE (all rows) ms':>20}")
+        for query in QUERIES:
+            fts = timed(lambda: search.search(cursor, rng.randint(1, args.users), query,
+                                              '2024-01-01', '2024-12-31'), args.repeat)
+            like_user = timed(lambda: search.search_like(cursor, rng.randint(1, args.users), query,
+                                                         '2024-01-01', '2024-12-31'), args.repeat)
+            # What a naive unscoped LIKE costs: every row of the table is read
+            term = '%' + query.strip('"').split()[0] + '%'
+            like_all = timed(lambda: cursor.execute(
+                "SELECT COUNT(*) FROM expenses WHERE description LIKE ? OR merchant LIKE ? OR location LIKE ?",
+                (term, term, term)).fetchone(), 3)
+            print(f"{query:<22} {fts[0]:>8.2f} / {fts[1]:<7.2f} {like_user[0]:>12.2f} / {like_user[1]:<9.2f} "
+                  f"{like_all[0]:>18.1f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
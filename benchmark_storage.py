@@ -0,0 +1,154 @@
+"""Expense storage: legacy table vs compact rows (size, page density, cached reads).
+
+    python benchmark_storage.py --rows 200000 --cache-kib 2048
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+warnings.filterwarnings('ignore')
+
+import compact
+from database import ExpenseDatabase
+
+WORDS = ['swiggy', 'uber', 'amazon', 'netflix', 'rent', 'groceries', 'coffee', 'lunch', 'petrol']
+CATEGORIES = ['Food', 'Transport', 'Bills', 'Shopping', 'Entertainment', 'Healthcare']
+MERCHANTS = ['Big Bazaar', 'DMart', 'Starbucks', 'Shell', 'Apollo Pharmacy', 'PVR Cinemas', '']
+
+
+def populate(db_path, rows, users):
+    rng = random.Random(42)
+    data = []
+    for _ in range(rows):
+        day = f"20{rng.randint(22, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        category = rng.choice(CATEGORIES)
+        data.append((
+            day, f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00", round(rng.uniform(10, 5000), 2),
+            ' '.join(rng.sample(WORDS, 2)), category, rng.choice(['UPI', 'Card', 'Cash']),
+            rng.choice(MERCHANTS), rng.randint(0, 1), category, round(rng.random(), 3),
+            rng.randint(1, users)
+        ))
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT OR IGNORE INTO categories (user_id, name) VALUES (?, ?)",
+                     [(user, name) for user in range(1, users + 1) for name in CATEGORIES])
+    # The derived columns as the legacy add path stores them
+    conn.executemany('''
+        INSERT INTO expenses (date, time, amount, description, category_id, payment_method, merchant,
+                              is_essential, predicted_category, confidence, user_id,
+                              is_weekend, is_month_end, day_of_week, month)
+        VALUES (?, ?, ?, ?, (SELECT id FROM categories WHERE user_id = ?11 AND name = ?5),
+                ?6, ?7, ?8, ?9, ?10, ?11,
+                CAST(strftime('%w', ?1) IN ('0', '6') AS INTEGER),
+                CAST(strftime('%d', ?1) AS INTEGER) >= 25,
+                (CAST(strftime('%w', ?1) AS INTEGER) + 6) % 7,
+                CAST(strftime('%m', ?1) AS INTEGER))
+    ''', data)
+    conn.commit()
+    conn.close()
+
+
+def table_sizes(db_path):
+    """Bytes and pages per table/index, from the dbstat virtual table"""
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('''
+            SELECT name, SUM(pgsize), COUNT(*) FROM dbstat
+            WHERE name IN ('expenses', 'idx_expenses_user_date',
+                           'expense_rows', 'idx_expense_rows_user_day', 'expense_labels')
+            GROUP BY name ORDER BY name
+        ''').fetchall()
+
+
+def queries(conn):
+    user_id, first, last = 1, '2024-03-01', '2024-04-01'
+    if compact.is_compact(conn.cursor()):
+        recent = compact.RECENT_ORDER
+        in_month = f"day >= {compact.day_number(first)} AND day < {compact.day_number(last)}"
+    else:
+        recent = 'date DESC, time DESC'
+        in_month = f"date >= '{first}' AND date < '{last}'"
+    return {
+        'recent 50': f'''SELECT id, date, time, amount, description, category_id FROM expenses
+                         WHERE user_id = {user_id} ORDER BY {recent} LIMIT 50''',
+        'month stats': f'''SELECT SUM(amount), COUNT(*), MAX(amount) FROM expenses
+                           WHERE user_id = {user_id} AND {in_month}''',
+        'history': f'''SELECT date, amount, category_id, is_weekend, day_of_week FROM expenses
+                       WHERE user_id = {user_id}'''
+    }
+
+
+def time_queries(db_path, cache_kib, repeat):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA cache_size = -{cache_kib}")
+    timings = {}
+    for name, sql in queries(conn).items():
+        conn.execute(sql).fetchall()  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[name] = statistics.median(samples)
+    conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--cache-kib', type=int, default=2048)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='expense-storage-')
+    legacy_path = os.path.join(workdir, 'legacy.db')
+    compact_path = os.path.join(workdir, 'compact.db')
+    ExpenseDatabase(legacy_path, compact_storage=False)
+    populate(legacy_path, args.rows, args.users)
+    with sqlite3.connect(legacy_path) as conn:
+        conn.execute("VACUUM")
+    shutil.copyfile(legacy_path, compact_path)
+
+    started = time.perf_counter()
+    compact.migrate_file(compact_path)
+    print(f"{args.rows:,} expenses, {args.users} users; migration took {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'':<10} {'file KiB':>10} {'table/index':<28} {'KiB':>8} {'pages':>7} {'rows/page':>10}")
+    pages = {}
+    for label, path in (('legacy', legacy_path), ('compact', compact_path)):
+        print(f"{label:<10} {os.path.getsize(path) / 1024:>10,.0f}")
+        for name, size, count in table_sizes(path):
+            density = f"{args.rows / count:>10.1f}" if name in ('expenses', 'expense_rows') else ''
+            if density:
+                pages[label] = count
+            print(f"{'':<21} {name:<28} {size / 1024:>8,.0f} {count:>7,} {density}")
+
+    # sqlite3 does not expose the pager's hit/miss counters, so the hit rate
+    # of a full scan is estimated from how much of the table fits in the cache
+    page_size = sqlite3.connect(legacy_path).execute("PRAGMA page_size").fetchone()[0]
+    cache_pages = args.cache_kib * 1024 // page_size
+    print(f"\n{args.cache_kib} KiB page cache = {cache_pages:,} pages")
+    for label, count in pages.items():
+        print(f"  {label:<8} table pages cached: {min(1.0, cache_pages / count):>6.1%} "
+              f"({min(args.rows, cache_pages * args.rows // count):,} rows)")
+
+    legacy = time_queries(legacy_path, args.cache_kib, args.repeat)
+    compact_ms = time_queries(compact_path, args.cache_kib, args.repeat)
+    print(f"\n{'query (median ms)':<20} {'legacy':>10} {'compact':>10}")
+    for name in legacy:
+        print(f"{name:<20} {legacy[name]:>10.2f} {compact_ms[name]:>10.2f}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Query plans of the request paths: no full scans of expenses, no sorting for ORDER BY.
+
+Runs the ExpenseDatabase methods behind the API against a populated
+fixture database (both storage layouts, older expenses moved to the
+archive database), records every SQL statement they
+issue (sqlite3 trace callback) and checks its EXPLAIN QUERY PLAN. Exits
+with status 1 when a statement scans the expenses table or sorts rows
+for an ORDER BY in a temporary B-tree, so unindexed queries are caught
+before they are deployed.
+
+    python check_query_plans.py [--rows 50000] [--verbose]
+"""
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import warnings
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+warnings.filterwarnings('ignore')
+
+# Tables that must always be searched through an index. In compact files
+# `expenses` is a view over expense_rows (aliased "r"); a SCAN of the view
+# itself only walks the rows its SEARCH already found.
+EXPENSE_TABLES = ('expenses', 'expense_rows')
+COMPACT_ALIAS = 'r'
+# The fixture spans 2022-2024, so most of it is archived
+ARCHIVE_MONTHS = 24
+_SCAN = re.compile(r'^SCAN (\w+)')
+_ORDER_BY_SORT = re.compile(r'USE TEMP B-TREE FOR (?:\w+ )*ORDER BY')
+
+# Statements worth planning; BEGIN, PRAGMA, CREATE, ... are not
+_PLANNED = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.I)
+
+
+class StatementLog:
+    """Every statement run on any connection, labelled with the method being exercised"""
+
+    def __init__(self):
+        self.method = None
+        self.statements = {}  # {sql: set of methods}
+        self._lock = threading.Lock()
+
+    def __call__(self, sql):
+        # Statements run by triggers are reported as "-- TRIGGER name"
+        if self.method is None or not _PLANNED.match(sql):
+            return
+        with self._lock:
+            self.statements.setdefault(sql.strip(), set()).add(self.method)
+
+    def install(self):
+        """Trace every connection opened from now on (reader, writer and ad hoc ones)"""
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(self)
+            return conn
+        sqlite3.connect = traced_connect
+
+
+def workload(db, user_id):
+    """(method, call) for every method behind a request, in a sensible order"""
+    today = date.today()
+    month_start = today.replace(day=1).isoformat()
+    token = {}
+
+    def login():
+        token['value'] = db.authenticate_user('admin', 'admin123')['user']['session_token']
+
+    def add():
+        token['expense'] = db.add_expense(user_id, {'amount': 250.0, 'description': 'Coffee with team',
+                                                    'merchant': 'Starbucks', 'location': 'Pune'})['expense_id']
+
+    return [
+        ('authenticate_user', login),
+        ('verify_session', lambda: db.verify_session(user_id, token['value'])),
+        ('get_data_version', lambda: db.get_data_version(user_id)),
+        ('add_expense', add),
+        ('get_expenses_list', lambda: db.get_expenses_list(user_id, 50)),
+        ('get_expenses_list (archive)', lambda: db.get_expenses_list(user_id, 5000)),
+        ('get_expenses_columnar', lambda: db.get_expenses_columnar(user_id, 1000)),
+        ('get_monthly_stats', lambda: db.get_monthly_stats(user_id)),
+        ('get_expense_history', lambda: db.get_expense_history(user_id)),
+        ('aggregate', lambda: [db.aggregate(user_id, month_start, today.isoformat(), granularity, group_by)
+                               for granularity in ('day', 'month')
+                               for group_by in (None, 'category', 'payment_method')]),
+        ('aggregate (archive)', lambda: [db.aggregate(user_id, start, today.isoformat(), granularity, group_by)
+                                         for start in ('2022-01-01', '2022-03-15')
+                                         for granularity in ('day', 'month')
+                                         for group_by in (None, 'category')]),
+        ('get_budgets', lambda: db.get_budgets(user_id)),
+        ('set_budget', lambda: db.set_budget(user_id, 'Food', 5000)),
+        ('search_expenses', lambda: db.search_expenses(user_id, 'coffee', limit=20)),
+        ('get_changes', lambda: db.get_changes(user_id, 0, 500)),
+        ('update_expense', lambda: db.update_expense(user_id, token['expense'], {'amount': 300.0})),
+        ('get_recurring', lambda: db.get_recurring(user_id)),
+        ('apply_batch', lambda: db.apply_batch(user_id, [
+            {'op': 'create', 'key': 'plan-check-1', 'expense': {'amount': 99, 'description': 'Uber'}},
+            {'op': 'delete', 'key': 'plan-check-2', 'target_key': 'plan-check-1'}])),
+        ('delete_expense', lambda: db.delete_expense(user_id, token['expense'])),
+        ('rename_category', lambda: db.rename_category(user_id, 'Other', 'Misc')),
+        ('scan_anomalies', lambda: db.scan_anomalies(user_id)),
+    ]
+
+
+def problems(plan, scanned_names):
+    """Plan details that break the rules"""
+    found = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if match and match.group(1) in scanned_names:
+            found.append(detail)
+        elif _ORDER_BY_SORT.search(detail):
+            found.append(detail)
+    return found
+
+
+def check_layout(label, rows, users, log, verbose):
+    import archive
+    from benchmark_storage import populate
+    from database import ExpenseDatabase
+
+    workdir = tempfile.mkdtemp(prefix='expense-plans-')
+    try:
+        db_path = os.path.join(workdir, 'fixture.db')
+        db = ExpenseDatabase(db_path, compact_storage=(label == 'compact'))
+        populate(db_path, rows, users)
+        db.refresh_rollups()
+        db.archive_expenses(ARCHIVE_MONTHS)
+        db.optimize(analyze=True)  # plans as in production, after the ANALYZE job
+
+        log.statements.clear()
+        for method, call in workload(db, user_id=1):
+            log.method = method
+            call()
+        log.method = None
+
+        failures = 0
+        explain = sqlite3.connect(db_path)
+        explain.set_trace_callback(None)
+        archive.attach(explain, db.archive_path)
+        tables = {row[0] for row in explain.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        scanned_names = tables.intersection(EXPENSE_TABLES)
+        if db.compact_storage:
+            scanned_names.add(COMPACT_ALIAS)
+        for sql, methods in sorted(log.statements.items(), key=lambda item: sorted(item[1])):
+            plan = [row[3] for row in explain.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            bad = problems(plan, scanned_names)
+            failures += bool(bad)
+            if bad or verbose:
+                flat = ' '.join(sql.split())
+                print(f"{'FAIL' if bad else 'ok  '} {label:<8} {', '.join(sorted(methods))}: "
+                      f"{flat[:160]}{'...' if len(flat) > 160 else ''}")
+                for detail in plan:
+                    print(f"{'':>14}{'!! ' if detail in bad else '   '}{detail}")
+        explain.close()
+        print(f"{label}: {len(log.statements)} statements, {failures} with a full scan or ORDER BY sort")
+        return failures
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    log = StatementLog()
+    log.install()
+    failures = sum(check_layout(label, args.rows, args.users, log, args.verbose)
+                   for label in ('legacy', 'compact'))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
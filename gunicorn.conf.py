@@ -0,0 +1,31 @@
+# Gunicorn settings for the production launcher (python run.py --prod)
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Pre-forked workers, defaults to one per core
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '2'))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+# Application code is imported in each worker (not the master), so
+# `kill -HUP $(cat data/gunicorn.pid)` reloads it with zero downtime
+preload_app = False
+pidfile = 'data/gunicorn.pid'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Warm DB and templates before the worker starts accepting requests"""
+    from app import warmup
+    warmup()
@@ -0,0 +1,46 @@
+"""Per-page transfer size: first visit (HTML + local static files) and
+repeat visit (HTML only, static files are cached as immutable).
+
+    python measure_transfer.py [--user admin --password admin123]
+"""
+import argparse
+import re
+import sys
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+warnings.filterwarnings('ignore')
+
+PAGES = ['/', '/login', '/register', '/dashboard', '/add', '/analytics']
+ENCODINGS = ['identity', 'gzip', 'br']
+_LOCAL_ASSET = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+
+
+def transfer_size(client, path, encoding):
+    response = client.get(path, headers={'Accept-Encoding': encoding})
+    return len(response.get_data()), response.headers.get('Content-Encoding', 'identity'), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    from app import app
+    client = app.test_client()
+    client.post('/api/login', json={'username': args.user, 'password': args.password})
+
+    print(f"{'page':<12} {'encoding':<9} {'html':>9} {'assets':>9} {'first visit':>12} {'repeat visit':>13}")
+    for page in PAGES:
+        for encoding in ENCODINGS:
+            html_size, used, response = transfer_size(client, page, encoding)
+            identity_html = client.get(page, headers={'Accept-Encoding': 'identity'}).get_data(as_text=True)
+            assets = sum(transfer_size(client, url, encoding)[0]
+                         for url in sorted(set(_LOCAL_ASSET.findall(identity_html))))
+            print(f"{page:<12} {used:<9} {html_size:>9,} {assets:>9,} {html_size + assets:>12,} {html_size:>13,}")
+
+
+if __name__ == '__main__':
+    main()
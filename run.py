@@ -1,11 +1,35 @@
 import os
 import sys
+import argparse
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
+def run_production(workers=None):
+    """Replace this process with a pre-forked gunicorn server"""
+    if workers:
+        os.environ['WEB_CONCURRENCY'] = str(workers)
+    os.makedirs('data', exist_ok=True)
+    
+    print("🏭 Starting production server (gunicorn)...")
+    print(f"👷 Workers: {os.environ.get('WEB_CONCURRENCY', os.cpu_count())}")
+    print("🔄 Graceful reload: kill -HUP $(cat data/gunicorn.pid)")
+    print("="*60)
+    
+    try:
+        os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+    except FileNotFoundError:
+        print("❌ gunicorn not installed. Run: pip install gunicorn")
+        sys.exit(1)
+
 def main():
     """Main entry point for the expense tracker"""
+    parser = argparse.ArgumentParser(description='Smart Expense Tracker')
+    parser.add_argument('--prod', action='store_true',
+                        help='run multi-worker production server instead of the debug server')
+    parser.add_argument('--workers', type=int, help='number of worker processes (with --prod)')
+    args = parser.parse_args()
+    
     print("\n" + "="*60)
     print("🚀 SMART EXPENSE TRACKER - MULTI-USER EDITION")
     print("="*60)
@@ -22,6 +46,10 @@ def main():
         except Exception as e:
             print(f"⚠️ Migration check skipped: {e}")
     
+    if args.prod:
+        run_production(args.workers)
+        return
+    
     from src.app import app, init_app
 
     init_app()
@@ -0,0 +1,234 @@
+# Admission control: token buckets per user and per client IP, with
+# separate budgets for reads, writes and login/register, plus a cap on
+# requests in flight. Excess requests are answered right away with 429
+# (over budget) or 503 (overloaded) and Retry-After, before any session
+# check or database work, so one busy client cannot slow down everyone.
+# A request is charged to its user's and its IP's bucket only when both
+# have a token, so a user over budget does not drain the IP's budget for
+# others behind the same address.
+#
+# Buckets live in the worker process (every gunicorn worker has its own).
+# The in-flight cap is shared by all workers: a request in flight holds a
+# lock on one of EXPENSE_MAX_IN_FLIGHT slot files in data/admission/
+# (locks held by a worker that dies are released by the OS). A per-worker
+# cap could not shed anything, gunicorn never runs more than `threads`
+# requests at once in a worker.
+#
+# Budgets are "rate/burst" (tokens per second / bucket size), e.g.
+# EXPENSE_RATE_WRITE_USER=2/30; "off" disables one, and
+# EXPENSE_RATE_LIMITS=0 disables them all.
+
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from flask import g, jsonify
+
+DEFAULT_LIMITS = {
+    ('read', 'user'): '10/60',
+    ('read', 'ip'): '40/240',
+    ('write', 'user'): '2/30',
+    ('write', 'ip'): '8/120',
+    ('auth', 'ip'): '0.1/10',
+}
+AUTH_ENDPOINTS = ('login', 'register')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SLOTS_DIR = 'data/admission'
+SLOT_POLL = 0.005  # seconds between attempts while waiting for a slot
+
+
+def parse_limit(value):
+    """'rate/burst' -> (rate, burst), None for 'off'"""
+    if value.strip().lower() in ('off', '0', ''):
+        return None
+    rate, _, burst = value.partition('/')
+    rate = float(rate)
+    return rate, float(burst) if burst else max(1.0, rate)
+
+
+def request_class(endpoint, method):
+    if endpoint in AUTH_ENDPOINTS:
+        return 'auth'
+    return 'read' if method in READ_METHODS else 'write'
+
+
+class SlotFiles:
+    """Semaphore shared by processes: a slot is an exclusive lock on one of `count` files"""
+
+    def __init__(self, directory, count):
+        self.paths = [os.path.join(directory, f'slot_{i:03d}.lock') for i in range(count)]
+        self._local = threading.local()
+
+    def _files(self):
+        # One descriptor per slot and thread: locks taken through different
+        # descriptors exclude each other, also between threads
+        files = getattr(self._local, 'files', None)
+        if files is None:
+            os.makedirs(os.path.dirname(self.paths[0]) or '.', exist_ok=True)
+            files = self._local.files = [open(path, 'a+') for path in self.paths]
+        return files
+
+    def try_acquire(self):
+        files = self._files()
+        start = random.randrange(len(files))  # spread contention over the slots
+        for i in range(len(files)):
+            slot = files[(start + i) % len(files)]
+            try:
+                if fcntl:
+                    fcntl.flock(slot.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    slot.seek(0)
+                    msvcrt.locking(slot.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                continue
+            self._local.held = slot
+            return True
+        return False
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(SLOT_POLL)
+        return True
+
+    def release(self):
+        slot = self._local.held
+        self._local.held = None
+        if fcntl:
+            fcntl.flock(slot.fileno(), fcntl.LOCK_UN)
+        else:
+            slot.seek(0)
+            msvcrt.locking(slot.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Admission:
+    """Token buckets keyed by (class, scope, key) and an in-flight cap shared by the workers"""
+
+    def __init__(self, limits, max_in_flight=16, queue_timeout=0.1, max_keys=10000,
+                 slots_dir=SLOTS_DIR):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # least recently used first
+        self._slots = SlotFiles(slots_dir, max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_overload': 0, 'peak_in_flight': 0}
+        self.shed = {}  # {(class, scope): count}
+
+    @classmethod
+    def from_env(cls):
+        limits = {}
+        if os.environ.get('EXPENSE_RATE_LIMITS', '1') != '0':
+            for (name, scope), default in DEFAULT_LIMITS.items():
+                limit = parse_limit(os.environ.get(f'EXPENSE_RATE_{name.upper()}_{scope.upper()}', default))
+                if limit:
+                    limits[name, scope] = limit
+        return cls(limits,
+                   max_in_flight=int(os.environ.get('EXPENSE_MAX_IN_FLIGHT', '16')),
+                   queue_timeout=int(os.environ.get('EXPENSE_QUEUE_TIMEOUT_MS', '100')) / 1000)
+
+    def take(self, name, keys):
+        """Spend one token from the bucket of every (scope, key), or from none.
+
+        Returns 0, or the seconds until every bucket has a token again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for scope, key in keys:
+                limit = self.limits.get((name, scope))
+                if limit is None or key is None:
+                    continue
+                rate, burst = limit
+                bucket = self._buckets.pop((name, scope, key), None)
+                tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+                buckets.append((scope, key, rate, tokens))
+
+            waits = []
+            for scope, key, rate, tokens in buckets:
+                if tokens < 1:
+                    waits.append((1 - tokens) / rate if rate else 60)
+                    self.shed[name, scope] = self.shed.get((name, scope), 0) + 1
+            # Debited only when every bucket admits the request
+            for scope, key, rate, tokens in buckets:
+                self._buckets[name, scope, key] = (tokens if waits else tokens - 1, now)
+            while len(self._buckets) > self.max_keys:
+                # A forgotten client starts again with a full bucket
+                self._buckets.popitem(last=False)
+        return max(waits, default=0)
+
+    def acquire(self):
+        """Take an in-flight slot, waiting at most queue_timeout; False when overloaded"""
+        if self._slots is None:
+            return True
+        if not self._slots.try_acquire():
+            with self._lock:
+                self.stats['queued'] += 1
+            if not self._slots.acquire(self.queue_timeout):
+                with self._lock:
+                    self.stats['shed_overload'] += 1
+                return False
+        with self._lock:
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        return True
+
+    def release(self):
+        if self._slots is None:
+            return
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def admit(self, endpoint, method, user_id, ip):
+        """None if the request may proceed, otherwise the 429/503 response"""
+        name = request_class(endpoint, method)
+        wait = self.take(name, (('ip', ip), ('user', user_id)))
+        if wait:
+            return _rejected(429, 'Too many requests, slow down', wait)
+        if not self.acquire():
+            return _rejected(503, 'Server busy, try again shortly', 1)
+        g.admission_slot = True
+        with self._lock:
+            self.stats['admitted'] += 1
+        return None
+
+    def metrics(self):
+        with self._lock:
+            shed = {f'{name}_{scope}': count for (name, scope), count in sorted(self.shed.items())}
+            return dict(self.stats, in_flight=self.in_flight, max_in_flight=self.max_in_flight,
+                        tracked_clients=len(self._buckets), shed_rate_limited=shed)
+
+
+def _rejected(status, error, wait):
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+limiter = Admission.from_env()
+
+
+def init_app(app, slots_dir=None):
+    """Give back the in-flight slot of every admitted request (slot files in slots_dir)"""
+    if slots_dir and limiter.max_in_flight:
+        limiter._slots = SlotFiles(slots_dir, limiter.max_in_flight)
+
+    @app.teardown_request
+    def release_slot(exc=None):
+        if g.pop('admission_slot', False):
+            limiter.release()
@@ -0,0 +1,137 @@
+import numpy as np
+from datetime import date
+
+from cache import LRUCache
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+class ExpenseColumns:
+    """A user's expense history as compact NumPy columns"""
+
+    def __init__(self, rows):
+        dates, amounts, categories, essential = zip(*rows) if rows else ((), (), (), ())
+
+        days = np.array(dates, dtype='datetime64[D]')
+        self.amounts = np.array(amounts, dtype=np.float64)
+        self.is_essential = np.array([1 if e else 0 for e in essential], dtype=np.int64)
+
+        # Day numbers since 1970-01-01 and month numbers since 1970-01
+        self.days = days.astype(np.int64)
+        self.months = days.astype('datetime64[M]').astype(np.int64)
+
+        # Int-coded categories, names sorted alphabetically
+        self.category_names, self.category_codes = np.unique(
+            np.array([c or 'Other' for c in categories], dtype=str), return_inverse=True)
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def _month_label(month_number):
+    return str(np.datetime64(int(month_number), 'M'))
+
+
+def _rolling_mean(values, window):
+    # Trailing mean via cumulative sums, shorter windows at the start
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def compute_analytics(columns, months=12, days=90, today=None):
+    """Trends, pivots and profiles for a user's history, JSON ready"""
+    if len(columns) == 0:
+        return {'total_transactions': 0}
+
+    today = np.datetime64(today or date.today(), 'D')
+    amounts = columns.amounts
+    codes = columns.category_codes
+    n_categories = len(columns.category_names)
+
+    # Multi-month trend over the last `months` months
+    last_month = int(today.astype('datetime64[M]').astype(np.int64))
+    first_month = last_month - months + 1
+    in_range = (columns.months >= first_month) & (columns.months <= last_month)
+    month_idx = columns.months[in_range] - first_month
+    month_totals = np.bincount(month_idx, weights=amounts[in_range], minlength=months)
+    month_counts = np.bincount(month_idx, minlength=months)
+
+    # Category x month pivot in one bincount over the combined index
+    pivot = np.bincount(codes[in_range] * months + month_idx,
+                        weights=amounts[in_range],
+                        minlength=n_categories * months).reshape(n_categories, months)
+
+    # All-time category totals
+    category_totals = np.bincount(codes, weights=amounts, minlength=n_categories)
+
+    # Weekday profile (1970-01-01 was a Thursday, Monday = 0)
+    weekdays = (columns.days + 3) % 7
+    weekday_totals = np.bincount(weekdays, weights=amounts, minlength=7)
+    weekday_counts = np.bincount(weekdays, minlength=7)
+    weekday_avg = np.divide(weekday_totals, weekday_counts,
+                            out=np.zeros(7), where=weekday_counts > 0)
+
+    # Essential vs non-essential
+    essential_totals = np.bincount(columns.is_essential, weights=amounts, minlength=2)
+
+    # Daily series with 7 and 30 day rolling averages
+    last_day = int(today.astype(np.int64))
+    first_day = last_day - days + 1
+    in_window = (columns.days >= first_day) & (columns.days <= last_day)
+    daily = np.bincount(columns.days[in_window] - first_day,
+                        weights=amounts[in_window], minlength=days)
+
+    return {
+        'total_transactions': int(len(columns)),
+        'total_spent': round(float(amounts.sum()), 2),
+        'categories': {
+            'labels': columns.category_names.tolist(),
+            'totals': np.round(category_totals, 2).tolist()
+        },
+        'monthly_trend': {
+            'labels': [_month_label(m) for m in range(first_month, last_month + 1)],
+            'totals': np.round(month_totals, 2).tolist(),
+            'counts': month_counts.tolist()
+        },
+        'category_by_month': {
+            'categories': columns.category_names.tolist(),
+            'values': np.round(pivot, 2).tolist()
+        },
+        'weekday_profile': {
+            'labels': WEEKDAYS,
+            'totals': np.round(weekday_totals, 2).tolist(),
+            'averages': np.round(weekday_avg, 2).tolist()
+        },
+        'essential_split': {
+            'essential': round(float(essential_totals[1]), 2),
+            'non_essential': round(float(essential_totals[0]), 2)
+        },
+        'daily': {
+            'labels': [str(np.datetime64(d, 'D')) for d in range(first_day, last_day + 1)],
+            'totals': np.round(daily, 2).tolist(),
+            'rolling_7': np.round(_rolling_mean(daily, 7), 2).tolist(),
+            'rolling_30': np.round(_rolling_mean(daily, 30), 2).tolist()
+        }
+    }
+
+
+class AnalyticsEngine:
+    """Per-user analytics, cached until the user's data version changes"""
+
+    def __init__(self, db, cache_size=256):
+        self.db = db
+        self.cache = LRUCache(cache_size)
+
+    def get(self, user_id):
+        version = self.db.get_data_version(user_id)
+        cached = self.cache.get(user_id)
+        if cached and cached[0] == version and cached[1] == date.today():
+            return cached[2]
+
+        columns = ExpenseColumns(self.db.get_expense_history(user_id))
+        result = compute_analytics(columns)
+        # Windows are relative to today, so cached results expire at midnight too
+        self.cache.set(user_id, (version, date.today(), result))
+        return result
@@ -0,0 +1,291 @@
+# Per-user, per-category spending statistics for anomaly detection.
+# Each (user, category) keeps a Welford mean/variance and a P-square
+# quantile sketch that are updated in O(1) inside the write transaction,
+# so scoring a new expense never looks at the user's history.
+
+import json
+import math
+
+import numpy as np
+
+from categories import UNCATEGORIZED
+
+QUANTILE = 0.95
+MIN_HISTORY = 5        # expenses needed before a category is scored
+Z_THRESHOLD = 3.0
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_stats (
+            user_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            sketch TEXT,
+            PRIMARY KEY (user_id, category_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+class QuantileSketch:
+    """P-square streaming estimate of one quantile (Jain & Chlamtac, 1985).
+
+    Five markers track the minimum, p/2, p, (1+p)/2 quantiles and the
+    maximum; each observation moves them in constant time and space.
+    """
+
+    def __init__(self, p=QUANTILE, state=None):
+        self.p = p
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+        state = state or {}
+        self.heights = state.get('q', [])
+        self.positions = state.get('n', [])
+        self.desired = state.get('np', [])
+
+    @classmethod
+    def from_json(cls, text, p=QUANTILE):
+        return cls(p, json.loads(text) if text else None)
+
+    def to_json(self):
+        return json.dumps({'q': self.heights, 'n': self.positions, 'np': self.desired})
+
+    @classmethod
+    def from_sorted(cls, values, p=QUANTILE):
+        """Initialise the markers from exact quantiles of sorted values"""
+        sketch = cls(p)
+        count = len(values)
+        if count < 5:
+            sketch.heights = [float(v) for v in values]
+            return sketch
+
+        ranks = [(count - 1) * inc for inc in sketch.increments]
+        sketch.heights = [float(h) for h in np.interp(ranks, np.arange(count), values)]
+        positions = [1 + int(round(r)) for r in ranks]
+        for i in range(1, 5):
+            positions[i] = max(positions[i], positions[i - 1] + 1)
+        for i in range(3, -1, -1):
+            positions[i] = min(positions[i], positions[i + 1] - 1)
+        sketch.positions = positions
+        sketch.desired = [1 + r for r in ranks]
+        return sketch
+
+    def add(self, x):
+        q, n = self.heights, self.positions
+        if not n:
+            # Still collecting the first five observations
+            q.append(float(x))
+            q.sort()
+            if len(q) == 5:
+                self.positions = [1, 2, 3, 4, 5]
+                self.desired = [1 + 4 * inc for inc in self.increments]
+            return
+
+        if x < q[0]:
+            q[0] = float(x)
+            k = 0
+        elif x >= q[4]:
+            q[4] = float(x)
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def quantile(self):
+        if not self.heights:
+            return None
+        if not self.positions:
+            # Exact for the first few observations
+            return float(np.percentile(self.heights, self.p * 100))
+        return self.heights[2]
+
+
+# Streaming updates (inside the write transaction)
+def _load(cursor, user_id, category_id):
+    cursor.execute('''
+        SELECT n, mean, m2, sketch FROM category_stats
+        WHERE user_id = ? AND category_id = ?
+    ''', (user_id, category_id))
+    return cursor.fetchone() or (0, 0.0, 0.0, None)
+
+
+def _save(cursor, user_id, category_id, n, mean, m2, sketch):
+    cursor.execute('''
+        INSERT OR REPLACE INTO category_stats (user_id, category_id, n, mean, m2, sketch)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, category_id, n, mean, m2, sketch.to_json()))
+
+
+def score(stats, category, amount):
+    """Score an amount against (n, mean, m2, sketch) stats of its category"""
+    n, mean, m2, sketch_json = stats
+    if n < MIN_HISTORY:
+        return {'scored': False, 'is_anomaly': False, 'alerts': []}
+
+    std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+    z_score = (amount - mean) / std if std > 0 else 0.0
+    p95 = QuantileSketch.from_json(sketch_json).quantile()
+
+    alerts = []
+    if z_score >= Z_THRESHOLD:
+        alerts.append(f"🚨 Unusual {category} expense: ₹{amount:,.2f} is {z_score:.1f}σ "
+                      f"above your average of ₹{mean:,.2f}")
+    elif p95 is not None and amount > p95:
+        alerts.append(f"📈 Higher than 95% of your {category} expenses (₹{p95:,.2f})")
+
+    return {
+        'scored': True,
+        'is_anomaly': z_score >= Z_THRESHOLD,
+        'z_score': round(z_score, 2),
+        'mean': round(mean, 2),
+        'p95': round(p95, 2) if p95 is not None else None,
+        'alerts': alerts
+    }
+
+
+def add_expense(cursor, user_id, category_id, category, amount):
+    """Score an expense against the category so far, then fold it in"""
+    category_id = category_id or UNCATEGORIZED
+    n, mean, m2, sketch_json = _load(cursor, user_id, category_id)
+    result = score((n, mean, m2, sketch_json), category or 'Other', amount)
+
+    # Welford's online mean/variance
+    n += 1
+    delta = amount - mean
+    mean += delta / n
+    m2 += delta * (amount - mean)
+
+    sketch = QuantileSketch.from_json(sketch_json)
+    sketch.add(amount)
+    _save(cursor, user_id, category_id, n, mean, m2, sketch)
+    return result
+
+
+def remove_expense(cursor, user_id, category_id, amount):
+    """Take a deleted expense back out of the mean/variance.
+
+    The quantile sketch cannot forget values; it is corrected the next
+    time the user's stats are rebuilt.
+    """
+    category_id = category_id or UNCATEGORIZED
+    n, mean, m2, sketch_json = _load(cursor, user_id, category_id)
+    if n <= 1:
+        cursor.execute('DELETE FROM category_stats WHERE user_id = ? AND category_id = ?',
+                       (user_id, category_id))
+        return
+
+    old_mean = (n * mean - amount) / (n - 1)
+    m2 = max(m2 - (amount - old_mean) * (amount - mean), 0.0)
+    _save(cursor, user_id, category_id, n - 1, old_mean, m2, QuantileSketch.from_json(sketch_json))
+
+
+# Batch mode (vectorized over a whole history)
+def _group_stats(codes, amounts, n_groups):
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=amounts, minlength=n_groups)
+    means = np.divide(sums, counts, out=np.zeros(n_groups), where=counts > 0)
+    sq_dev = np.bincount(codes, weights=(amounts - means[codes]) ** 2, minlength=n_groups)
+    stds = np.sqrt(np.divide(sq_dev, counts - 1, out=np.zeros(n_groups), where=counts > 1))
+    return counts, means, sq_dev, stds
+
+
+def _group_quantiles(codes, amounts, counts, q):
+    # Sort by (group, amount) once, then interpolate inside each group's slice
+    order = np.lexsort((amounts, codes))
+    sorted_amounts = amounts[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ranks = q * np.maximum(counts - 1, 0)
+    lower = np.floor(ranks).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    frac = ranks - lower
+    nonempty = counts > 0
+    result = np.zeros(len(counts))
+    lo = sorted_amounts[(starts + lower)[nonempty]]
+    hi = sorted_amounts[(starts + upper)[nonempty]]
+    result[nonempty] = lo + (hi - lo) * frac[nonempty]
+    return result, order, starts
+
+
+def scan_history(ids, categories, amounts, dates=None, descriptions=None):
+    """Flag every unusual expense in a user's history in one vectorized pass"""
+    if len(ids) == 0:
+        return []
+
+    names, codes = np.unique(np.array([c or 'Other' for c in categories], dtype=str),
+                             return_inverse=True)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    counts, means, _, stds = _group_stats(codes, amounts, len(names))
+    p95, _, _ = _group_quantiles(codes, amounts, counts, QUANTILE)
+
+    std_per_row = stds[codes]
+    z = np.divide(amounts - means[codes], std_per_row,
+                  out=np.zeros(len(amounts)), where=std_per_row > 0)
+    flagged = np.nonzero((counts[codes] >= MIN_HISTORY) & (z >= Z_THRESHOLD))[0]
+
+    results = []
+    for i in flagged[np.argsort(-z[flagged])]:
+        c = codes[i]
+        results.append({
+            'id': ids[i],
+            'date': dates[i] if dates is not None else None,
+            'description': descriptions[i] if descriptions is not None else None,
+            'category': str(names[c]),
+            'amount': round(float(amounts[i]), 2),
+            'z_score': round(float(z[i]), 2),
+            'category_mean': round(float(means[c]), 2),
+            'category_p95': round(float(p95[c]), 2)
+        })
+    return results
+
+
+def rebuild(cursor, user_id=None):
+    """Recompute category_stats from the expenses table (all users or one)"""
+    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    cursor.execute(f'''
+        SELECT user_id, COALESCE(category_id, {UNCATEGORIZED}), amount FROM expenses {user_filter}
+    ''', params)
+    rows = cursor.fetchall()
+    cursor.execute(f"DELETE FROM category_stats {user_filter}", params)
+    if not rows:
+        return
+
+    users, category_ids, amounts = zip(*rows)
+    keys = np.array(list(zip(users, category_ids)), dtype=np.int64)
+    groups, codes = np.unique(keys, axis=0, return_inverse=True)
+    codes = codes.reshape(-1)
+    amounts = np.array(amounts, dtype=np.float64)
+
+    counts, means, sq_dev, _ = _group_stats(codes, amounts, len(groups))
+    _, order, starts = _group_quantiles(codes, amounts, counts, QUANTILE)
+    sorted_amounts = amounts[order]
+
+    stats_rows = []
+    for g, (uid, category_id) in enumerate(groups):
+        group_values = sorted_amounts[starts[g]:starts[g] + counts[g]]
+        sketch = QuantileSketch.from_sorted(group_values)
+        stats_rows.append((int(uid), int(category_id), int(counts[g]), float(means[g]),
+                           float(sq_dev[g]), sketch.to_json()))
+
+    cursor.executemany('''
+        INSERT INTO category_stats (user_id, category_id, n, mean, m2, sketch)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', stats_rows)
@@ -2,8 +2,20 @@ import os
 import sys
 import sqlite3
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_from_directory, Response
+from werkzeug.middleware.proxy_fix import ProxyFix
 from database import ExpenseDatabase
+from shards import ShardedExpenseDatabase, shard_paths
+from server import load_secret_key
+from assets import AssetManifest
+import compression
+import admission
+from fastjson import FastJSONProvider
+import templating
+from analytics import AnalyticsEngine
+from scheduler import JobScheduler
+from jobs import register_jobs
+import batch
 
 
 if 'PYTHONANYWHERE' in os.environ:
@@ -19,11 +31,37 @@ else:
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 TEMPLATE_DIR = os.path.join(PROJECT_ROOT, 'templates')
+STATIC_DIR = os.path.join(PROJECT_ROOT, 'static')
+SERVICE_WORKER = os.path.join(PROJECT_ROOT, 'sw.js')
 
-app = Flask(__name__, template_folder=TEMPLATE_DIR)
-app.secret_key = os.urandom(24)
+# Static files are served by the static() route below (content-hashed URLs)
+app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=None)
+# Minified templates, gzip/brotli responses
+templating.init_app(app, TEMPLATE_DIR, os.path.join(os.path.dirname(DB_PATH), 'template_cache'))
+compression.init_app(app)
+# orjson for jsonify() when installed
+app.json = FastJSONProvider(app)
+# Per-user/per-IP rate limits and the in-flight cap (applied in check_auth)
+admission.init_app(app, os.path.join(os.path.dirname(DB_PATH), 'admission'))
+# Behind a reverse proxy (PythonAnywhere, nginx) the client IP comes from X-Forwarded-For
+PROXY_HOPS = int(os.environ.get('EXPENSE_PROXY_HOPS', '0'))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+# Persisted so sessions survive restarts and work across multiple workers
+app.secret_key = load_secret_key(os.path.join(os.path.dirname(DB_PATH), '.secret_key'))
 
-db = ExpenseDatabase(DB_PATH)
+# EXPENSE_DB_SHARDS=N spreads users' expenses over N files (see shards.py)
+SHARD_COUNT = int(os.environ.get('EXPENSE_DB_SHARDS', '0'))
+if SHARD_COUNT > 0:
+    db = ShardedExpenseDatabase(DB_PATH, shard_paths(DB_PATH, SHARD_COUNT))
+else:
+    db = ExpenseDatabase(DB_PATH)
+analytics_engine = AnalyticsEngine(db)
+# Only the worker holding the lock file runs maintenance jobs
+scheduler = register_jobs(JobScheduler(os.path.join(os.path.dirname(DB_PATH), 'scheduler.lock')), db)
+ADMIN_USERS = os.environ.get('ADMIN_USERS', 'admin').split(',')
+MAX_EXPENSE_PAGE = 10000
+assets = AssetManifest(STATIC_DIR, version_sources=(TEMPLATE_DIR, SERVICE_WORKER))
 
 def init_app():
     """Initialize application"""
@@ -32,12 +70,29 @@ def init_app():
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
     
+    # Maintenance, recurring expenses and retraining run in the background
+    scheduler.start()
+    
     print("✅ Application initialized successfully")
 
+def warmup():
+    """Warm database and templates before a worker accepts traffic"""
+    db.warmup()
+    templating.precompile(app)
+    print(f"🔥 Worker {os.getpid()} warmed up")
+
 # Middleware to check authentication
 @app.before_request
 def check_auth():
-    public_routes = ['landing_page', 'login_page', 'register_page', 'login', 'register', 'static']
+    public_routes = ['landing_page', 'login_page', 'register_page', 'login', 'register', 'static',
+                     'service_worker']
+    
+    # Shed excess load before any session or database work; assets are not limited
+    if request.endpoint not in ('static', 'service_worker'):
+        rejected = admission.limiter.admit(request.endpoint, request.method,
+                                           session.get('user_id'), request.remote_addr)
+        if rejected:
+            return rejected
     
     if request.endpoint in public_routes:
         return
@@ -54,6 +109,31 @@ def check_auth():
         session.clear()
         return redirect(url_for('login_page'))
 
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': lambda filename: url_for('static', filename=assets.hashed_name(filename))}
+
+# Static files and service worker
+@app.route('/static/<path:filename>')
+def static(filename):
+    """Serve static files; current content-hashed names are cached forever"""
+    real_name, immutable = assets.resolve(filename)
+    if immutable:
+        response = send_from_directory(STATIC_DIR, real_name, max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response = send_from_directory(STATIC_DIR, real_name, max_age=0)
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker with the cache version and precache manifest filled in"""
+    response = Response(assets.render_service_worker(SERVICE_WORKER), mimetype='application/javascript')
+    # Browsers must always revalidate the worker to pick up new deploys
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
+
 # Public Routes
 @app.route('/')
 def landing_page():
@@ -139,7 +219,7 @@ def dashboard():
     recent_expenses = db.get_expenses_list(user_id, limit=10)
     
     # Calculate totals
-    total_spent = float(sum([e['amount'] for e in recent_expenses])) if recent_expenses else 0.0
+    total_spent = float(sum([e.amount for e in recent_expenses])) if recent_expenses else 0.0
     avg_daily = float(total_spent / 30) if total_spent > 0 else 0.0
     
     # Generate AI insights
@@ -182,7 +262,7 @@ def generate_insights(expenses, total_spent):
     
     # Insight based on categories
     if expenses:
-        categories = [e['category'] for e in expenses if e.get('category')]
+        categories = [e.category for e in expenses if e.category]
         if categories:
             most_common = max(set(categories), key=categories.count)
             insights.append(f"🎯 Most frequent category: {most_common}")
@@ -216,10 +296,38 @@ def add_expense_api():
     result = db.add_expense(user_id, expense_data)
     return jsonify(result)
 
+@app.route('/api/batch', methods=['POST'])
+def batch_api():
+    """Apply queued offline creates/deletes in one round trip"""
+    user_id = session.get('user_id')
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    try:
+        batch.validate(operations)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        results = db.apply_batch(user_id, operations)
+    except Exception as e:
+        print(f"Batch error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'results': results})
+
 @app.route('/api/expenses')
 def get_expenses_api():
+    """Latest expenses; format=columnar returns one array per field instead of one object per expense"""
     user_id = session.get('user_id')
-    expenses = db.get_expenses_list(user_id, limit=50)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), MAX_EXPENSE_PAGE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be a number'}), 400
+    
+    if request.args.get('format') == 'columnar':
+        return jsonify(db.get_expenses_columnar(user_id, limit=limit))
+    expenses = db.get_expenses_list(user_id, limit=limit)
     return jsonify(expenses)
 
 @app.route('/api/expense/<int:expense_id>', methods=['DELETE'])
@@ -228,6 +336,33 @@ def delete_expense_api(expense_id):
     result = db.delete_expense(user_id, expense_id)
     return jsonify(result)
 
+@app.route('/api/expense/<int:expense_id>', methods=['PUT'])
+def update_expense_api(expense_id):
+    user_id = session.get('user_id')
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        if 'amount' in data:
+            data['amount'] = float(data['amount'])
+        if 'date' in data:
+            data['date'] = datetime.strptime(data['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
+        if 'time' in data:
+            data['time'] = datetime.strptime(data['time'], '%H:%M:%S').strftime('%H:%M:%S')
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    result = db.update_expense(user_id, expense_id, data)
+    return jsonify(result)
+
+@app.route('/api/sync')
+def sync_api():
+    """Expense changes after ?since=<cursor>; start with since=0 and keep the returned cursor"""
+    user_id = session.get('user_id')
+    
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', 500, type=int)
+    return jsonify(dict(db.get_changes(user_id, since, limit), success=True))
+
 # Analytics page
 @app.route('/analytics')
 def analytics():
@@ -251,6 +386,179 @@ def analytics():
         print(f"Analytics error: {e}")
         return render_template('analytics.html', no_data=True)
 
+@app.route('/api/analytics')
+def analytics_api():
+    """Trends, category pivots and weekday profile for the analytics charts"""
+    user_id = session.get('user_id')
+    
+    try:
+        return jsonify(analytics_engine.get(user_id))
+    except Exception as e:
+        print(f"Analytics API error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/aggregate')
+def aggregate_api():
+    """Spending totals over a date range at day/week/month/year granularity"""
+    user_id = session.get('user_id')
+    
+    today = datetime.now().date()
+    start = request.args.get('from', today.replace(day=1).isoformat())
+    end = request.args.get('to', today.isoformat())
+    granularity = request.args.get('granularity', 'day')
+    group_by = request.args.get('group_by') or None
+    
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d').date().isoformat()
+        end = datetime.strptime(end, '%Y-%m-%d').date().isoformat()
+        series = db.aggregate(user_id, start, end, granularity, group_by)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'from': start,
+        'to': end,
+        'granularity': granularity,
+        'group_by': group_by,
+        'series': series
+    })
+
+@app.route('/api/search')
+def search_api():
+    """Full-text search: words match as prefixes, "quoted text" as a phrase"""
+    user_id = session.get('user_id')
+    
+    try:
+        start = request.args.get('from')
+        end = request.args.get('to')
+        if start:
+            start = datetime.strptime(start, '%Y-%m-%d').date().isoformat()
+        if end:
+            end = datetime.strptime(end, '%Y-%m-%d').date().isoformat()
+        results = db.search_expenses(
+            user_id,
+            request.args.get('q', ''),
+            start,
+            end,
+            limit=request.args.get('limit', 50, type=int),
+            prefix=request.args.get('prefix', '1') != '0'
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'count': len(results), 'results': results})
+
+@app.route('/api/budgets')
+def get_budgets_api():
+    user_id = session.get('user_id')
+    return jsonify(db.get_budgets(user_id, request.args.get('month')))
+
+@app.route('/api/budgets', methods=['POST'])
+def set_budget_api():
+    user_id = session.get('user_id')
+    data = request.json or {}
+    
+    try:
+        category = str(data['category']).strip()
+        budget = float(data['budget'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'category and numeric budget are required'}), 400
+    
+    if not category or budget < 0:
+        return jsonify({'success': False, 'error': 'Invalid category or budget'}), 400
+    
+    return jsonify(db.set_budget(user_id, category, budget))
+
+@app.route('/api/reports/monthly')
+def monthly_report_api():
+    user_id = session.get('user_id')
+    month = request.args.get('month')
+    if month:
+        try:
+            month = datetime.strptime(month, '%Y-%m').strftime('%Y-%m')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'month must be YYYY-MM'}), 400
+    
+    report = db.get_monthly_report(user_id, month)
+    if report is None:
+        return jsonify({'success': False, 'error': 'No report for this month yet'}), 404
+    return jsonify({'success': True, 'report': report})
+
+@app.route('/api/categories/rename', methods=['POST'])
+def rename_category_api():
+    user_id = session.get('user_id')
+    data = request.json or {}
+    old_name = str(data.get('category') or '').strip()
+    new_name = str(data.get('name') or '').strip()
+    
+    if not old_name or not new_name:
+        return jsonify({'success': False, 'error': 'category and name are required'}), 400
+    
+    result = db.rename_category(user_id, old_name, new_name)
+    return jsonify(result), 200 if result['success'] else 400
+
+@app.route('/api/recurring')
+def get_recurring_api():
+    user_id = session.get('user_id')
+    return jsonify(db.get_recurring(user_id))
+
+@app.route('/api/recurring/detect', methods=['POST'])
+def detect_recurring_api():
+    user_id = session.get('user_id')
+    try:
+        found = db.detect_recurring(user_id)
+        return jsonify({'success': True, 'detected': found, 'schedules': db.get_recurring(user_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/recurring/<int:schedule_id>', methods=['POST'])
+def update_recurring_api(schedule_id):
+    user_id = session.get('user_id')
+    data = request.json or {}
+    if db.set_recurring_active(user_id, schedule_id, bool(data.get('active', True))):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Schedule not found or unauthorized'}), 404
+
+@app.route('/api/anomalies')
+def anomalies_api():
+    """Unusual expenses found by rescanning the user's whole history"""
+    user_id = session.get('user_id')
+    
+    try:
+        return jsonify({'success': True, 'anomalies': db.scan_anomalies(user_id)})
+    except Exception as e:
+        print(f"Anomaly scan error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/metrics')
+def admin_metrics_api():
+    """Background job, template, write queue, read router, admission and classifier metrics of this worker"""
+    if session.get('username') not in ADMIN_USERS:
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    return jsonify({
+        'success': True,
+        'scheduler': scheduler.metrics(),
+        'templates': templating.metrics.snapshot(),
+        'writer': db.writer.stats,
+        'reader': db.reader.stats,
+        'admission': admission.limiter.metrics(),
+        'classifier': db.classification_cache.stats()
+    })
+
+@app.route('/api/admin/summary')
+def admin_summary_api():
+    """Users, expenses and totals by month and category over all users (and shards)"""
+    if session.get('username') not in ADMIN_USERS:
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        months = max(1, min(int(request.args.get('months', 12)), 120))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'months must be a number'}), 400
+    return jsonify(dict(db.usage_summary(months), success=True))
+
 @app.route('/')
 def root():
     """Root route - redirect based on authentication"""
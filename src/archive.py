@@ -0,0 +1,294 @@
+# Cold expenses in a separate archive database.
+# Expenses dated before a user's horizon (the first day of the month
+# EXPENSE_ARCHIVE_MONTHS months back, see jobs.py) move into
+# <data dir>/archive/<file>, with their own daily rollup. The main database keeps per-user per-month
+# summaries (archived_months) and the horizon (archive_horizons), so the
+# hot expenses table, its indexes and daily_rollup only hold recent months.
+#
+# Readers attach the archive (read-only) only when a query reaches behind
+# the horizon: expense lists that run past the recent rows, and aggregates
+# over archived days. Month and year totals over whole archived months
+# come from archived_months without opening the archive.
+#
+# Archiving a user is two transactions: copy_user() copies into the
+# archive and rebuilds its rollup (repeatable), then release_user() moves
+# the rollup rows into the monthly summaries and deletes the expenses from
+# main, skipped if the user changed anything in between. A run stopped
+# halfway is completed by the next one. Archived expenses are read-only
+# and leave the sync feed (clients that have them keep them). In snapshot
+# read mode a backdated expense archived since the last refresh can be
+# counted twice until the next refresh.
+
+import os
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+
+import compact
+import rollup
+
+SCHEMA = 'archive'
+# Name of the main database when attached to an archive connection
+LIVE = 'live'
+MIN_MONTHS = 12  # analytics and budgets read the last 12 months from expenses
+
+# The legacy expenses columns, ids kept
+EXPENSE_COLUMNS = ('id', 'date', 'time', 'amount', 'category_id', 'subcategory', 'description',
+                   'payment_method', 'merchant', 'location', 'is_weekend', 'is_month_end',
+                   'day_of_week', 'month', 'predicted_category', 'is_essential', 'confidence',
+                   'user_id')
+
+
+def archive_path(db_path):
+    return os.path.join(os.path.dirname(db_path) or '.', 'archive', os.path.basename(db_path))
+
+
+def create_tables(cursor):
+    """Summaries and horizons, in the main database"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_months (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            merchant TEXT NOT NULL,
+            is_essential INTEGER NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category_id, payment_method, merchant, is_essential)
+        ) WITHOUT ROWID
+    ''')
+    # Expenses of the user dated before `before` are in the archive
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_horizons (
+            user_id INTEGER PRIMARY KEY,
+            before TEXT NOT NULL
+        )
+    ''')
+
+
+def horizon_for(months, today=None):
+    """First day of the month `months` months before the current one"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1).isoformat()
+
+
+def horizon(cursor, user_id):
+    cursor.execute('SELECT before FROM archive_horizons WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def attach(conn, path, readonly=True):
+    """Attach the archive to `conn` once; False when there is no archive file"""
+    if any(row[1] == SCHEMA for row in conn.execute("PRAGMA database_list")):
+        return True
+    if readonly and not os.path.exists(path):
+        return False
+    target = Path(path).absolute().as_uri() + '?mode=ro' if readonly else path
+    conn.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (target,))
+    return True
+
+
+def _date_filter(compact_storage, before):
+    """WHERE term (and its parameter) for expenses dated before `before`"""
+    if compact_storage:
+        return 'day < ?', compact.day_number(before)
+    return 'date < ?', before
+
+
+def users_before(cursor, before, compact_storage):
+    """Users with expenses in main dated before `before`"""
+    term, value = _date_filter(compact_storage, before)
+    table = compact.TABLE if compact_storage else 'expenses'
+    cursor.execute(f"SELECT DISTINCT user_id FROM {table} WHERE {term}", (value,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def open_archive(db_path):
+    """Autocommit connection to the archive of db_path, with db_path attached as `live`"""
+    path = archive_path(db_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA busy_timeout = 60000")
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            time TEXT,
+            amount REAL NOT NULL,
+            category_id INTEGER,
+            subcategory TEXT,
+            description TEXT,
+            payment_method TEXT,
+            merchant TEXT,
+            location TEXT,
+            is_weekend INTEGER,
+            is_month_end INTEGER,
+            day_of_week INTEGER,
+            month INTEGER,
+            predicted_category TEXT,
+            is_essential INTEGER,
+            confidence REAL,
+            user_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date, time)")
+    rollup.create_table(conn.cursor())
+    conn.execute(f"ATTACH DATABASE ? AS {LIVE}", (Path(db_path).absolute().as_uri() + '?mode=ro',))
+    return conn
+
+
+def copy_user(cursor, user_id, before, compact_storage):
+    """Copy a user's expenses dated before `before` into the archive (open_archive cursor).
+
+    Returns (expenses copied, the user's data version when they were read).
+    """
+    term, value = _date_filter(compact_storage, before)
+    columns = ', '.join(EXPENSE_COLUMNS)
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f"SELECT version FROM {LIVE}.user_data_versions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        version = row[0] if row else 0
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO expenses ({columns})
+            SELECT {columns} FROM {LIVE}.expenses WHERE user_id = ? AND {term}
+        ''', (user_id, value))
+        copied = cursor.rowcount
+        # The archive's own rollup, over everything archived for the user
+        rollup.rebuild(cursor, user_id)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return copied, version
+
+
+def release_user(cursor, user_id, before, version, compact_storage):
+    """Drop the copied expenses from main (writer transaction).
+
+    False when the user's data changed since copy_user read it; the next
+    run copies again.
+    """
+    cursor.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    if (row[0] if row else 0) != version:
+        return False
+
+    # Monthly summaries take over from the daily rollup rows
+    cursor.execute('''
+        INSERT INTO archived_months
+            (user_id, month, category_id, payment_method, merchant, is_essential, total, count)
+        SELECT user_id, substr(day, 1, 7), category_id, payment_method, merchant, is_essential,
+               SUM(total), SUM(count)
+        FROM daily_rollup
+        WHERE user_id = ? AND day < ?
+        GROUP BY 1, 2, 3, 4, 5, 6
+        ON CONFLICT (user_id, month, category_id, payment_method, merchant, is_essential)
+        DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+    ''', (user_id, before))
+    cursor.execute('DELETE FROM daily_rollup WHERE user_id = ? AND day < ?', (user_id, before))
+
+    term, value = _date_filter(compact_storage, before)
+    table = compact.TABLE if compact_storage else 'expenses'
+    cursor.execute(f'''
+        DELETE FROM expense_changes WHERE user_id = ? AND op = 'upsert' AND expense_id IN (
+            SELECT id FROM {table} WHERE user_id = ? AND {term}
+        )
+    ''', (user_id, user_id, value))
+    cursor.execute(f"DELETE FROM {table} WHERE user_id = ? AND {term}", (user_id, value))
+    cursor.execute('''
+        INSERT INTO archive_horizons (user_id, before) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET before = MAX(before, excluded.before)
+    ''', (user_id, before))
+    return True
+
+
+def restore_user(cursor, user_id):
+    """Move a user's archived expenses back into main (archive attached read-write).
+
+    Used before a user moves to another shard. Returns the number of expenses.
+    """
+    columns = ', '.join(EXPENSE_COLUMNS)
+    cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.expenses WHERE user_id = ?", (user_id,))
+    restored = cursor.fetchone()[0]
+    cursor.execute(f'''
+        INSERT INTO main.expenses ({columns})
+        SELECT {columns} FROM {SCHEMA}.expenses WHERE user_id = ? ORDER BY id
+    ''', (user_id,))
+    for table in (f'{SCHEMA}.expenses', f'{SCHEMA}.daily_rollup', 'main.archived_months',
+                  'main.archive_horizons'):
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+    rollup.rebuild(cursor, user_id)
+    return restored
+
+
+def restore_users(db_path, user_ids):
+    """restore_user for several users of one file, one transaction each (app stopped)"""
+    path = archive_path(db_path)
+    if not os.path.exists(path) or not user_ids:
+        return 0
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=60)
+    cursor = conn.cursor()
+    restored = 0
+    try:
+        attach(conn, path, readonly=False)
+        # Rollback journals make each transaction atomic across both files
+        cursor.execute("PRAGMA main.journal_mode = DELETE")
+        cursor.execute(f"PRAGMA {SCHEMA}.journal_mode = DELETE")
+        for user_id in user_ids:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                restored += restore_user(cursor, user_id)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+    finally:
+        cursor.execute(f"PRAGMA {SCHEMA}.journal_mode = WAL")
+        cursor.execute("PRAGMA main.journal_mode = WAL")
+        conn.close()
+    return restored
+
+
+# Reads
+def recent_rows(cursor, user_id, columns, limit):
+    """A user's newest archived expenses (archive attached)"""
+    cursor.execute(f'''
+        SELECT {', '.join(columns)}
+        FROM {SCHEMA}.expenses
+        WHERE user_id = ?
+        ORDER BY date DESC, time DESC
+        LIMIT ?
+    ''', (user_id, limit))
+    return cursor.fetchall()
+
+
+def rollup_source(conn, path, user_id, start, end, granularity):
+    """Extra rollup rows for rollup.aggregate when start..end reaches behind the horizon.
+
+    Returns (sql, params) of a SELECT with the daily_rollup columns, or None.
+    """
+    before = horizon(conn.cursor(), user_id)
+    if not before or start >= before:
+        return None
+    last = min(end, (date.fromisoformat(before) - timedelta(days=1)).isoformat())
+    whole_months = start.endswith('-01') and (
+        end >= before or (date.fromisoformat(end) + timedelta(days=1)).day == 1)
+    if granularity in ('month', 'year') and whole_months:
+        # Months stand in for their first day
+        return ('''
+            SELECT user_id, month || '-01', category_id, payment_method, merchant, is_essential,
+                   total, count
+            FROM archived_months
+            WHERE user_id = ? AND month >= ? AND month <= ?
+        ''', (user_id, start[:7], last[:7]))
+    if not attach(conn, path):
+        return None
+    return (f'''
+        SELECT * FROM {SCHEMA}.daily_rollup
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    ''', (user_id, start, last))
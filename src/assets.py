@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import re
+
+HASH_LENGTH = 10
+_HASHED_NAME = re.compile(r'^(.*)\.([0-9a-f]{%d})(\.[^./]+)$' % HASH_LENGTH)
+
+
+class AssetManifest:
+    """Content hashes of the static files, for cache-busting URLs.
+
+    css/style.css is published as css/style.<hash>.css; the hashed name
+    changes whenever the content does, so it can be cached forever.
+    """
+
+    def __init__(self, static_dir, version_sources=()):
+        self.static_dir = static_dir
+        self.version_sources = version_sources
+        self._entries = {}
+        self.build()
+
+    def _hash_file(self, path):
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+    def build(self):
+        entries = {}
+        for root, _, files in os.walk(self.static_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                entries[rel] = (os.path.getmtime(path), self._hash_file(path))
+        self._entries = entries
+
+    def _entry(self, rel):
+        path = os.path.join(self.static_dir, rel)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        # Edited while running (debug server): rehash
+        if rel not in self._entries or self._entries[rel][0] != mtime:
+            self._entries[rel] = (mtime, self._hash_file(path))
+        return self._entries[rel]
+
+    def hashed_name(self, rel):
+        entry = self._entry(rel)
+        if not entry:
+            return rel
+        base, ext = os.path.splitext(rel)
+        return f"{base}.{entry[1]}{ext}"
+
+    def resolve(self, requested):
+        """Map a requested name to (real file, True if it is the current hashed name)"""
+        match = _HASHED_NAME.match(requested)
+        if match:
+            rel = match.group(1) + match.group(3)
+            entry = self._entry(rel)
+            if entry:
+                # An outdated hash still gets the current file, just not cached forever
+                return rel, entry[1] == match.group(2)
+        return requested, False
+
+    def precache_urls(self, prefix='/static/'):
+        return sorted(prefix + self.hashed_name(rel) for rel in list(self._entries)
+                      if self._entry(rel))
+
+    def _version_files(self):
+        for source in self.version_sources:
+            if os.path.isdir(source):
+                for root, _, files in sorted(os.walk(source)):
+                    for name in sorted(files):
+                        yield os.path.join(root, name)
+            elif os.path.exists(source):
+                yield source
+
+    @property
+    def version(self):
+        """Changes with any static file or version source (templates, sw.js)"""
+        digest = hashlib.sha256()
+        for rel in sorted(self._entries):
+            entry = self._entry(rel)
+            if entry:
+                digest.update(f"{rel}:{entry[1]};".encode())
+        for path in self._version_files():
+            digest.update(self._hash_file(path).encode())
+        return digest.hexdigest()[:HASH_LENGTH]
+
+    def render_service_worker(self, source_path):
+        with open(source_path, encoding='utf-8') as f:
+            source = f.read()
+        return (source
+                .replace('__CACHE_VERSION__', self.version)
+                .replace('__PRECACHE_URLS__', json.dumps(self.precache_urls())))
@@ -0,0 +1,137 @@
+# Batched create/delete operations for offline-first clients.
+# A whole batch is classified in one pass and applied in one write
+# transaction. Every operation carries a client-generated idempotency key
+# whose result is stored with it, so a client that retries after a lost
+# response gets the original results back instead of duplicate expenses.
+
+import json
+from datetime import datetime
+
+MAX_OPERATIONS = 500
+MAX_KEY_LENGTH = 128
+KEY_RETENTION_DAYS = 30
+
+EXPENSE_FIELDS = ('description', 'payment_method', 'category', 'subcategory', 'merchant', 'location')
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def expire_keys(cursor, days=KEY_RETENTION_DAYS):
+    cursor.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                   (f'-{int(days)} days',))
+    return cursor.rowcount
+
+
+def validate(operations):
+    """Check the shape of a batch, raises ValueError for malformed requests"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f'At most {MAX_OPERATIONS} operations per batch')
+    for i, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get('op') not in ('create', 'delete'):
+            raise ValueError(f"operations[{i}]: op must be 'create' or 'delete'")
+        key = op.get('key')
+        if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+            raise ValueError(f'operations[{i}]: key must be a string of 1-{MAX_KEY_LENGTH} characters')
+
+
+def parse_expense(data):
+    """Expense fields of a create operation, raises ValueError when invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('expense must be an object')
+    try:
+        amount = float(data['amount'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if not data.get('description'):
+        raise ValueError('description is required')
+
+    expense = {'amount': amount, 'payment_method': 'Cash'}
+    for field in EXPENSE_FIELDS:
+        if data.get(field) is not None:
+            expense[field] = str(data[field])
+
+    # Offline clients send when the expense happened, not when it synced
+    if data.get('date'):
+        expense['date'] = datetime.strptime(data['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
+    if data.get('time'):
+        expense['time'] = datetime.strptime(data['time'], '%H:%M:%S').strftime('%H:%M:%S')
+    return expense
+
+
+def _stored_result(cursor, user_id, key):
+    cursor.execute('SELECT result FROM idempotency_keys WHERE user_id = ? AND key = ?', (user_id, key))
+    row = cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _store_result(cursor, user_id, key, result):
+    cursor.execute('INSERT INTO idempotency_keys (user_id, key, result) VALUES (?, ?, ?)',
+                   (user_id, key, json.dumps(result)))
+
+
+def apply(db, user_id, operations):
+    """Apply a validated batch for one user, returns one result per operation"""
+    # Parse and classify every create up front, outside the write transaction
+    prepared = {}
+    errors = {}
+    creates = []
+    for i, op in enumerate(operations):
+        if op['op'] == 'create':
+            try:
+                creates.append((i, parse_expense(op.get('expense'))))
+            except ValueError as e:
+                errors[i] = str(e)
+    for (i, _), expense in zip(creates, db.prepare_expenses(user_id, [e for _, e in creates])):
+        prepared[i] = expense
+
+    def run(cursor):
+        results = []
+        for i, op in enumerate(operations):
+            key = op['key']
+            stored = _stored_result(cursor, user_id, key)
+            if stored is not None:
+                results.append(dict(stored, replayed=True))
+                continue
+            if i in errors:
+                results.append({'key': key, 'op': op['op'], 'status': 'error', 'error': errors[i]})
+                continue
+
+            # A failing operation is rolled back alone, the rest still apply
+            cursor.execute('SAVEPOINT batch_op')
+            try:
+                if op['op'] == 'create':
+                    expense_id, alerts = db._insert_expense_row(cursor, user_id, dict(prepared[i]))
+                    result = {'key': key, 'op': 'create', 'status': 'created',
+                              'expense_id': expense_id, 'category': prepared[i]['category'],
+                              'alerts': alerts}
+                else:
+                    expense_id = op.get('id')
+                    if expense_id is None and op.get('target_key'):
+                        # Delete an expense this client created offline, by its create key
+                        target = _stored_result(cursor, user_id, op['target_key'])
+                        expense_id = target.get('expense_id') if target else None
+                    deleted = expense_id is not None and db._delete_expense_row(cursor, user_id, int(expense_id))
+                    result = {'key': key, 'op': 'delete', 'expense_id': expense_id,
+                              'status': 'deleted' if deleted else 'not_found'}
+                _store_result(cursor, user_id, key, result)
+                cursor.execute('RELEASE batch_op')
+            except Exception as e:
+                cursor.execute('ROLLBACK TO batch_op')
+                cursor.execute('RELEASE batch_op')
+                result = {'key': key, 'op': op['op'], 'status': 'error', 'error': str(e)}
+            results.append(result)
+        return results
+
+    return db.writer.execute(run)
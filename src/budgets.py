@@ -0,0 +1,116 @@
+# Monthly category budgets (categories.budget) and the running totals
+# they are checked against. monthly_category_totals is maintained inside
+# the write transaction, so a budget check is two primary-key lookups
+# no matter how many expenses the user has.
+
+from datetime import date
+
+from categories import UNCATEGORIZED
+
+WARNING_RATIO = 0.8
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_category_totals (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def rebuild(cursor, user_id=None):
+    """Recompute monthly totals from the expenses table (all users or one)"""
+    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    cursor.execute(f"DELETE FROM monthly_category_totals {user_filter}", params)
+    cursor.execute(f'''
+        INSERT INTO monthly_category_totals (user_id, month, category_id, total, count)
+        SELECT user_id, substr(date, 1, 7), COALESCE(category_id, {UNCATEGORIZED}), SUM(amount), COUNT(*)
+        FROM expenses
+        {user_filter}
+        GROUP BY 1, 2, 3
+    ''', params)
+
+
+def _check(category, budget, before, after):
+    if not budget or budget <= 0:
+        return []
+    used = after / budget
+    if after > budget:
+        return [f"🔴 {category} budget exceeded: ₹{after:,.2f} of ₹{budget:,.2f} ({used:.0%})"]
+    if before < budget * WARNING_RATIO <= after:
+        return [f"🟠 {used:.0%} of {category} budget used: ₹{after:,.2f} of ₹{budget:,.2f}"]
+    return []
+
+
+def add_expense(cursor, user_id, category_id, category, expense_date, amount):
+    """Add an expense to its month's running total, returns budget alerts"""
+    category_id = category_id or UNCATEGORIZED
+    month = expense_date[:7]
+
+    cursor.execute('''
+        INSERT INTO monthly_category_totals (user_id, month, category_id, total, count)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (user_id, month, category_id)
+        DO UPDATE SET total = total + excluded.total, count = count + 1
+    ''', (user_id, month, category_id, amount))
+    cursor.execute('''
+        SELECT total FROM monthly_category_totals
+        WHERE user_id = ? AND month = ? AND category_id = ?
+    ''', (user_id, month, category_id))
+    after = cursor.fetchone()[0]
+
+    # Only the running month has a budget to warn about
+    if month != date.today().strftime('%Y-%m'):
+        return []
+
+    cursor.execute('SELECT budget FROM categories WHERE id = ?', (category_id,))
+    row = cursor.fetchone()
+    return _check(category, row[0] if row else 0, after - amount, after)
+
+
+def remove_expense(cursor, user_id, category_id, expense_date, amount):
+    cursor.execute('''
+        UPDATE monthly_category_totals
+        SET total = total - ?, count = count - 1
+        WHERE user_id = ? AND month = ? AND category_id = ?
+    ''', (amount, user_id, expense_date[:7], category_id or UNCATEGORIZED))
+
+
+def set_budget(cursor, user_id, category, budget):
+    """Set a category's monthly budget, creating the category if needed"""
+    cursor.execute('''
+        INSERT INTO categories (user_id, name, budget) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, name) DO UPDATE SET budget = excluded.budget
+    ''', (user_id, category, budget))
+
+
+def get_budgets(cursor, user_id, month=None):
+    """Every category with its budget and what has been spent in the month"""
+    month = month or date.today().strftime('%Y-%m')
+    cursor.execute('''
+        SELECT c.name, c.color, COALESCE(c.budget, 0), COALESCE(t.total, 0)
+        FROM categories c
+        LEFT JOIN monthly_category_totals t
+            ON t.user_id = c.user_id AND t.month = ? AND t.category_id = c.id
+        WHERE c.user_id = ?
+        ORDER BY c.name
+    ''', (month, user_id))
+
+    budgets = []
+    for name, color, budget, spent in cursor.fetchall():
+        budgets.append({
+            'category': name,
+            'color': color,
+            'budget': budget,
+            'spent': round(spent, 2),
+            'remaining': round(budget - spent, 2) if budget else None,
+            'percent_used': round(spent / budget * 100, 1) if budget else None
+        })
+    return budgets
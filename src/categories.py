@@ -0,0 +1,113 @@
+# Category references for expenses.
+# expenses.category_id points at categories.id; the name is stored only in
+# categories, so renaming a category is a single-row UPDATE and the
+# derived tables (rollup, budgets, anomaly stats) are keyed by integer id.
+# CategoryMap caches each user's id <-> name map in memory. Renames bump
+# the user's row in category_versions, which tells every worker to reload.
+
+UNCATEGORIZED = 0  # key of expenses without a category in the derived tables
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def name_of(column='category_id'):
+    """SQL expression for the name of the category referenced by `column`"""
+    return f"(SELECT name FROM categories WHERE id = {column})"
+
+
+def needs_migration(cursor):
+    """Expenses still carry category names (a file from before category ids)"""
+    cursor.execute("PRAGMA table_info(expenses)")
+    return 'category' in {row[1] for row in cursor.fetchall()}
+
+
+def add_missing(cursor):
+    """Give every (user, category name) used by an expense a categories row"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO categories (user_id, name)
+        SELECT DISTINCT user_id, category FROM expenses
+        WHERE category IS NOT NULL AND category != ''
+    ''')
+
+
+def _version(cursor, user_id):
+    cursor.execute('SELECT version FROM category_versions WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+class CategoryMap:
+    """Per-user {name: id} and {id: name}, checked against category_versions"""
+
+    def __init__(self):
+        self._users = {}
+
+    def _entry(self, cursor, user_id):
+        version = _version(cursor, user_id)
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] != version:
+            cursor.execute('SELECT id, name FROM categories WHERE user_id = ?', (user_id,))
+            names = dict(cursor.fetchall())
+            entry = (version, {name: category_id for category_id, name in names.items()}, names)
+            self._users[user_id] = entry
+        return entry
+
+    def names(self, cursor, user_id):
+        """{category_id: name} of the user"""
+        return self._entry(cursor, user_id)[2]
+
+    def name(self, cursor, user_id, category_id):
+        if category_id is None:
+            return None
+        names = self.names(cursor, user_id)
+        if category_id not in names:
+            # Created after the map was loaded
+            self._users.pop(user_id, None)
+            names = self.names(cursor, user_id)
+        return names.get(category_id)
+
+    def ensure_id(self, cursor, user_id, name):
+        """Id of the user's category `name`, created if new (writer cursor only)"""
+        if not name:
+            return None
+        category_id = self._entry(cursor, user_id)[1].get(name)
+        if category_id is not None:
+            return category_id
+
+        # Not cached: the insert may still be rolled back with the transaction
+        cursor.execute('''
+            INSERT INTO categories (user_id, name) VALUES (?, ?)
+            ON CONFLICT (user_id, name) DO NOTHING
+        ''', (user_id, name))
+        cursor.execute('SELECT id FROM categories WHERE user_id = ? AND name = ?', (user_id, name))
+        return cursor.fetchone()[0]
+
+    def forget(self, user_id):
+        self._users.pop(user_id, None)
+
+
+def rename(cursor, user_id, old_name, new_name):
+    """Rename one of the user's categories, returns its id (None if it does not exist).
+
+    Expenses and derived tables reference the id and are left untouched;
+    recurring schedules hold the name they insert, so they follow it.
+    """
+    cursor.execute('SELECT id FROM categories WHERE user_id = ? AND name = ?', (user_id, old_name))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    cursor.execute('UPDATE categories SET name = ? WHERE id = ?', (new_name, row[0]))
+    cursor.execute('UPDATE recurring_expenses SET category = ? WHERE user_id = ? AND category = ?',
+                   (new_name, user_id, old_name))
+    cursor.execute('''
+        INSERT INTO category_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+    return row[0]
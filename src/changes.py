@@ -0,0 +1,154 @@
+# Per-user change feed of expenses for delta sync.
+# Every insert, update and delete appends a row with a new, increasing
+# seq inside the write transaction. Older entries for the same expense
+# are dropped, so the log holds one entry per live expense plus recent
+# tombstones and a client's sync cost is proportional to what changed.
+
+import categories
+
+TOMBSTONE_RETENTION_DAYS = 90
+MAX_CHANGES = 500
+
+EXPENSE_COLUMNS = ['id', 'date', 'time', 'amount', 'description', 'category', 'subcategory',
+                   'payment_method', 'merchant', 'location', 'is_essential']
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            expense_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expense_changes_user_seq
+        ON expense_changes (user_id, seq)
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_expense_changes_expense
+        ON expense_changes (user_id, expense_id)
+    ''')
+    # Highest seq whose tombstones have been purged
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            purged_through INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO change_log_state (id, purged_through) VALUES (1, 0)")
+    # Users moved in from another shard: their cursors up to reset_through were issued there
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_resets (
+            user_id INTEGER PRIMARY KEY,
+            reset_through INTEGER NOT NULL
+        )
+    ''')
+
+
+def seed(cursor):
+    """Log every existing expense once (databases created before the change log)"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO expense_changes (user_id, expense_id, op)
+        SELECT user_id, id, 'upsert' FROM expenses ORDER BY id
+    ''')
+
+
+def record(cursor, user_id, expense_id, op):
+    """Log an 'upsert' or 'delete' of one expense, replacing its previous entry"""
+    cursor.execute('DELETE FROM expense_changes WHERE user_id = ? AND expense_id = ?',
+                   (user_id, expense_id))
+    cursor.execute('INSERT INTO expense_changes (user_id, expense_id, op) VALUES (?, ?, ?)',
+                   (user_id, expense_id, op))
+
+
+def record_category(cursor, user_id, category_id):
+    """Log an upsert of every expense in a category (renamed: clients hold the old name)"""
+    cursor.execute('''
+        DELETE FROM expense_changes WHERE user_id = ? AND expense_id IN (
+            SELECT id FROM expenses WHERE user_id = ? AND category_id = ?
+        )
+    ''', (user_id, user_id, category_id))
+    cursor.execute('''
+        INSERT INTO expense_changes (user_id, expense_id, op)
+        SELECT user_id, id, 'upsert' FROM expenses WHERE user_id = ? AND category_id = ?
+    ''', (user_id, category_id))
+
+
+def adopt_user(cursor, user_id, foreign_seq):
+    """Invalidate cursors a moved user's clients got from the previous database.
+
+    The sequence is raised above `foreign_seq` (the previous database's),
+    so every cursor issued there is <= reset_through and every new one is
+    greater. Called before the user's expenses are recorded here.
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expense_changes'")
+    row = cursor.fetchone()
+    reset_through = max(row[0] if row else 0, foreign_seq or 0)
+    if row:
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'expense_changes'", (reset_through,))
+    else:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('expense_changes', ?)", (reset_through,))
+    cursor.execute('INSERT OR REPLACE INTO change_log_resets (user_id, reset_through) VALUES (?, ?)',
+                   (user_id, reset_through))
+
+
+def fetch(cursor, user_id, since=0, limit=MAX_CHANGES):
+    """Changes after the `since` cursor, oldest first"""
+    limit = max(1, min(int(limit), MAX_CHANGES))
+    since = max(int(since), 0)
+
+    cursor.execute('''
+        SELECT purged_through,
+               (SELECT reset_through FROM change_log_resets WHERE user_id = ?)
+        FROM change_log_state WHERE id = 1
+    ''', (user_id,))
+    purged_through, reset_through = cursor.fetchone()
+    if 0 < since < purged_through or 0 < since <= (reset_through or 0):
+        # Deletes the client has not seen are gone (or the user moved shards), it has to start over
+        return {'reset': True, 'cursor': 0, 'changes': [], 'has_more': True}
+
+    selected = [categories.name_of('e.category_id') if col == 'category' else 'e.' + col
+                for col in EXPENSE_COLUMNS[1:]]
+    cursor.execute(f'''
+        SELECT c.seq, c.expense_id, c.op, {', '.join(selected)}
+        FROM expense_changes c
+        LEFT JOIN expenses e ON e.id = c.expense_id AND c.op = 'upsert'
+        WHERE c.user_id = ? AND c.seq > ?
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (user_id, since, limit + 1))
+    rows = cursor.fetchall()
+
+    changes = []
+    for row in rows[:limit]:
+        if row[2] == 'delete':
+            changes.append({'op': 'delete', 'id': row[1]})
+        else:
+            expense = dict(zip(EXPENSE_COLUMNS, (row[1],) + row[3:]))
+            changes.append({'op': 'upsert', 'expense': expense})
+
+    return {
+        'reset': False,
+        'cursor': rows[:limit][-1][0] if rows else since,
+        'changes': changes,
+        'has_more': len(rows) > limit
+    }
+
+
+def purge_tombstones(cursor, days=TOMBSTONE_RETENTION_DAYS):
+    cursor.execute('''
+        SELECT MAX(seq) FROM expense_changes
+        WHERE op = 'delete' AND changed_at < datetime('now', ?)
+    ''', (f'-{int(days)} days',))
+    horizon = cursor.fetchone()[0]
+    if horizon is None:
+        return 0
+
+    cursor.execute("DELETE FROM expense_changes WHERE op = 'delete' AND seq <= ?", (horizon,))
+    purged = cursor.rowcount
+    cursor.execute('UPDATE change_log_state SET purged_through = MAX(purged_through, ?) WHERE id = 1',
+                   (horizon,))
+    return purged
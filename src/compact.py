@@ -0,0 +1,229 @@
+# Compact storage for expenses.
+# expense_rows keeps the date as a day number (days since 1970-01-01), the
+# time as seconds since midnight, the amount in minor units (paise) and
+# predicted category and payment method as codes into expense_labels (the
+# category is a categories.id, as in every layout). is_weekend,
+# is_month_end, day_of_week and month are virtual generated columns,
+# computed from the day number when read.
+# `expenses` becomes a view with the original columns (plus day and
+# seconds), so every reader keeps working; its INSTEAD OF triggers encode
+# inserts, updates and deletes.
+#
+# New databases are created compact with EXPENSE_DB_COMPACT=1; existing
+# ones are converted offline (app stopped) with:
+#     python src/compact.py migrate data/user_expenses.db [data/shards/*.db]
+
+import os
+import sqlite3
+import sys
+from datetime import date
+
+import search
+
+TABLE = 'expense_rows'
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Newest first, straight off the (user_id, day, seconds) index
+RECENT_ORDER = 'day DESC, seconds DESC'
+
+_WEEKDAY = "((day % 7) + 10) % 7"  # 1970-01-01 was a Thursday, Monday = 0
+_DAY_OF_MONTH = "CAST(strftime('%d', day * 86400, 'unixepoch') AS INTEGER)"
+
+_ENCODE = {
+    'day': "CAST(julianday(NEW.date) - 2440587.5 AS INTEGER)",
+    'seconds': "CAST(strftime('%s', '1970-01-01 ' || NEW.time) AS INTEGER)",
+    'amount_minor': "CAST(ROUND(NEW.amount * 100) AS INTEGER)",
+    'payment_code': "(SELECT id FROM expense_labels WHERE name = NEW.payment_method)",
+    'predicted_code': "(SELECT id FROM expense_labels WHERE name = NEW.predicted_category)",
+    'user_id': "COALESCE(NEW.user_id, 1)"
+}
+# Stored as they are
+_PLAIN = ('subcategory', 'description', 'merchant', 'location', 'is_essential', 'confidence')
+STORED_COLUMNS = ('user_id', 'day', 'seconds', 'amount_minor', 'category_id', 'payment_code',
+                  'predicted_code') + _PLAIN
+
+
+def is_compact(cursor):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'expenses'")
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'view'
+
+
+def day_number(iso_date):
+    return date.fromisoformat(iso_date).toordinal() - EPOCH_ORDINAL
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_labels (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL DEFAULT 1,
+            day INTEGER NOT NULL,
+            seconds INTEGER,
+            amount_minor INTEGER NOT NULL,
+            category_id INTEGER REFERENCES categories (id),
+            payment_code INTEGER,
+            predicted_code INTEGER,
+            is_essential INTEGER,
+            subcategory TEXT,
+            description TEXT,
+            merchant TEXT,
+            location TEXT,
+            confidence REAL,
+            is_weekend INTEGER GENERATED ALWAYS AS ({_WEEKDAY} >= 5) VIRTUAL,
+            is_month_end INTEGER GENERATED ALWAYS AS ({_DAY_OF_MONTH} >= 25) VIRTUAL,
+            day_of_week INTEGER GENERATED ALWAYS AS ({_WEEKDAY}) VIRTUAL,
+            month INTEGER GENERATED ALWAYS AS (CAST(strftime('%m', day * 86400, 'unixepoch') AS INTEGER)) VIRTUAL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_expense_rows_user_day
+        ON {TABLE} (user_id, day, seconds)
+    ''')
+
+    # Labels are looked up only for the columns a query reads
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS expenses AS
+        SELECT r.id,
+               date(r.day * 86400, 'unixepoch') AS date,
+               time(r.seconds, 'unixepoch') AS time,
+               r.amount_minor / 100.0 AS amount,
+               r.category_id, r.subcategory, r.description,
+               (SELECT name FROM expense_labels WHERE id = r.payment_code) AS payment_method,
+               r.merchant, r.location, r.is_weekend, r.is_month_end, r.day_of_week, r.month,
+               (SELECT name FROM expense_labels WHERE id = r.predicted_code) AS predicted_category,
+               r.is_essential, r.confidence, r.user_id, r.day, r.seconds
+        FROM {TABLE} r
+    ''')
+
+    add_labels = '''
+        INSERT OR IGNORE INTO expense_labels (name)
+        SELECT name FROM (SELECT NEW.payment_method AS name UNION SELECT NEW.predicted_category)
+        WHERE name IS NOT NULL;
+    '''
+    values = ', '.join(_ENCODE.get(column, f'NEW.{column}') for column in STORED_COLUMNS)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_insert INSTEAD OF INSERT ON expenses
+        BEGIN
+            {add_labels}
+            INSERT INTO {TABLE} (id, {', '.join(STORED_COLUMNS)}) VALUES (NEW.id, {values});
+        END
+    ''')
+    assignments = ', '.join(f"{column} = {_ENCODE.get(column, f'NEW.{column}')}" for column in STORED_COLUMNS)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_update INSTEAD OF UPDATE ON expenses
+        BEGIN
+            {add_labels}
+            UPDATE {TABLE} SET {assignments} WHERE id = OLD.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_delete INSTEAD OF DELETE ON expenses
+        BEGIN
+            DELETE FROM {TABLE} WHERE id = OLD.id;
+        END
+    ''')
+
+
+def last_insert_id(cursor):
+    """Id of the expense just inserted through the view.
+
+    last_insert_rowid() reverts when the INSTEAD OF trigger ends; with
+    AUTOINCREMENT and a single writer, the sequence holds the new id.
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (TABLE,))
+    return cursor.fetchone()[0]
+
+
+def adopt_category_ids(cursor):
+    """Point category_code (an expense_labels id) of older files at categories.id.
+
+    Runs inside the caller's transaction, after categories.add_missing.
+    """
+    cursor.execute("DROP VIEW IF EXISTS expenses")  # its INSTEAD OF triggers go with it
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME COLUMN category_code TO category_id")
+    cursor.execute(f'''
+        UPDATE {TABLE} SET category_id = (
+            SELECT c.id FROM categories c JOIN expense_labels l ON l.name = c.name
+            WHERE l.id = {TABLE}.category_id AND c.user_id = {TABLE}.user_id
+        )
+    ''')
+    create_tables(cursor)
+
+
+def migrate(cursor):
+    """Convert the expenses table of this database into compact storage.
+
+    Runs inside the caller's transaction; ids are kept, so the search
+    index and the change log stay valid. Returns the number of rows.
+    """
+    if is_compact(cursor):
+        return 0
+
+    cursor.execute("ALTER TABLE expenses RENAME TO expenses_legacy")
+    create_tables(cursor)
+    cursor.execute('''
+        INSERT OR IGNORE INTO expense_labels (name)
+        SELECT name FROM (
+            SELECT payment_method AS name FROM expenses_legacy
+            UNION SELECT predicted_category FROM expenses_legacy
+        )
+        WHERE name IS NOT NULL
+    ''')
+    # Same encoding as the insert trigger, as one INSERT ... SELECT
+    values = ', '.join(_ENCODE.get(column, f'NEW.{column}') for column in STORED_COLUMNS)
+    cursor.execute(f'''
+        INSERT INTO {TABLE} (id, {', '.join(STORED_COLUMNS)})
+        SELECT NEW.id, {values} FROM expenses_legacy AS NEW ORDER BY NEW.id
+    ''')
+    migrated = cursor.rowcount
+
+    # Ids are never reused, not even those of deleted expenses (the rename moved the sequence)
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses_legacy'")
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (TABLE,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (TABLE, row[0]))
+
+    # The old search triggers and index go with the old table; triggers on the new one
+    cursor.execute("DROP TABLE expenses_legacy")
+    search.create_table(cursor, TABLE)
+    return migrated
+
+
+def migrate_file(db_path):
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=60)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = migrate(cursor)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        # Give the freed pages back to the file system
+        cursor.execute("VACUUM")
+        return migrated
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'migrate':
+        print("usage: python src/compact.py migrate DB_PATH [DB_PATH ...]")
+        sys.exit(1)
+    from database import ExpenseDatabase
+    for db_path in sys.argv[2:]:
+        before = os.path.getsize(db_path)
+        # Brings files from older versions up to the current layout first
+        ExpenseDatabase(db_path, seed_admin=False, compact_storage=False)
+        migrated = migrate_file(db_path)
+        print(f"✅ {db_path}: {migrated} expenses, {before:,} -> {os.path.getsize(db_path):,} bytes")
@@ -0,0 +1,241 @@
+# The essential/non-essential classifier as flat NumPy arrays.
+# export() reads the fitted preprocessing (median imputer + scaler for
+# numbers, constant imputer + one-hot encoder for text) and the decision
+# tree, and keeps only the input features the tree actually splits on.
+# CompiledTree evaluates that without importing sklearn: a single row is a
+# handful of Python comparisons, a frame is one vectorized pass per level.
+# Predictions match the pipeline exactly (values are compared as float32,
+# like sklearn's tree does).
+#
+#     python src/compiled_model.py export [PIPELINE.pkl | PREPROCESSOR.pkl TREE.pkl]
+#     python src/compiled_model.py verify [data/user_expenses.db ...]
+
+import hashlib
+import math
+import os
+import sys
+
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+COMPILED_PATH = os.path.join(MODELS_DIR, 'expense_classifier_tree.npz')
+FORMAT_VERSION = 1
+
+NUMERIC, ONEHOT = 0, 1
+LEAF = -1
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def file_digest(*paths):
+    """sha256 of the pickle(s) an export was made from"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def export(preprocessor, tree, path=COMPILED_PATH, source_digest=''):
+    """Write the fitted ColumnTransformer + DecisionTreeClassifier to `path` (.npz).
+
+    source_digest (file_digest of the pickle) lets predict.load_model tell
+    whether the export still matches the served pipeline.
+    """
+    # Transformed feature index -> (kind, column, median, mean, scale, category)
+    features = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == 'remainder':
+            continue
+        steps = dict(transformer.steps)
+        if name == 'num':
+            imputer, scaler = steps['imputer'], steps['scaler']
+            means = scaler.mean_ if scaler.with_mean else np.zeros(len(columns))
+            scales = scaler.scale_ if scaler.scale_ is not None else np.ones(len(columns))
+            for column, median, mean, scale in zip(columns, imputer.statistics_, means, scales):
+                features.append((NUMERIC, column, median, mean, scale, ''))
+        elif name == 'cat':
+            encoder = steps['onehot']
+            if encoder.drop_idx_ is not None or getattr(encoder, 'infrequent_categories_', None):
+                raise ValueError("one-hot encoders with drop or infrequent categories are not supported")
+            for column, categories in zip(columns, encoder.categories_):
+                for category in categories:
+                    features.append((ONEHOT, column, 0.0, 0.0, 1.0, str(category)))
+        else:
+            raise ValueError(f"unsupported transformer {name!r}")
+    if len(features) != tree.n_features_in_:
+        raise ValueError(f"preprocessor makes {len(features)} features, the tree expects {tree.n_features_in_}")
+
+    nodes = tree.tree_
+    used = sorted({int(f) for f in nodes.feature if f >= 0})
+    position = {f: i for i, f in enumerate(used)}
+    kinds, columns, medians, means, scales, categories = zip(*[features[f] for f in used]) if used else [()] * 6
+    value = nodes.value[:, 0, :]
+    np.savez(
+        path,
+        format_version=np.array(FORMAT_VERSION),
+        source_digest=np.array(source_digest),
+        kinds=np.array(kinds, dtype=np.int8),
+        columns=np.array(columns, dtype=str),
+        medians=np.array(medians, dtype=np.float64),
+        means=np.array(means, dtype=np.float64),
+        scales=np.array(scales, dtype=np.float64),
+        categories=np.array(categories, dtype=str),
+        feature=np.array([position[f] if f >= 0 else LEAF for f in nodes.feature], dtype=np.int32),
+        threshold=nodes.threshold.astype(np.float64),
+        left=nodes.children_left.astype(np.int32),
+        right=nodes.children_right.astype(np.int32),
+        proba=value / value.sum(axis=1, keepdims=True),
+        classes=np.asarray(tree.classes_)
+    )
+    return path
+
+
+def export_pipeline(pipeline, path=COMPILED_PATH, source_digest=''):
+    return export(pipeline.named_steps['preprocessor'], pipeline.named_steps['classifier'], path, source_digest)
+
+
+class CompiledTree:
+    """Decision tree + preprocessing loaded from an export() file"""
+
+    def __init__(self, path=COMPILED_PATH):
+        # allow_pickle stays off: the file holds plain arrays only
+        with np.load(path) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported format {int(data['format_version'])}")
+            arrays = {name: data[name] for name in data.files}
+        self.path = path
+        self.source_digest = str(arrays['source_digest'])
+        self.kinds = arrays['kinds']
+        self.columns = [str(c) for c in arrays['columns']]
+        self.medians, self.means, self.scales = arrays['medians'], arrays['means'], arrays['scales']
+        self.categories = [str(c) for c in arrays['categories']]
+        self.feature, self.threshold = arrays['feature'], arrays['threshold']
+        self.left, self.right = arrays['left'], arrays['right']
+        self.proba, self.classes = arrays['proba'], arrays['classes']
+        # Plain lists for the single-row path; Python scalars are faster there
+        self._nodes = list(zip(self.feature.tolist(), self.threshold.tolist(),
+                               self.left.tolist(), self.right.tolist()))
+        self._leaf_class = self.classes[self.proba.argmax(axis=1)].tolist()
+        self._inputs = list(zip(self.kinds.tolist(), self.columns, self.medians.tolist(),
+                                self.means.tolist(), self.scales.tolist(), self.categories))
+
+    def _feature_value(self, index, row):
+        kind, column, median, mean, scale, category = self._inputs[index]
+        value = row.get(column)
+        if kind == ONEHOT:
+            return 1.0 if (('missing' if _is_missing(value) else str(value)) == category) else 0.0
+        value = median if _is_missing(value) else float(value)
+        return float(np.float32((value - mean) / scale))
+
+    def leaf(self, row):
+        node = 0
+        while True:
+            feature, threshold, left, right = self._nodes[node]
+            if feature == LEAF:
+                return node
+            node = left if self._feature_value(feature, row) <= threshold else right
+
+    def predict_one(self, row):
+        """Class for one expense given as a dict of input columns"""
+        return self._leaf_class[self.leaf(row)]
+
+    def predict_proba_one(self, row):
+        return self.proba[self.leaf(row)]
+
+    def _matrix(self, frame):
+        """Used features of a DataFrame (or dict of columns) as a float32 matrix"""
+        n = len(frame[self.columns[0]]) if self.columns else len(frame)
+        matrix = np.empty((n, len(self.columns)), dtype=np.float32)
+        for i, (kind, column, median, mean, scale, category) in enumerate(self._inputs):
+            values = np.asarray(frame[column], dtype=object)
+            missing = np.array([_is_missing(v) for v in values], dtype=bool)
+            if kind == ONEHOT:
+                text = np.where(missing, 'missing', values.astype(str))
+                matrix[:, i] = text == category
+            else:
+                numbers = np.where(missing, median, values).astype(np.float64)
+                matrix[:, i] = (numbers - mean) / scale
+        return matrix
+
+    def _leaves(self, frame):
+        matrix = self._matrix(frame)
+        node = np.zeros(len(matrix), dtype=np.int32)
+        rows = np.arange(len(matrix))
+        while True:
+            feature = self.feature[node]
+            inner = feature != LEAF
+            if not inner.any():
+                return node
+            value = matrix[rows[inner], feature[inner]]
+            go_left = value <= self.threshold[node[inner]]
+            node[inner] = np.where(go_left, self.left[node[inner]], self.right[node[inner]])
+
+    def predict(self, frame):
+        """Classes for every row of a DataFrame, like Pipeline.predict"""
+        return self.classes[self.proba[self._leaves(frame)].argmax(axis=1)]
+
+    def predict_proba(self, frame):
+        return self.proba[self._leaves(frame)]
+
+
+def verify(pipeline, compiled, frame):
+    """Rows of `frame` where the compiled tree disagrees with the pipeline (empty = parity)"""
+    expected = pipeline.predict(frame)
+    batch = compiled.predict(frame)
+    single = np.array([compiled.predict_one(row) for row in frame.to_dict('records')])
+    return np.flatnonzero((batch != expected) | (single != expected))
+
+
+def parity_frame(compiled, db_paths, rows=2000, seed=7):
+    """Stored expenses plus random combinations (unknown and missing values included)"""
+    import pandas as pd
+    from train_model import CATEGORICAL_FEATURES, NUMERICAL_FEATURES, load_training_data
+
+    frames = []
+    existing = [path for path in db_paths if os.path.exists(path)]
+    if existing:
+        frames.append(load_training_data(existing)[CATEGORICAL_FEATURES + NUMERICAL_FEATURES])
+    rng = np.random.default_rng(seed)
+    synthetic = {}
+    for column in CATEGORICAL_FEATURES:
+        pool = {c for c, name in zip(compiled.categories, compiled.columns) if name == column}
+        if frames:
+            pool.update(frames[0][column].dropna())
+        pool = sorted(pool) + ['Unknown', None]
+        synthetic[column] = [pool[i] for i in rng.integers(0, len(pool), rows)]
+    synthetic['amount'] = np.where(rng.random(rows) < 0.05, np.nan, np.round(rng.lognormal(6, 1.5, rows), 2))
+    for column in NUMERICAL_FEATURES:
+        if column != 'amount':
+            synthetic[column] = rng.integers(0, 32, rows).astype(float)
+    frames.append(pd.DataFrame(synthetic))
+    return pd.concat([frame for frame in frames if len(frame)], ignore_index=True)
+
+
+if __name__ == '__main__':
+    import joblib
+    from predict import MODEL_PATH
+
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ('', [])
+    if command == 'export':
+        if len(args) == 2:
+            # The notebook's separate preprocessor and tree files
+            path = export(joblib.load(args[0]), joblib.load(args[1]), source_digest=file_digest(*args))
+        else:
+            source = args[0] if args else MODEL_PATH
+            path = export_pipeline(joblib.load(source), source_digest=file_digest(source))
+        print(f"✅ Wrote {path} ({os.path.getsize(path):,} bytes)")
+    elif command == 'verify':
+        compiled = CompiledTree()
+        frame = parity_frame(compiled, args or ['data/user_expenses.db'])
+        mismatches = verify(joblib.load(MODEL_PATH), compiled, frame)
+        if len(mismatches):
+            print(f"❌ {len(mismatches)} of {len(frame)} predictions differ, e.g. rows {mismatches[:10].tolist()}")
+            sys.exit(1)
+        print(f"✅ Identical predictions on {len(frame)} rows")
+    else:
+        print("usage: python src/compiled_model.py export [PIPELINE.pkl | PREPROCESSOR.pkl TREE.pkl]\n"
+              "       python src/compiled_model.py verify [DB_PATH ...]")
+        sys.exit(1)
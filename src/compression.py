@@ -0,0 +1,92 @@
+import gzip
+import re
+
+from flask import request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'application/json',
+                      'application/javascript', 'text/javascript', 'image/svg+xml')
+MIN_SIZE = 500
+
+# Dynamic responses favour speed, immutable static files are compressed once at the highest level
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+_ENCODED_ETAG = re.compile(r'-(?:br|gzip)"')
+_static_cache = LRUCache(maxsize=256)
+
+
+def negotiate(accept_encoding):
+    """Best supported encoding for an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        match = re.match(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?', part)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def init_app(app):
+    """Compress HTML, JSON and static text responses for clients that accept it"""
+
+    @app.before_request
+    def strip_encoding_from_etag():
+        # Clients echo the ETag of the compressed variant; match it against the original
+        if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            request.environ['HTTP_IF_NONE_MATCH'] = _ENCODED_ETAG.sub('"', if_none_match)
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if not encoding:
+            return response
+
+        etag, weak = response.get_etag()
+        response.direct_passthrough = False
+        if etag and 'immutable' in response.headers.get('Cache-Control', ''):
+            # Same bytes for every request, compress once
+            key = (request.path, etag, encoding)
+            body = _static_cache.get(key)
+            if body is None:
+                body = compress(response.get_data(), encoding, STATIC_LEVELS[encoding])
+                _static_cache.set(key, body)
+        else:
+            data = response.get_data()
+            if len(data) < MIN_SIZE:
+                return response
+            body = compress(data, encoding, DYNAMIC_LEVELS[encoding])
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+
+    return app
@@ -5,9 +5,57 @@ import hashlib
 import secrets
 from pathlib import Path
 import os
+from write_queue import WriteQueue
+from read_pool import ReadRouter
+import rollup
+import anomaly
+import budgets
+import recurring
+import search
+import batch
+import changes
+import compact
+import categories
+import archive
+import reports
+from records import EXPENSE_FIELDS, ExpenseRecord, to_columns
+from cache import LRUCache
+
+# Expense list columns as stored (category_id where EXPENSE_FIELDS has the name)
+_LIST_COLUMNS = tuple('category_id' if field == 'category' else field for field in EXPENSE_FIELDS)
+_CATEGORY_POSITION = EXPENSE_FIELDS.index('category')
+_DATE_POSITION, _TIME_POSITION = EXPENSE_FIELDS.index('date'), EXPENSE_FIELDS.index('time')
+
+UPDATABLE_FIELDS = ('date', 'time', 'amount', 'description', 'category', 'subcategory',
+                    'payment_method', 'merchant', 'location')
+
+# The only amounts classify_expense compares with, so amounts between the
+# same limits always classify alike (see _amount_bucket)
+FOOD_ESSENTIAL_LIMIT = 1000
+LARGE_PURCHASE = 2000
+
+DEFAULT_CATEGORIES = [
+    ('Food', '#10b981'),
+    ('Transport', '#3b82f6'),
+    ('Entertainment', '#8b5cf6'),
+    ('Shopping', '#f59e0b'),
+    ('Bills', '#ef4444'),
+    ('Healthcare', '#ec4899'),
+    ('Education', '#06b6d4'),
+    ('Other', '#64748b')
+]
+
+def _normalize_description(description):
+    return ' '.join((description or '').lower().split())
+
+def _amount_bucket(amount):
+    return (amount >= FOOD_ESSENTIAL_LIMIT) + (amount > LARGE_PURCHASE)
 
 class ExpenseDatabase:
-    def __init__(self, db_path='data/user_expenses.db'):
+    # Classifications by (description, amount bucket), shared by every instance
+    classification_cache = LRUCache(int(os.environ.get('EXPENSE_CLASSIFY_CACHE_SIZE', '4096')))
+    
+    def __init__(self, db_path='data/user_expenses.db', seed_admin=True, compact_storage=None):
     
         if db_path:
             self.db_path = db_path
@@ -19,8 +67,32 @@ class ExpenseDatabase:
             self.db_path = 'data/user_expenses.db'
         
         print(f"📊 Database path: {self.db_path}")
+        self.seed_admin = seed_admin
+        # Only decides the layout of new databases, existing ones are migrated with compact.py
+        if compact_storage is None:
+            compact_storage = os.environ.get('EXPENSE_DB_COMPACT', '0') == '1'
+        self.use_compact_storage = compact_storage
+        # Files holding expenses (training data); the shard files when sharded
+        self.expense_db_paths = [self.db_path]
+        # Expenses older than the archive horizon (archive.py)
+        self.archive_path = archive.archive_path(self.db_path)
         self.ensure_directories()
         self.init_database()
+        
+        # All mutations go through one group-committing writer per process
+        use_queue = os.environ.get('EXPENSE_DB_WRITE_QUEUE', '1') != '0'
+        self.writer = WriteQueue(self.db_path, enabled=use_queue,
+                                 timeout=int(os.environ.get('EXPENSE_DB_WRITE_TIMEOUT', '120')))
+        
+        # Read-only methods can use separate ro connections or a snapshot copy
+        self.reader = ReadRouter(
+            self.db_path,
+            mode=os.environ.get('EXPENSE_DB_READ_MODE', 'shared'),
+            refresh_interval=int(os.environ.get('EXPENSE_DB_SNAPSHOT_INTERVAL', '60'))
+        )
+        self._expense_columns = None
+        # Per-user category id <-> name maps
+        self.category_map = categories.CategoryMap()
     
     def ensure_directories(self):
         """Ensure data directory exists"""
@@ -33,6 +105,9 @@ class ExpenseDatabase:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL lets readers run while the writer commits
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Create users table for authentication
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -47,6 +122,99 @@ class ExpenseDatabase:
             )
         ''')
         
+        # Create categories table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                budget REAL DEFAULT 0,
+                color TEXT DEFAULT '#6366f1',
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                UNIQUE(user_id, name)
+            )
+        ''')
+        categories.create_table(cursor)
+        
+        # Compact storage (compact.py) keeps expenses in expense_rows behind an `expenses` view
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses'")
+        is_new = cursor.fetchone() is None
+        self.compact_storage = compact.is_compact(cursor) or (is_new and self.use_compact_storage)
+        if self.compact_storage:
+            compact.create_tables(cursor)
+        else:
+            self._create_expenses_table(cursor)
+        
+        # Files from before category ids store category names in every expense
+        if categories.needs_migration(cursor):
+            self._migrate_category_ids(conn)
+        
+        # Bumped on every change to a user's expenses, used as cache key
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_data_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Range scans by user and date (also serves ORDER BY date, time)
+        if not self.compact_storage:
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+                ON expenses (user_id, date, time)
+            ''')
+        
+        # Per-day aggregates for the time-range API
+        rollup.create_table(cursor)
+        cursor.execute("SELECT 1 FROM daily_rollup LIMIT 1")
+        if not cursor.fetchone():
+            rollup.rebuild(cursor)
+        
+        # Streaming per-category statistics for anomaly scoring
+        anomaly.create_table(cursor)
+        cursor.execute("SELECT 1 FROM category_stats LIMIT 1")
+        if not cursor.fetchone():
+            anomaly.rebuild(cursor)
+        
+        # Running monthly totals for O(1) budget checks
+        budgets.create_table(cursor)
+        cursor.execute("SELECT 1 FROM monthly_category_totals LIMIT 1")
+        if not cursor.fetchone():
+            budgets.rebuild(cursor)
+        
+        # Detected recurring bills and subscriptions
+        recurring.create_table(cursor)
+        
+        # Change feed for delta sync
+        changes.create_table(cursor)
+        cursor.execute("SELECT 1 FROM expense_changes LIMIT 1")
+        if not cursor.fetchone():
+            changes.seed(cursor)
+        
+        # Results of batched operations, by client idempotency key
+        batch.create_table(cursor)
+        
+        # Monthly summaries and horizons of archived expenses
+        archive.create_tables(cursor)
+        
+        # Monthly reports built by reports.py
+        reports.create_table(cursor)
+        
+        # Full-text index over description, merchant and location
+        self.search_available = search.create_table(cursor, compact.TABLE if self.compact_storage else 'expenses')
+        if self.search_available:
+            cursor.execute("SELECT 1 FROM expenses_fts LIMIT 1")
+            if not cursor.fetchone():
+                search.rebuild(cursor)
+        
+        conn.commit()
+        conn.close()
+        
+        # Add default admin user if not exists (shards hold no users)
+        if self.seed_admin:
+            self.create_default_user()
+    
+    def _create_expenses_table(self, cursor):
         # Create expenses table matching YOUR EXISTING SCHEMA
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS expenses (
@@ -54,7 +222,7 @@ class ExpenseDatabase:
                 date TEXT NOT NULL,
                 time TEXT,
                 amount REAL NOT NULL,
-                category TEXT,
+                category_id INTEGER REFERENCES categories (id),
                 subcategory TEXT,
                 description TEXT,
                 payment_method TEXT,
@@ -71,25 +239,53 @@ class ExpenseDatabase:
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
-        
-        # Create categories table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                budget REAL DEFAULT 0,
-                color TEXT DEFAULT '#6366f1',
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                UNIQUE(user_id, name)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        # Add default admin user if not exists
-        self.create_default_user()
+    
+    def _migrate_category_ids(self, conn):
+        """Replace expenses.category names by categories ids (once, on upgrade)"""
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have migrated while this one waited for the lock
+            if categories.needs_migration(cursor):
+                categories.add_missing(cursor)
+                if compact.is_compact(cursor):
+                    compact.adopt_category_ids(cursor)
+                else:
+                    # Ids are kept, so the search index and the change log stay valid
+                    cursor.execute("ALTER TABLE expenses RENAME TO expenses_legacy")
+                    self._create_expenses_table(cursor)
+                    cursor.execute("PRAGMA table_info(expenses_legacy)")
+                    columns = [row[1] for row in cursor.fetchall() if row[1] != 'category']
+                    cursor.execute(f'''
+                        INSERT INTO expenses ({', '.join(columns)}, category_id)
+                        SELECT {', '.join('l.' + column for column in columns)},
+                               (SELECT c.id FROM categories c WHERE c.user_id = l.user_id AND c.name = l.category)
+                        FROM expenses_legacy l ORDER BY l.id
+                    ''')
+                    # Ids of deleted expenses are never reused (the rename moved the sequence)
+                    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'expenses'")
+                    cursor.execute("UPDATE sqlite_sequence SET name = 'expenses' WHERE name = 'expenses_legacy'")
+                    # Takes the old index and search triggers along; both are recreated below
+                    cursor.execute("DROP TABLE expenses_legacy")
+                
+                # Derived tables were keyed by name; recreated and rebuilt below
+                for table in ('daily_rollup', 'category_stats', 'monthly_category_totals'):
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def warmup(self):
+        """Open read connections and pull hot tables into the page cache"""
+        try:
+            with self.reader.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM users")
+                cursor.execute("SELECT COUNT(*) FROM expenses")
+                cursor.fetchall()
+        except Exception as e:
+            print(f"⚠️ Database warmup failed: {e}")
     
     def hash_password(self, password):
         """Hash password using SHA256"""
@@ -115,22 +311,7 @@ class ExpenseDatabase:
                 ''', ('admin', password_hash, 'Administrator', session_token))
                 
                 # Add default categories
-                default_categories = [
-                    ('Food', '#10b981'),
-                    ('Transport', '#3b82f6'),
-                    ('Entertainment', '#8b5cf6'),
-                    ('Shopping', '#f59e0b'),
-                    ('Bills', '#ef4444'),
-                    ('Healthcare', '#ec4899'),
-                    ('Education', '#06b6d4'),
-                    ('Other', '#64748b')
-                ]
-                
-                for category_name, color in default_categories:
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO categories (user_id, name, color)
-                        VALUES (?, ?, ?)
-                    ''', (1, category_name, color))
+                self._insert_default_categories(cursor, 1)
                 
                 print("✅ Created default admin user: admin / admin123")
             
@@ -140,43 +321,38 @@ class ExpenseDatabase:
         except Exception as e:
             print(f"⚠️ Error creating default user: {e}")
     
+    def _insert_default_categories(self, cursor, user_id):
+        cursor.executemany('''
+            INSERT OR IGNORE INTO categories (user_id, name, color)
+            VALUES (?, ?, ?)
+        ''', [(user_id, name, color) for name, color in DEFAULT_CATEGORIES])
+    
+    def add_default_categories(self, user_id):
+        """Give a new user the default categories (in the user's shard when sharded)"""
+        self.writer.execute(lambda cursor: self._insert_default_categories(cursor, user_id))
+    
     # Authentication methods
-    def create_user(self, username, password, email=None, full_name=None):
+    def create_user(self, username, password, email=None, full_name=None, default_categories=True):
         """Create new user"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             password_hash = self.hash_password(password)
             session_token = secrets.token_hex(32)
             
-            cursor.execute('''
-                INSERT INTO users (username, email, password_hash, full_name, session_token)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (username, email, password_hash, full_name, session_token))
-            
-            user_id = cursor.lastrowid
-            
-            # Add default categories for this user
-            default_categories = [
-                ('Food', '#10b981'),
-                ('Transport', '#3b82f6'),
-                ('Entertainment', '#8b5cf6'),
-                ('Shopping', '#f59e0b'),
-                ('Bills', '#ef4444'),
-                ('Healthcare', '#ec4899'),
-                ('Education', '#06b6d4'),
-                ('Other', '#64748b')
-            ]
-            
-            for category_name, color in default_categories:
+            def insert_user(cursor):
                 cursor.execute('''
-                    INSERT INTO categories (user_id, name, color)
-                    VALUES (?, ?, ?)
-                ''', (user_id, category_name, color))
+                    INSERT INTO users (username, email, password_hash, full_name, session_token)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (username, email, password_hash, full_name, session_token))
+                
+                user_id = cursor.lastrowid
+                
+                # Add default categories for this user
+                if default_categories:
+                    self._insert_default_categories(cursor, user_id)
+                
+                return user_id
             
-            conn.commit()
-            conn.close()
+            user_id = self.writer.execute(insert_user)
             
             return {'success': True, 'user_id': user_id, 'session_token': session_token}
         except sqlite3.IntegrityError:
@@ -199,18 +375,16 @@ class ExpenseDatabase:
             ''', (username, password_hash))
             
             user = cursor.fetchone()
+            conn.close()
             
             if user:
                 # Update session token and last login
                 new_token = secrets.token_hex(32)
-                cursor.execute('''
+                self.writer.execute(lambda cursor: cursor.execute('''
                     UPDATE users 
                     SET session_token = ?, last_login = CURRENT_TIMESTAMP
                     WHERE id = ?
-                ''', (new_token, user[0]))
-                
-                conn.commit()
-                conn.close()
+                ''', (new_token, user[0])))
                 
                 return {
                     'success': True,
@@ -222,7 +396,6 @@ class ExpenseDatabase:
                     }
                 }
             else:
-                conn.close()
                 return {'success': False, 'error': 'Invalid credentials'}
                 
         except Exception as e:
@@ -231,17 +404,17 @@ class ExpenseDatabase:
     def verify_session(self, user_id, session_token):
         """Verify user session"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, username, full_name 
-                FROM users 
-                WHERE id = ? AND session_token = ?
-            ''', (user_id, session_token))
-            
-            user = cursor.fetchone()
-            conn.close()
+            # Always live: a token issued a second ago must already be valid
+            with self.reader.connect(live=True) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, username, full_name 
+                    FROM users 
+                    WHERE id = ? AND session_token = ?
+                ''', (user_id, session_token))
+                
+                user = cursor.fetchone()
             
             if user:
                 return {
@@ -259,203 +432,358 @@ class ExpenseDatabase:
             return {'success': False, 'error': str(e)}
     
     # Expense methods
+    def classify_expense(self, description, amount):
+        """Predict (category, is_essential) from the description (AI/ML), cached"""
+        desc_lower = _normalize_description(description)
+        key = (desc_lower, _amount_bucket(amount))
+        result = self.classification_cache.get(key)
+        if result is None:
+            result = self._classify(desc_lower, amount)
+            self.classification_cache.set(key, result)
+        return result
+    
+    def _classify(self, desc_lower, amount):
+        if any(word in desc_lower for word in ['food', 'restaurant', 'coffee', 'lunch', 'dinner', 'breakfast', 'meal', 'snack']):
+            return 'Food', 1 if amount < FOOD_ESSENTIAL_LIMIT else 0
+        elif any(word in desc_lower for word in ['uber', 'taxi', 'fuel', 'petrol', 'bus', 'train', 'metro', 'transport', 'travel']):
+            return 'Transport', 1
+        elif any(word in desc_lower for word in ['bill', 'electricity', 'rent', 'internet', 'water', 'gas', 'mobile', 'subscription']):
+            return 'Bills', 1
+        elif any(word in desc_lower for word in ['movie', 'entertainment', 'game', 'concert', 'party', 'netflix', 'spotify']):
+            return 'Entertainment', 0
+        elif any(word in desc_lower for word in ['medical', 'doctor', 'hospital', 'medicine', 'pharmacy', 'health']):
+            return 'Healthcare', 1
+        elif any(word in desc_lower for word in ['shopping', 'clothes', 'electronics', 'amazon', 'flipkart']):
+            return 'Shopping', 0 if amount > LARGE_PURCHASE else 1
+        else:
+            return 'Other', 0 if amount > LARGE_PURCHASE else 1
+    
+    def prepare_expense(self, user_id, expense_data, classification=None):
+        """Fill in date features and ML predictions before an expense is stored"""
+        # Add user_id to expense data
+        expense_data['user_id'] = user_id
+        
+        # Add current date and time if not provided
+        now = datetime.now()
+        if 'date' not in expense_data:
+            expense_data['date'] = now.strftime('%Y-%m-%d')
+        if 'time' not in expense_data:
+            expense_data['time'] = now.strftime('%H:%M:%S')
+        
+        # Calculate additional features
+        date_obj = datetime.strptime(expense_data['date'], '%Y-%m-%d')
+        expense_data['is_weekend'] = 1 if date_obj.weekday() >= 5 else 0
+        expense_data['is_month_end'] = 1 if date_obj.day >= 25 else 0
+        expense_data['day_of_week'] = date_obj.weekday()
+        expense_data['month'] = date_obj.month
+        
+        # AI Category Prediction
+        predicted_category, is_essential = classification or self.classify_expense(
+            expense_data.get('description', ''), expense_data.get('amount', 0))
+        
+        # Add ML predictions
+        expense_data['predicted_category'] = predicted_category
+        expense_data['is_essential'] = is_essential
+        expense_data['confidence'] = 0.85  # AI confidence score
+        
+        # Add subcategory if not provided (can be empty)
+        if 'subcategory' not in expense_data:
+            expense_data['subcategory'] = ''
+        
+        # Use provided category or predicted one
+        if 'category' not in expense_data or not expense_data['category']:
+            expense_data['category'] = predicted_category
+        
+        return expense_data
+    
+    def prepare_expenses(self, user_id, expenses):
+        """prepare_expense for a batch, classifying each distinct expense once"""
+        keys = [(_normalize_description(expense.get('description')), expense.get('amount', 0))
+                for expense in expenses]
+        classifications = {key: self.classify_expense(*key) for key in set(keys)}
+        return [self.prepare_expense(user_id, expense, classifications[key])
+                for expense, key in zip(expenses, keys)]
+    
     def add_expense(self, user_id, expense_data):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Add user_id to expense data
-            expense_data['user_id'] = user_id
+            expense_data = self.prepare_expense(user_id, expense_data)
             
-            # Add current date and time if not provided
-            now = datetime.now()
-            if 'date' not in expense_data:
-                expense_data['date'] = now.strftime('%Y-%m-%d')
-            if 'time' not in expense_data:
-                expense_data['time'] = now.strftime('%H:%M:%S')
-            
-            # Calculate additional features
-            date_obj = datetime.strptime(expense_data['date'], '%Y-%m-%d')
-            expense_data['is_weekend'] = 1 if date_obj.weekday() >= 5 else 0
-            expense_data['is_month_end'] = 1 if date_obj.day >= 25 else 0
-            expense_data['day_of_week'] = date_obj.weekday()
-            expense_data['month'] = date_obj.month
-            
-            # AI Category Prediction
-            desc_lower = expense_data.get('description', '').lower()
-            amount = expense_data.get('amount', 0)
-            
-            # Predict category based on description (AI/ML)
-            if any(word in desc_lower for word in ['food', 'restaurant', 'coffee', 'lunch', 'dinner', 'breakfast', 'meal', 'snack']):
-                predicted_category = 'Food'
-                is_essential = 1 if amount < 1000 else 0
-            elif any(word in desc_lower for word in ['uber', 'taxi', 'fuel', 'petrol', 'bus', 'train', 'metro', 'transport', 'travel']):
-                predicted_category = 'Transport'
-                is_essential = 1
-            elif any(word in desc_lower for word in ['bill', 'electricity', 'rent', 'internet', 'water', 'gas', 'mobile', 'subscription']):
-                predicted_category = 'Bills'
-                is_essential = 1
-            elif any(word in desc_lower for word in ['movie', 'entertainment', 'game', 'concert', 'party', 'netflix', 'spotify']):
-                predicted_category = 'Entertainment'
-                is_essential = 0
-            elif any(word in desc_lower for word in ['medical', 'doctor', 'hospital', 'medicine', 'pharmacy', 'health']):
-                predicted_category = 'Healthcare'
-                is_essential = 1
-            elif any(word in desc_lower for word in ['shopping', 'clothes', 'electronics', 'amazon', 'flipkart']):
-                predicted_category = 'Shopping'
-                is_essential = 0 if amount > 2000 else 1
-            else:
-                predicted_category = 'Other'
-                is_essential = 0 if amount > 2000 else 1
-            
-            # Add ML predictions
-            expense_data['predicted_category'] = predicted_category
-            expense_data['is_essential'] = is_essential
-            expense_data['confidence'] = 0.85  # AI confidence score
-            
-            # Add subcategory if not provided (can be empty)
-            if 'subcategory' not in expense_data:
-                expense_data['subcategory'] = ''
-            
-            # Use provided category or predicted one
-            if 'category' not in expense_data or not expense_data['category']:
-                expense_data['category'] = predicted_category
-            
-            # Prepare columns and values
-            columns = []
-            values = []
-            placeholders = []
-            
-            # Get all columns that exist in the table
-            cursor.execute("PRAGMA table_info(expenses)")
-            table_columns = [col[1] for col in cursor.fetchall()]
-            
-            # Only include columns that exist in the table
-            for key, value in expense_data.items():
-                if key in table_columns:
-                    columns.append(key)
-                    values.append(value)
-                    placeholders.append('?')
-            
-            if not columns:
-                return {'success': False, 'error': 'No valid columns to insert'}
-            
-            query = f"INSERT INTO expenses ({', '.join(columns)}) VALUES ({', '.join(placeholders)})"
-            
-            cursor.execute(query, values)
-            expense_id = cursor.lastrowid
-            
-            conn.commit()
-            conn.close()
+            expense_id, alerts = self.writer.execute(
+                lambda cursor: self._insert_expense_row(cursor, user_id, expense_data))
             
             return {
                 'success': True,
                 'expense_id': expense_id,
                 'prediction': {
-                    'predicted_category': predicted_category,
-                    'is_essential': is_essential,
+                    'predicted_category': expense_data['predicted_category'],
+                    'is_essential': expense_data['is_essential'],
                     'confidence': 0.85,
-                    'alert': ['✅ AI analyzed your expense']
+                    'alert': alerts or ['✅ AI analyzed your expense']
                 }
             }
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_expenses_list(self, user_id, limit=10):
+    # Row-level writes, always called on the writer inside its transaction.
+    # Every table derived from expenses is kept in sync here.
+    def _insert_expense_row(self, cursor, user_id, expense_data):
+        """Insert one prepared expense and update derived tables.
+        
+        Returns (expense_id, alerts) where alerts are raised against the
+        user's history before this expense was added.
+        """
+        expense_data['category_id'] = self.category_map.ensure_id(cursor, user_id, expense_data.get('category'))
+        
+        # Only include columns that exist in the table
+        table_columns = self.get_expense_columns()
+        columns = [key for key in expense_data if key in table_columns]
+        
+        if not columns:
+            raise ValueError('No valid columns to insert')
+        
+        query = f"INSERT INTO expenses ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        cursor.execute(query, [expense_data[key] for key in columns])
+        expense_id = compact.last_insert_id(cursor) if self.compact_storage else cursor.lastrowid
+        
+        rollup.add_expense(cursor, user_id, expense_data)
+        scored = anomaly.add_expense(cursor, user_id, expense_data['category_id'],
+                                     expense_data.get('category'), expense_data['amount'])
+        budget_alerts = budgets.add_expense(cursor, user_id, expense_data['category_id'],
+                                            expense_data.get('category'), expense_data['date'],
+                                            expense_data['amount'])
+        self._bump_data_version(cursor, user_id)
+        changes.record(cursor, user_id, expense_id, 'upsert')
+        return expense_id, scored['alerts'] + budget_alerts
+    
+    def _delete_expense_row(self, cursor, user_id, expense_id):
+        """Delete one of the user's expenses and update derived tables, returns the old row"""
+        # The user_id filter makes sure the expense belongs to the user
+        cursor.execute('''
+            SELECT date, amount, category_id, payment_method, merchant, is_essential
+            FROM expenses
+            WHERE id = ? AND user_id = ?
+        ''', (expense_id, user_id))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+        
+        expense = dict(zip(('date', 'amount', 'category_id', 'payment_method', 'merchant', 'is_essential'), row))
+        expense['category'] = self.category_map.name(cursor, user_id, expense['category_id'])
+        rollup.remove_expense(cursor, user_id, expense)
+        anomaly.remove_expense(cursor, user_id, expense['category_id'], expense['amount'])
+        budgets.remove_expense(cursor, user_id, expense['category_id'], expense['date'], expense['amount'])
+        self._bump_data_version(cursor, user_id)
+        changes.record(cursor, user_id, expense_id, 'delete')
+        return expense
+    
+    def _update_expense_row(self, cursor, user_id, expense_id, fields):
+        """Change fields of one of the user's expenses and update derived tables, returns the new row"""
+        stored_fields = tuple('category_id' if field == 'category' else field for field in UPDATABLE_FIELDS)
+        cursor.execute(f'''
+            SELECT {', '.join(stored_fields)}, is_essential, predicted_category
+            FROM expenses
+            WHERE id = ? AND user_id = ?
+        ''', (expense_id, user_id))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        old = dict(zip(stored_fields + ('is_essential',), row))
+        old['category'] = self.category_map.name(cursor, user_id, old['category_id'])
+        predicted_category = row[-1]
+        rollup.remove_expense(cursor, user_id, old)
+        anomaly.remove_expense(cursor, user_id, old['category_id'], old['amount'])
+        budgets.remove_expense(cursor, user_id, old['category_id'], old['date'], old['amount'])
+        
+        # Date features and predictions follow the new values
+        expense = {key: value for key, value in old.items()
+                   if key not in ('is_essential', 'category_id') and value is not None}
+        if 'category' not in fields and old['category'] == predicted_category:
+            # The category was never chosen by the user, predict it again
+            del expense['category']
+        expense.update(fields)
+        expense = self.prepare_expense(user_id, expense)
+        expense['category_id'] = self.category_map.ensure_id(cursor, user_id, expense.get('category'))
+        
+        columns = [key for key in expense if key in self.get_expense_columns() and key not in ('id', 'user_id')]
+        cursor.execute(f"UPDATE expenses SET {', '.join(col + ' = ?' for col in columns)} WHERE id = ?",
+                       [expense[col] for col in columns] + [expense_id])
+        
+        rollup.add_expense(cursor, user_id, expense)
+        anomaly.add_expense(cursor, user_id, expense['category_id'], expense.get('category'), expense['amount'])
+        budgets.add_expense(cursor, user_id, expense['category_id'], expense.get('category'),
+                            expense['date'], expense['amount'])
+        self._bump_data_version(cursor, user_id)
+        changes.record(cursor, user_id, expense_id, 'upsert')
+        return expense
+    
+    def _bump_data_version(self, cursor, user_id):
+        """Mark a user's expenses as changed (runs inside the write transaction)"""
+        cursor.execute('''
+            INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+        ''', (user_id,))
+    
+    def get_data_version(self, user_id):
+        """Current data version of a user's expenses"""
+        try:
+            with self.reader.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,))
+                row = cursor.fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            print(f"Error getting data version: {e}")
+            return 0
+    
+    def get_expense_history(self, user_id):
+        """All of a user's expenses as (date, amount, category, is_essential) rows"""
         try:
+            with self.reader.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT date, amount, category_id, is_essential
+                    FROM expenses
+                    WHERE user_id = ?
+                ''', (user_id,))
+                rows = cursor.fetchall()
+                names = self.category_map.names(cursor, user_id)
+            return [(day, amount, names.get(category_id), is_essential)
+                    for day, amount, category_id, is_essential in rows]
+        except Exception as e:
+            print(f"Error getting expense history: {e}")
+            return []
+    
+    def get_expense_columns(self):
+        """Columns of the expenses table (cached, the schema only changes on migration)"""
+        if self._expense_columns is None:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(expenses)")
+            self._expense_columns = [col[1] for col in cursor.fetchall()]
+            conn.close()
+        return self._expense_columns
+    
+    def _expense_list_rows(self, user_id, limit):
+        with self.reader.connect() as conn:
+            cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT id, date, time, amount, description, category, 
-                    subcategory, payment_method, merchant, location, is_essential
+            cursor.execute(f'''
+                SELECT {', '.join(_LIST_COLUMNS)}
                 FROM expenses 
                 WHERE user_id = ? 
-                ORDER BY date DESC, time DESC 
+                ORDER BY {compact.RECENT_ORDER if self.compact_storage else 'date DESC, time DESC'}
                 LIMIT ?
             ''', (user_id, limit))
-            
             rows = cursor.fetchall()
-            conn.close()
-            
-            expenses = []
-            for row in rows:
-                expenses.append({
-                    'id': row[0],
-                    'date': row[1],
-                    'time': row[2],
-                    'amount': row[3],
-                    'description': row[4],
-                    'category': row[5],
-                    'subcategory': row[6] or '',
-                    'payment_method': row[7] or 'Cash',
-                    'merchant': row[8] or '',
-                    'location': row[9] or '',
-                    'is_essential': row[10] or 0
-                })
-            
-            return expenses
+            # Older expenses are in the archive: reach in once the recent ones run out
+            before = archive.horizon(cursor, user_id)
+            if (before and (len(rows) < limit or rows[-1][_DATE_POSITION] < before)
+                    and archive.attach(conn, self.archive_path)):
+                rows = sorted(rows + archive.recent_rows(cursor, user_id, _LIST_COLUMNS, limit),
+                              key=lambda row: (row[_DATE_POSITION], row[_TIME_POSITION] or ''),
+                              reverse=True)[:limit]
+            names = self.category_map.names(cursor, user_id)
+        
+        # Category ids back to names, in EXPENSE_FIELDS order
+        at = _CATEGORY_POSITION
+        return [row[:at] + (names.get(row[at]),) + row[at + 1:] for row in rows]
+    
+    def get_expenses_list(self, user_id, limit=10):
+        """Latest expenses as ExpenseRecord objects"""
+        try:
+            return ExpenseRecord.from_rows(self._expense_list_rows(user_id, limit))
         except Exception as e:
             print(f"Error getting expenses: {e}")
             return []
     
+    def get_expenses_columnar(self, user_id, limit=10):
+        """Latest expenses as parallel arrays, one per field"""
+        try:
+            return to_columns(self._expense_list_rows(user_id, limit))
+        except Exception as e:
+            print(f"Error getting expenses: {e}")
+            return to_columns([])
+    
     def delete_expense(self, user_id, expense_id):
         """Delete expense if it belongs to user"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            deleted = self.writer.execute(
+                lambda cursor: self._delete_expense_row(cursor, user_id, expense_id))
             
-            # Verify expense belongs to user
-            cursor.execute('SELECT id FROM expenses WHERE id = ? AND user_id = ?', 
-                          (expense_id, user_id))
-            expense = cursor.fetchone()
+            if deleted:
+                return {'success': True, 'message': 'Expense deleted'}
+            else:
+                return {'success': False, 'error': 'Expense not found or unauthorized'}
+                
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def update_expense(self, user_id, expense_id, fields):
+        """Edit an expense if it belongs to user"""
+        fields = {key: value for key, value in fields.items() if key in UPDATABLE_FIELDS}
+        if not fields:
+            return {'success': False, 'error': 'No fields to update'}
+        
+        try:
+            expense = self.writer.execute(
+                lambda cursor: self._update_expense_row(cursor, user_id, expense_id, fields))
             
             if expense:
-                cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-                conn.commit()
-                conn.close()
-                return {'success': True, 'message': 'Expense deleted'}
+                return {'success': True, 'message': 'Expense updated'}
             else:
-                conn.close()
                 return {'success': False, 'error': 'Expense not found or unauthorized'}
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def get_changes(self, user_id, since=0, limit=changes.MAX_CHANGES):
+        """Expense changes after a sync cursor (upserts and delete tombstones)"""
+        with self.reader.connect(live=True) as conn:
+            return changes.fetch(conn.cursor(), user_id, since, limit)
+    
     def get_monthly_stats(self, user_id):
         """Get statistics for current month"""
         try:
-            current_month = datetime.now().strftime('%Y-%m')
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    COALESCE(SUM(amount), 0) as total_spent,
-                    COALESCE(COUNT(*), 0) as total_transactions,
-                    COALESCE(AVG(amount), 0) as avg_transaction,
-                    COALESCE(MAX(amount), 0) as most_expensive
-                FROM expenses 
-                WHERE user_id = ? AND strftime('%Y-%m', date) = ?
-            ''', (user_id, current_month))
-            
-            stats_row = cursor.fetchone()
-            
-            # Get favorite category
-            cursor.execute('''
-                SELECT category, COUNT(*) as count 
-                FROM expenses 
-                WHERE user_id = ? AND strftime('%Y-%m', date) = ?
-                GROUP BY category 
-                ORDER BY count DESC 
-                LIMIT 1
-            ''', (user_id, current_month))
-            
-            category_row = cursor.fetchone()
-            favorite_category = category_row[0] if category_row else "No data"
+            # Range on the (user_id, date) index instead of strftime() per row
+            month_start, next_month = rollup.month_bounds()
+            date_column = 'date'
+            if self.compact_storage:
+                date_column = 'day'
+                month_start, next_month = compact.day_number(month_start), compact.day_number(next_month)
             
-            conn.close()
+            with self.reader.connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(f'''
+                    SELECT 
+                        COALESCE(SUM(amount), 0) as total_spent,
+                        COALESCE(COUNT(*), 0) as total_transactions,
+                        COALESCE(AVG(amount), 0) as avg_transaction,
+                        COALESCE(MAX(amount), 0) as most_expensive
+                    FROM expenses 
+                    WHERE user_id = ? AND {date_column} >= ? AND {date_column} < ?
+                ''', (user_id, month_start, next_month))
+                
+                stats_row = cursor.fetchone()
+                
+                # Get favorite category (max() picks the row, no sort over the groups)
+                cursor.execute(f'''
+                    SELECT category_id, MAX(count) FROM (
+                        SELECT category_id, COUNT(*) as count 
+                        FROM expenses 
+                        WHERE user_id = ? AND {date_column} >= ? AND {date_column} < ?
+                        GROUP BY category_id
+                    )
+                ''', (user_id, month_start, next_month))
+                
+                category_row = cursor.fetchone()
+                if category_row and category_row[1] is None:
+                    category_row = None
+                favorite_category = (self.category_map.name(cursor, user_id, category_row[0])
+                                     if category_row else "No data")
             
             return {
                 'total_spent': float(stats_row[0]),
@@ -473,4 +801,253 @@ class ExpenseDatabase:
                 'avg_transaction': 0,
                 'most_expensive': 0,
                 'favorite_category': "No data"
-            }
\ No newline at end of file
+            }
+    
+    def aggregate(self, user_id, start, end, granularity='day', group_by=None):
+        """Spending totals per day/week/month/year between two ISO dates"""
+        with self.reader.connect() as conn:
+            archived = archive.rollup_source(conn, self.archive_path, user_id, start, end, granularity)
+            return rollup.aggregate(conn.cursor(), user_id, start, end, granularity, group_by, archived)
+    
+    def scan_anomalies(self, user_id):
+        """Rescan a user's whole history and return unusual expenses"""
+        with self.reader.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, date, description, category_id, amount
+                FROM expenses
+                WHERE user_id = ?
+            ''', (user_id,))
+            rows = cursor.fetchall()
+            names = self.category_map.names(cursor, user_id)
+        
+        if not rows:
+            return []
+        ids, dates, descriptions, category_ids, amounts = zip(*rows)
+        return anomaly.scan_history(ids, [names.get(c) for c in category_ids], amounts, dates, descriptions)
+    
+    def rebuild_category_stats(self, user_id=None):
+        """Recompute anomaly statistics from scratch (fixes drifted quantile sketches)"""
+        self.writer.execute(lambda cursor: anomaly.rebuild(cursor, user_id))
+    
+    # Budget methods
+    def get_budgets(self, user_id, month=None):
+        """Budgets and spending per category for a month (default: current)"""
+        try:
+            with self.reader.connect() as conn:
+                return budgets.get_budgets(conn.cursor(), user_id, month)
+        except Exception as e:
+            print(f"Error getting budgets: {e}")
+            return []
+    
+    def set_budget(self, user_id, category, budget):
+        """Set the monthly budget of one category"""
+        try:
+            self.writer.execute(lambda cursor: budgets.set_budget(cursor, user_id, category, budget))
+            return {'success': True, 'category': category, 'budget': budget}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def rename_category(self, user_id, old_name, new_name):
+        """Rename a category; its expenses follow through category_id"""
+        def rename(cursor):
+            category_id = categories.rename(cursor, user_id, old_name, new_name)
+            if category_id is None:
+                return False
+            # Cached responses and sync clients still show the old name
+            changes.record_category(cursor, user_id, category_id)
+            self._bump_data_version(cursor, user_id)
+            return True
+        
+        try:
+            renamed = self.writer.execute(rename)
+        except sqlite3.IntegrityError:
+            return {'success': False, 'error': f'Category {new_name} already exists'}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        self.category_map.forget(user_id)
+        
+        if renamed:
+            return {'success': True, 'category': new_name}
+        return {'success': False, 'error': 'Category not found'}
+    
+    def get_monthly_report(self, user_id, month=None):
+        """Stored monthly report (default: last month), None until reports.py has built it"""
+        with self.reader.connect() as conn:
+            return reports.get_report(conn.cursor(), user_id, month or reports.previous_month())
+    
+    # Recurring expense methods
+    def detect_recurring(self, user_id=None):
+        """Mine history (one user or everyone) for recurring expenses"""
+        return self.writer.execute(lambda cursor: recurring.detect(cursor, user_id))
+    
+    def get_recurring(self, user_id):
+        with self.reader.connect() as conn:
+            return recurring.list_schedules(conn.cursor(), user_id)
+    
+    def set_recurring_active(self, user_id, schedule_id, active):
+        return self.writer.execute(
+            lambda cursor: recurring.set_active(cursor, user_id, schedule_id, active))
+    
+    def materialize_recurring(self):
+        """Add all due recurring expenses in one batch, returns how many were added"""
+        return recurring.materialize_due(self)
+    
+    # Search
+    def search_expenses(self, user_id, text, start=None, end=None, limit=50, prefix=True):
+        """Ranked full-text search over the user's expenses"""
+        with self.reader.connect() as conn:
+            if self.search_available:
+                return search.search(conn.cursor(), user_id, text, start, end, limit, prefix)
+            return search.search_like(conn.cursor(), user_id, text, start, end, limit)
+    
+    def optimize_search_index(self):
+        if self.search_available:
+            self.writer.execute(search.optimize)
+    
+    # Batch sync
+    def apply_batch(self, user_id, operations):
+        """Apply create/delete operations in one transaction, one result per operation"""
+        return batch.apply(self, user_id, operations)
+    
+    # Admin reporting
+    def usage_summary(self, months=12):
+        """Totals over every user in this database file"""
+        since = (pd.Timestamp.today().to_period('M') - (months - 1)).strftime('%Y-%m')
+        with self.reader.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM users")
+            registered_users = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(DISTINCT user_id), COUNT(*), COALESCE(SUM(amount), 0) FROM expenses")
+            active_users, expenses, total = cursor.fetchone()
+            # Archived expenses count through their monthly summaries
+            cursor.execute("SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total), 0) FROM archived_months")
+            archived, archived_total = cursor.fetchone()
+            
+            # Rollup rows instead of expenses: one row per user, day and category
+            cursor.execute('''
+                SELECT substr(day, 1, 7), SUM(total), SUM(count)
+                FROM daily_rollup
+                WHERE day >= ?
+                GROUP BY 1
+                UNION ALL
+                SELECT month, SUM(total), SUM(count)
+                FROM archived_months
+                WHERE month >= ?
+                GROUP BY 1
+            ''', (since, since))
+            by_month = {}
+            for month, total_, count in cursor.fetchall():
+                entry = by_month.setdefault(month, {'total': 0, 'count': 0})
+                entry['total'] += total_
+                entry['count'] += count
+            cursor.execute(f'''
+                SELECT {categories.name_of('r.category_id')}, SUM(r.total), SUM(r.count)
+                FROM daily_rollup r
+                GROUP BY r.category_id
+                UNION ALL
+                SELECT {categories.name_of('a.category_id')}, SUM(a.total), SUM(a.count)
+                FROM archived_months a
+                GROUP BY a.category_id
+            ''')
+            by_category = {}
+            for category, total_, count in cursor.fetchall():
+                entry = by_category.setdefault(category or 'Other', {'total': 0, 'count': 0})
+                entry['total'] += total_
+                entry['count'] += count
+        
+        return {
+            'registered_users': registered_users,
+            'active_users': active_users,
+            'expenses': expenses + archived,
+            'archived_expenses': archived,
+            'total': total + archived_total,
+            'by_month': by_month,
+            'by_category': by_category
+        }
+    
+    # Maintenance (run by the background scheduler)
+    def _maintenance_connection(self):
+        # Autocommit connection: VACUUM and checkpoints cannot run in a transaction
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=60)
+        conn.execute("PRAGMA busy_timeout = 60000")
+        return conn
+    
+    def refresh_rollups(self, user_id=None):
+        """Recompute the daily rollup and monthly totals from expenses"""
+        def refresh(cursor):
+            rollup.rebuild(cursor, user_id)
+            budgets.rebuild(cursor, user_id)
+        self.writer.execute(refresh)
+    
+    def optimize(self, analyze=False):
+        """Refresh query planner statistics"""
+        conn = self._maintenance_connection()
+        try:
+            if analyze:
+                conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+    
+    def archive_expenses(self, months):
+        """Move expenses older than `months` months into the archive database, returns how many"""
+        if months < archive.MIN_MONTHS:
+            raise ValueError(f"expenses must stay unarchived for at least {archive.MIN_MONTHS} months")
+        before = archive.horizon_for(months)
+        with self.reader.connect(live=True) as conn:
+            user_ids = archive.users_before(conn.cursor(), before, self.compact_storage)
+        if not user_ids:
+            return 0
+        
+        moved = 0
+        conn = archive.open_archive(self.db_path)
+        try:
+            for user_id in user_ids:
+                copied, version = archive.copy_user(conn.cursor(), user_id, before, self.compact_storage)
+                
+                def release(cursor):
+                    if not archive.release_user(cursor, user_id, before, version, self.compact_storage):
+                        return 0  # changed meanwhile, the next run tries again
+                    self._bump_data_version(cursor, user_id)
+                    return copied
+                moved += self.writer.execute(release)
+        finally:
+            conn.close()
+        return moved
+    
+    def vacuum(self):
+        """Rebuild the database file to reclaim free pages"""
+        conn = self._maintenance_connection()
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    
+    def checkpoint_wal(self):
+        """Copy the WAL back into the database and truncate it"""
+        conn = self._maintenance_connection()
+        try:
+            busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            return {'busy': bool(busy), 'log_pages': log_pages, 'checkpointed': checkpointed}
+        finally:
+            conn.close()
+    
+    def expire_sessions(self, max_age_days=30):
+        """Drop session tokens of users who have not logged in for max_age_days"""
+        def expire(cursor):
+            cursor.execute('''
+                UPDATE users SET session_token = NULL
+                WHERE session_token IS NOT NULL
+                AND COALESCE(last_login, created_at) < datetime('now', ?)
+            ''', (f'-{int(max_age_days)} days',))
+            return cursor.rowcount
+        return self.writer.execute(expire)
+    
+    def expire_idempotency_keys(self, days=batch.KEY_RETENTION_DAYS):
+        """Forget batch results older than `days` (clients must have synced by then)"""
+        return self.writer.execute(lambda cursor: batch.expire_keys(cursor, days))
+    
+    def purge_change_tombstones(self, days=changes.TOMBSTONE_RETENTION_DAYS):
+        """Drop delete tombstones older than `days`; clients behind them resync"""
+        return self.writer.execute(lambda cursor: changes.purge_tombstones(cursor, days))
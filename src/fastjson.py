@@ -0,0 +1,43 @@
+# JSON responses encoded with orjson when it is installed (pip install
+# orjson), with Flask's stdlib encoder as the fallback. The output matches
+# the default provider: sorted keys, compact outside debug, dates as HTTP
+# dates. EXPENSE_JSON_BACKEND=stdlib forces the fallback.
+
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json only
+    orjson = None
+
+
+def default(o):
+    # Compact records (ExpenseRecord) serialize as plain objects
+    if hasattr(o, 'to_dict'):
+        return o.to_dict()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() through orjson; dumps()/loads() (sessions, tests) stay on stdlib json"""
+
+    default = staticmethod(default)
+    backend = 'orjson' if orjson and os.environ.get('EXPENSE_JSON_BACKEND') != 'stdlib' else 'stdlib'
+
+    def response(self, *args, **kwargs):
+        if self.backend != 'orjson':
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+                  | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            # orjson.JSONEncodeError: integers beyond 64 bits, mixed key types, ...
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
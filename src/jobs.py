@@ -0,0 +1,103 @@
+# Maintenance and precomputation jobs run by the background scheduler.
+# Each job is a plain function of the ExpenseDatabase; intervals are in
+# seconds and can be overridden with EXPENSE_JOB_<NAME>_INTERVAL.
+
+import os
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+SESSION_MAX_AGE_DAYS = int(os.environ.get('SESSION_MAX_AGE_DAYS', '30'))
+# Expenses older than this many months move to the archive database (0 = off)
+ARCHIVE_MONTHS = int(os.environ.get('EXPENSE_ARCHIVE_MONTHS', '0'))
+
+
+def recurring_expenses(db):
+    db.detect_recurring()
+    created = db.materialize_recurring()
+    if created:
+        print(f"🔁 Added {created} recurring expenses")
+
+
+def refresh_rollups(db):
+    # Incremental maintenance keeps these exact; the rebuild corrects any drift
+    db.refresh_rollups()
+
+
+def rebuild_category_stats(db):
+    # Quantile sketches cannot forget deleted expenses
+    db.rebuild_category_stats()
+
+
+def expire_idempotency_keys(db):
+    db.expire_idempotency_keys()
+
+
+def purge_change_tombstones(db):
+    db.purge_change_tombstones()
+
+
+def archive_expenses(db):
+    if ARCHIVE_MONTHS:
+        moved = db.archive_expenses(ARCHIVE_MONTHS)
+        if moved:
+            print(f"🗄️ Archived {moved} expenses")
+
+
+def retrain_model(db):
+    from train_model import train_model
+    result = train_model(db.expense_db_paths)
+    if result:
+        print(f"🤖 Model retrained on {result['rows']} expenses")
+
+
+def optimize(db):
+    db.optimize()
+
+
+def analyze(db):
+    db.optimize(analyze=True)
+
+
+def optimize_search_index(db):
+    db.optimize_search_index()
+
+
+def vacuum(db):
+    db.vacuum()
+
+
+def checkpoint_wal(db):
+    db.checkpoint_wal()
+
+
+def expire_sessions(db):
+    expired = db.expire_sessions(SESSION_MAX_AGE_DAYS)
+    if expired:
+        print(f"🔒 Expired {expired} idle sessions")
+
+
+# (name, function, interval, delay before the first run)
+JOBS = [
+    ('checkpoint_wal', checkpoint_wal, 5 * MINUTE, 5 * MINUTE),
+    ('recurring_expenses', recurring_expenses, HOUR, 30),
+    ('expire_sessions', expire_sessions, HOUR, 2 * MINUTE),
+    ('optimize', optimize, 6 * HOUR, 10 * MINUTE),
+    ('expire_idempotency_keys', expire_idempotency_keys, DAY, 3 * HOUR),
+    ('purge_change_tombstones', purge_change_tombstones, DAY, 3 * HOUR),
+    ('refresh_rollups', refresh_rollups, DAY, HOUR),
+    ('rebuild_category_stats', rebuild_category_stats, DAY, HOUR),
+    ('archive_expenses', archive_expenses, DAY, 4 * HOUR),
+    ('retrain_model', retrain_model, 7 * DAY, DAY),
+    ('analyze', analyze, 7 * DAY, DAY),
+    ('optimize_search_index', optimize_search_index, 7 * DAY, DAY),
+    ('vacuum', vacuum, 7 * DAY, 2 * DAY)
+]
+
+
+def register_jobs(scheduler, db):
+    for name, fn, interval, initial_delay in JOBS:
+        interval = int(os.environ.get(f'EXPENSE_JOB_{name.upper()}_INTERVAL', interval))
+        scheduler.register(name, lambda fn=fn: fn(db), interval, min(initial_delay, interval))
+    return scheduler
@@ -1,8 +1,55 @@
+import os
 import pandas as pd
 from datetime import datetime
+from anomaly import score as score_anomaly
+from compiled_model import COMPILED_PATH, CompiledTree, file_digest
 
-def analyze_expense_in_realtime(expense_data):
-    """Real-time expense analysis (simple version)"""
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'models', 'expense_classifier_pipeline.pkl')
+
+_model = None
+_model_mtime = None
+
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def load_model():
+    """Load the trained classifier, again after it is retrained.
+    
+    Served from the sklearn-free export (compiled_model.py) when it was
+    made from the current pickle, otherwise from the pickle itself.
+    """
+    global _model, _model_mtime
+    mtime = (_file_mtime(MODEL_PATH), _file_mtime(COMPILED_PATH))
+    if _model is None or mtime != _model_mtime:
+        _model_mtime = mtime
+        _model = False
+        try:
+            compiled = CompiledTree(COMPILED_PATH)
+            if compiled.source_digest == file_digest(MODEL_PATH):
+                _model = compiled
+                print(f"🤖 Loaded compiled ML model: {COMPILED_PATH}")
+        except (OSError, KeyError, ValueError):
+            pass
+        if _model is False:
+            try:
+                import joblib
+                _model = joblib.load(MODEL_PATH)
+                print(f"🤖 Loaded ML model: {MODEL_PATH}")
+            except Exception as e:
+                print(f"⚠️ Could not load ML model: {e}")
+    return _model or None
+
+def analyze_expense_in_realtime(expense_data, category_stats=None):
+    """Real-time expense analysis.
+    
+    category_stats is the user's (n, mean, m2, sketch) row from
+    category_stats for the predicted category; without it the fixed
+    amount thresholds are used.
+    """
     now = datetime.now()
     
     amount = float(expense_data.get('amount', 0))
@@ -31,10 +78,14 @@ def analyze_expense_in_realtime(expense_data):
         is_essential = 1
 
     alerts = []
-    if amount > 10000:
-        alerts.append(f"🚨 Large expense detected: ₹{amount:,.2f}")
-    if not is_essential and amount > 5000:
-        alerts.append(f"💸 High non-essential spending: ₹{amount:,.2f}")
+    if category_stats is not None:
+        # Scored against the user's own history for this category
+        alerts.extend(score_anomaly(category_stats, predicted_category, amount)['alerts'])
+    else:
+        if amount > 10000:
+            alerts.append(f"🚨 Large expense detected: ₹{amount:,.2f}")
+        if not is_essential and amount > 5000:
+            alerts.append(f"💸 High non-essential spending: ₹{amount:,.2f}")
     if not alerts:
         alerts.append("✅ Expense looks normal")
     
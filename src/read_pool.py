@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ReadRouter:
+    """Hands out connections for read-only queries.
+
+    Modes:
+        shared   - a fresh read/write connection per call (original behaviour)
+        readonly - one `mode=ro` + `query_only` connection per thread, reused
+        snapshot - like readonly, but on a copy of the database refreshed
+                   with the SQLite backup API every `refresh_interval` seconds
+
+    Queries that must see the latest commit (session checks) pass
+    live=True and are never served from the snapshot.
+    """
+
+    MODES = ('shared', 'readonly', 'snapshot')
+
+    def __init__(self, db_path, mode='shared', snapshot_path=None, refresh_interval=60):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown read mode: {mode}")
+        self.db_path = db_path
+        self.mode = mode
+        self.snapshot_path = snapshot_path or f"{os.path.splitext(db_path)[0]}.snapshot.db"
+        self.refresh_interval = refresh_interval
+        self.stats = {'snapshot_refreshes': 0, 'last_refresh_seconds': 0.0}
+        self._local = threading.local()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+
+    # Connections
+    def _open_readonly(self, path):
+        uri = Path(path).absolute().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _thread_connection(self, name, path, generation=0):
+        # Connections are cached per thread and per process (fork safe)
+        key = (name, os.getpid())
+        cached = getattr(self._local, 'connections', {}).get(key)
+        if cached and cached[1] == generation:
+            return cached[0]
+        if cached:
+            cached[0].close()
+        conn = self._open_readonly(path)
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        self._local.connections[key] = (conn, generation)
+        return conn
+
+    @contextmanager
+    def connect(self, live=False):
+        """Yield a connection for read-only queries"""
+        if self.mode == 'shared':
+            conn = sqlite3.connect(self.db_path)
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        if self.mode == 'snapshot' and not live:
+            self._ensure_snapshot()
+            yield self._thread_connection('snapshot', self.snapshot_path, self._generation)
+        else:
+            yield self._thread_connection('live', self.db_path)
+
+    # Snapshot maintenance
+    def _ensure_snapshot(self):
+        if self._refresher_pid != os.getpid():
+            with self._lock:
+                if self._refresher_pid != os.getpid():
+                    self.refresh_snapshot()
+                    thread = threading.Thread(target=self._refresh_loop,
+                                              name='expense-db-snapshot', daemon=True)
+                    thread.start()
+                    self._refresher_pid = os.getpid()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh_snapshot()
+            except Exception as e:
+                print(f"⚠️ Snapshot refresh failed: {e}")
+
+    def refresh_snapshot(self):
+        """Copy the live database into the snapshot file"""
+        started = time.perf_counter()
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+
+        source = self._open_readonly(self.db_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            # One step: a single read transaction, which never blocks WAL writers
+            source.backup(target)
+            # No -wal/-shm side files, so the file can be swapped in atomically
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+
+        # Readers holding the old file keep their view until they reconnect
+        os.replace(tmp_path, self.snapshot_path)
+        self._generation += 1
+        self.stats['snapshot_refreshes'] += 1
+        self.stats['last_refresh_seconds'] = round(time.perf_counter() - started, 4)
@@ -0,0 +1,52 @@
+# Compact in-memory form of expense list rows.
+# ExpenseRecord uses __slots__ (no per-row __dict__), and the columnar
+# format transposes a page of rows into one list per field, so a large
+# page is 11 lists of scalars instead of thousands of 11-key dicts.
+
+EXPENSE_FIELDS = ('id', 'date', 'time', 'amount', 'description', 'category',
+                  'subcategory', 'payment_method', 'merchant', 'location', 'is_essential')
+
+# Defaults for NULL columns, as the expense list has always returned them
+FIELD_DEFAULTS = {'subcategory': '', 'payment_method': 'Cash', 'merchant': '',
+                  'location': '', 'is_essential': 0}
+
+
+class ExpenseRecord:
+    """One expense of the expense list (fields as in EXPENSE_FIELDS)"""
+
+    __slots__ = EXPENSE_FIELDS
+
+    def __init__(self, id, date, time, amount, description, category,
+                 subcategory, payment_method, merchant, location, is_essential):
+        self.id = id
+        self.date = date
+        self.time = time
+        self.amount = amount
+        self.description = description
+        self.category = category
+        self.subcategory = subcategory or ''
+        self.payment_method = payment_method or 'Cash'
+        self.merchant = merchant or ''
+        self.location = location or ''
+        self.is_essential = is_essential or 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Rows selected in EXPENSE_FIELDS order"""
+        return [cls(*row) for row in rows]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in EXPENSE_FIELDS}
+
+    def __repr__(self):
+        return f"ExpenseRecord(id={self.id!r}, date={self.date!r}, amount={self.amount!r})"
+
+
+def to_columns(rows):
+    """Rows selected in EXPENSE_FIELDS order as {'count': n, 'columns': {field: [values]}}"""
+    columns = list(zip(*rows)) if rows else [()] * len(EXPENSE_FIELDS)
+    data = {}
+    for name, values in zip(EXPENSE_FIELDS, columns):
+        default = FIELD_DEFAULTS.get(name)
+        data[name] = [value or default for value in values] if default is not None else list(values)
+    return {'count': len(rows), 'columns': data}
@@ -0,0 +1,291 @@
+# Recurring expense detection and materialization.
+# Detection mines (merchant or description, amount, interval) patterns from
+# each user's history in one ordered pass; materialization inserts every
+# due occurrence of every schedule in a single write transaction.
+# Monthly, quarterly and yearly schedules keep the day of month of the
+# detected series (anchor_day), so a bill on the 31st comes back to the
+# 31st after a short month (python -m doctest src/recurring.py checks it).
+
+import calendar
+import statistics
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+import categories
+
+PATTERN_SQL = "lower(trim(COALESCE(NULLIF(merchant, ''), description)))"
+
+# (name, days, tolerance in days)
+PERIODS = [
+    ('weekly', 7, 1),
+    ('biweekly', 14, 2),
+    ('monthly', 30, 3),
+    ('quarterly', 91, 6),
+    ('yearly', 365, 10)
+]
+
+MIN_OCCURRENCES = 3
+MAX_AMOUNT_SPREAD = 0.1     # amounts within +/-10% of the median
+MIN_REGULAR_SHARE = 0.75    # share of gaps that must match the period
+MAX_CATCH_UP = 12           # occurrences materialized per schedule per run
+MONTH_STEPS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            pattern_key TEXT NOT NULL,
+            description TEXT,
+            merchant TEXT,
+            category TEXT,
+            payment_method TEXT,
+            amount REAL NOT NULL,
+            period TEXT NOT NULL,
+            interval_days INTEGER NOT NULL,
+            occurrences INTEGER NOT NULL DEFAULT 0,
+            last_date TEXT NOT NULL,
+            next_due TEXT NOT NULL,
+            anchor_day INTEGER,
+            active INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE (user_id, pattern_key)
+        )
+    ''')
+    # Tables from before anchor days; detect() fills them in
+    cursor.execute("PRAGMA table_info(recurring_expenses)")
+    if 'anchor_day' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE recurring_expenses ADD COLUMN anchor_day INTEGER")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recurring_due
+        ON recurring_expenses (active, next_due)
+    ''')
+    # A user's schedules in due order, without sorting
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recurring_user_due
+        ON recurring_expenses (user_id, next_due)
+    ''')
+
+
+def _add_months(day, months, anchor_day=None):
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    # Clamp to the last day of shorter months (31 Jan -> 28/29 Feb), from
+    # the anchor rather than the clamped date, so the day never drifts
+    return date(year, month, min(anchor_day or day.day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(day, period, interval_days, anchor_day=None):
+    """Due date after `day`; month-based periods land on anchor_day (or the month's last day)
+
+    >>> due = date(2026, 1, 31)
+    >>> for _ in range(4):
+    ...     due = next_occurrence(due, 'monthly', 30, anchor_day=31)
+    ...     print(due)
+    2026-02-28
+    2026-03-31
+    2026-04-30
+    2026-05-31
+    >>> next_occurrence(date(2025, 11, 30), 'quarterly', 91, anchor_day=30)
+    datetime.date(2026, 2, 28)
+    >>> next_occurrence(date(2026, 2, 28), 'quarterly', 91, anchor_day=30)
+    datetime.date(2026, 5, 30)
+    """
+    if period in MONTH_STEPS:
+        return _add_months(day, MONTH_STEPS[period], anchor_day)
+    return day + timedelta(days=interval_days)
+
+
+def anchor_of(days, period):
+    """Day of month a month-based series is due on: the most common one (the later on ties)
+
+    >>> anchor_of([date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)], 'monthly')
+    31
+    """
+    if period not in MONTH_STEPS:
+        return None
+    return max(statistics.multimode(day.day for day in days))
+
+
+def _match_period(gaps):
+    typical = statistics.median(gaps)
+    for name, days, tolerance in PERIODS:
+        if abs(typical - days) <= tolerance:
+            regular = sum(1 for g in gaps if abs(g - days) <= tolerance)
+            if regular / len(gaps) >= MIN_REGULAR_SHARE:
+                return name, days
+    return None
+
+
+def detect_schedule(occurrences, today=None):
+    """Find a schedule in one pattern's (date, amount, ...) rows sorted by date"""
+    if len(occurrences) < MIN_OCCURRENCES:
+        return None
+
+    amounts = [row[1] for row in occurrences]
+    typical_amount = statistics.median(amounts)
+    if typical_amount <= 0 or any(abs(a - typical_amount) > typical_amount * MAX_AMOUNT_SPREAD
+                                  for a in amounts):
+        return None
+
+    days = [datetime.strptime(row[0], '%Y-%m-%d').date() for row in occurrences]
+    gaps = [(b - a).days for a, b in zip(days, days[1:]) if b != a]
+    if len(gaps) < MIN_OCCURRENCES - 1:
+        return None
+
+    match = _match_period(gaps)
+    if not match:
+        return None
+    period, interval_days = match
+    anchor_day = anchor_of(days, period)
+
+    # Patterns that stopped more than two periods ago are no longer running
+    today = today or date.today()
+    if (today - days[-1]).days > 2 * interval_days + 7:
+        return None
+
+    return {
+        'period': period,
+        'interval_days': interval_days,
+        'amount': round(typical_amount, 2),
+        'occurrences': len(occurrences),
+        'last_date': days[-1].isoformat(),
+        'next_due': next_occurrence(days[-1], period, interval_days, anchor_day).isoformat(),
+        'anchor_day': anchor_day
+    }
+
+
+def detect(cursor, user_id=None, today=None):
+    """Mine expense history for recurring patterns and store them, returns count"""
+    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    # One pass over the history, grouped by user and pattern
+    cursor.execute(f'''
+        SELECT user_id, {PATTERN_SQL} AS pattern, date, amount, description, merchant,
+               {categories.name_of()}, payment_method
+        FROM expenses
+        {user_filter}
+        ORDER BY user_id, pattern, date
+    ''', params)
+
+    found = []
+    for (uid, pattern), rows in groupby(cursor.fetchall(), key=lambda r: (r[0], r[1])):
+        if not pattern:
+            continue
+        rows = list(rows)
+        schedule = detect_schedule([r[2:] for r in rows], today)
+        if schedule:
+            latest = rows[-1]
+            found.append((
+                uid, pattern, latest[4], latest[5], latest[6], latest[7],
+                schedule['amount'], schedule['period'], schedule['interval_days'],
+                schedule['occurrences'], schedule['last_date'], schedule['next_due'],
+                schedule['anchor_day']
+            ))
+
+    # Keep next_due of known schedules that are already ahead (materialized)
+    cursor.executemany('''
+        INSERT INTO recurring_expenses
+            (user_id, pattern_key, description, merchant, category, payment_method,
+             amount, period, interval_days, occurrences, last_date, next_due, anchor_day)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, pattern_key) DO UPDATE SET
+            amount = excluded.amount,
+            period = excluded.period,
+            interval_days = excluded.interval_days,
+            occurrences = excluded.occurrences,
+            last_date = excluded.last_date,
+            anchor_day = excluded.anchor_day,
+            next_due = MAX(next_due, excluded.next_due)
+    ''', found)
+    return len(found)
+
+
+def list_schedules(cursor, user_id):
+    cursor.execute('''
+        SELECT id, description, merchant, category, payment_method, amount, period,
+               interval_days, occurrences, last_date, next_due, active
+        FROM recurring_expenses
+        WHERE user_id = ?
+        ORDER BY next_due
+    ''', (user_id,))
+    columns = ['id', 'description', 'merchant', 'category', 'payment_method', 'amount', 'period',
+               'interval_days', 'occurrences', 'last_date', 'next_due', 'active']
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def set_active(cursor, user_id, schedule_id, active):
+    cursor.execute('UPDATE recurring_expenses SET active = ? WHERE id = ? AND user_id = ?',
+                   (1 if active else 0, schedule_id, user_id))
+    return cursor.rowcount
+
+
+def materialize_due(db, today=None):
+    """Insert every due occurrence of every active schedule in one transaction"""
+    today = (today or date.today()).isoformat()
+
+    def materialize(cursor):
+        # Selected inside the write transaction, so workers never double-insert
+        cursor.execute('''
+            SELECT id, user_id, pattern_key, description, merchant, category, payment_method,
+                   amount, period, interval_days, next_due, anchor_day
+            FROM recurring_expenses
+            WHERE active = 1 AND next_due <= ?
+        ''', (today,))
+        schedules = cursor.fetchall()
+
+        created = 0
+        for (schedule_id, user_id, pattern, description, merchant, category, payment_method,
+             amount, period, interval_days, next_due, anchor_day) in schedules:
+            tolerance = next(t for name, _, t in PERIODS if name == period)
+            due = datetime.strptime(next_due, '%Y-%m-%d').date()
+            last = None
+            added = 0
+            for _ in range(MAX_CATCH_UP):
+                if due.isoformat() > today:
+                    break
+
+                # Already entered by hand around the due date
+                cursor.execute(f'''
+                    SELECT 1 FROM expenses
+                    WHERE user_id = ? AND date BETWEEN ? AND ? AND {PATTERN_SQL} = ?
+                    LIMIT 1
+                ''', (user_id, (due - timedelta(days=tolerance)).isoformat(),
+                      (due + timedelta(days=tolerance)).isoformat(), pattern))
+                if cursor.fetchone():
+                    due = next_occurrence(due, period, interval_days, anchor_day)
+                    continue
+
+                expense = db.prepare_expense(user_id, {
+                    'amount': amount,
+                    'description': description,
+                    'merchant': merchant or '',
+                    'category': category,
+                    'payment_method': payment_method or 'Cash',
+                    'date': due.isoformat(),
+                    'time': '00:00:00'
+                })
+                db._insert_expense_row(cursor, user_id, expense)
+                added += 1
+                last = due
+                due = next_occurrence(due, period, interval_days, anchor_day)
+
+            # Skip anything older than the catch-up window
+            while due.isoformat() <= today:
+                due = next_occurrence(due, period, interval_days, anchor_day)
+
+            cursor.execute('''
+                UPDATE recurring_expenses
+                SET next_due = ?, last_date = COALESCE(?, last_date),
+                    occurrences = occurrences + ?
+                WHERE id = ?
+            ''', (due.isoformat(), last.isoformat() if last else None, added, schedule_id))
+            created += added
+        return created
+
+    return db.writer.execute(materialize)
+
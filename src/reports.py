@@ -0,0 +1,280 @@
+# Monthly spending reports for every user, generated in batch.
+# Each report covers one calendar month: totals per category, essential
+# vs non-essential spending, and the trend against the previous months
+# (REPORT_HISTORY_MONTHS). They are built from the daily rollup and the
+# archived monthly totals, never from expenses, and stored as JSON in the
+# `reports` table of the user's database file.
+#
+# Users are split into chunks of consecutive ids. A process pool builds
+# the reports of one chunk per task (each worker reads its chunk over its
+# own read-only connection), and the parent stores every finished chunk
+# in one transaction. Stored reports carry the user's data version, so a
+# run only builds reports that are missing or out of date: an interrupted
+# run resumes where it stopped, and a rerun after new expenses only
+# rebuilds the users who changed.
+#
+#     python src/reports.py generate [--month 2026-09] [--workers 8] [--chunk-size 200]
+#     python src/reports.py show --user 1 [--month 2026-09]
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+REPORT_HISTORY_MONTHS = int(os.environ.get('REPORT_HISTORY_MONTHS', '6'))
+CHUNK_SIZE = 200
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            data_version INTEGER NOT NULL,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            report TEXT NOT NULL,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    ''')
+
+
+def shift_month(month, offset):
+    """'YYYY-MM' moved by `offset` months"""
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + offset
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def previous_month(today=None):
+    return shift_month((today or date.today()).isoformat()[:7], -1)
+
+
+def _change(current, base):
+    """Percent change, None without a base"""
+    return round((current - base) / base * 100, 1) if base else None
+
+
+def build_report(month, history, rows, names):
+    """Report of one user for `month` from (month, category_id, is_essential, total, count) rows"""
+    months = [shift_month(month, offset) for offset in range(-history, 1)]
+    position = {m: i for i, m in enumerate(months)}
+    totals = [0.0] * len(months)
+    by_category = {}  # {name: [totals per month, count this month]}
+    essential = [0.0, 0.0]
+    count = 0
+    for row_month, category_id, is_essential, total, row_count in rows:
+        i = position.get(row_month)
+        if i is None:
+            continue
+        totals[i] += total
+        name = names.get(category_id, 'Other')
+        entry = by_category.setdefault(name, [[0.0] * len(months), 0])
+        entry[0][i] += total
+        if row_month == month:
+            entry[1] += row_count
+            essential[1 if is_essential else 0] += total
+            count += row_count
+
+    total = totals[-1]
+    previous = totals[:-1]
+    previous_average = sum(previous) / len(previous) if previous else 0
+    categories = []
+    for name, (category_totals, category_count) in by_category.items():
+        category_average = sum(category_totals[:-1]) / history if history else 0
+        categories.append({
+            'category': name,
+            'total': round(category_totals[-1], 2),
+            'count': category_count,
+            'share': round(category_totals[-1] / total * 100, 1) if total else 0,
+            'previous_average': round(category_average, 2),
+            'change_vs_average': _change(category_totals[-1], category_average)
+        })
+    categories.sort(key=lambda c: (-c['total'], c['category']))
+
+    return {
+        'month': month,
+        'total': round(total, 2),
+        'count': count,
+        'categories': categories,
+        'essential': {
+            'essential': round(essential[1], 2),
+            'non_essential': round(essential[0], 2),
+            'essential_share': round(essential[1] / total * 100, 1) if total else 0
+        },
+        'trend': {
+            'months': months,
+            'totals': [round(t, 2) for t in totals],
+            'previous_average': round(previous_average, 2),
+            'change_vs_previous_month': _change(total, previous[-1]) if previous else None,
+            'change_vs_average': _change(total, previous_average)
+        }
+    }
+
+
+def build_chunk(db_path, month, history, user_ids):
+    """Reports of a chunk of users (sorted ids), run in a worker process: [(user_id, json)]"""
+    first, last = user_ids[0], user_ids[-1]
+    start = shift_month(month, -history)
+    conn = sqlite3.connect(Path(db_path).absolute().as_uri() + '?mode=ro', uri=True)
+    try:
+        # Sorted ids: one primary-key range per table (up-to-date users in between are dropped)
+        cursor = conn.execute('''
+            SELECT user_id, substr(day, 1, 7), category_id, is_essential, SUM(total), SUM(count)
+            FROM daily_rollup
+            WHERE user_id BETWEEN ? AND ? AND day >= ? AND day < ?
+            GROUP BY 1, 2, 3, 4
+            UNION ALL
+            SELECT user_id, month, category_id, is_essential, SUM(total), SUM(count)
+            FROM archived_months
+            WHERE user_id BETWEEN ? AND ? AND month >= ? AND month <= ?
+            GROUP BY 1, 2, 3, 4
+        ''', (first, last, f'{start}-01', f'{shift_month(month, 1)}-01', first, last, start, month))
+        rows = {}
+        for row in cursor:
+            rows.setdefault(row[0], []).append(row[1:])
+        names = {}
+        for user_id, category_id, name in conn.execute(
+                'SELECT user_id, id, name FROM categories WHERE user_id BETWEEN ? AND ?', (first, last)):
+            names.setdefault(user_id, {})[category_id] = name
+    finally:
+        conn.close()
+
+    return [
+        (user_id, json.dumps(build_report(month, history, rows.get(user_id, ()),
+                                          names.get(user_id, {}))))
+        for user_id in user_ids
+    ]
+
+
+def pending_users(cursor, month, history, force=False):
+    """{user_id: data version} of users with spending in the window and no current report"""
+    start = shift_month(month, -history)
+    cursor.execute('''
+        SELECT DISTINCT user_id FROM daily_rollup WHERE day >= ? AND day < ?
+        UNION
+        SELECT DISTINCT user_id FROM archived_months WHERE month >= ? AND month <= ?
+    ''', (f'{start}-01', f'{shift_month(month, 1)}-01', start, month))
+    users = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT user_id, version FROM user_data_versions')
+    versions = dict(cursor.fetchall())
+    done = {}
+    if not force:
+        cursor.execute('SELECT user_id, data_version FROM reports WHERE month = ?', (month,))
+        done = dict(cursor.fetchall())
+    return {user_id: versions.get(user_id, 0) for user_id in sorted(users)
+            if done.get(user_id) != versions.get(user_id, 0)}
+
+
+def store(conn, month, reports, versions):
+    """Save one finished chunk (the checkpoint of the run)"""
+    with conn:
+        conn.executemany('''
+            INSERT INTO reports (user_id, month, data_version, generated_at, report)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ON CONFLICT (user_id, month) DO UPDATE SET
+                data_version = excluded.data_version,
+                generated_at = excluded.generated_at,
+                report = excluded.report
+        ''', [(user_id, month, versions[user_id], report) for user_id, report in reports])
+
+
+def generate(db_paths, month=None, history=REPORT_HISTORY_MONTHS, workers=None,
+             chunk_size=CHUNK_SIZE, force=False, progress=None):
+    """Build and store the reports of every user in `db_paths` for `month` (default: last month).
+
+    Returns {'month', 'users', 'chunks', 'seconds'}.
+    """
+    month = month or previous_month()
+    started = time.perf_counter()
+    connections = {}
+    tasks = []
+    try:
+        for db_path in db_paths:
+            conn = sqlite3.connect(db_path, timeout=60)
+            create_table(conn.cursor())
+            conn.commit()
+            versions = pending_users(conn.cursor(), month, history, force)
+            connections[db_path] = (conn, versions)
+            user_ids = list(versions)
+            tasks += [(db_path, user_ids[i:i + chunk_size]) for i in range(0, len(user_ids), chunk_size)]
+
+        users = 0
+        if tasks:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+                futures = {pool.submit(build_chunk, db_path, month, history, user_ids): db_path
+                           for db_path, user_ids in tasks}
+                for future in as_completed(futures):
+                    conn, versions = connections[futures[future]]
+                    reports = future.result()
+                    store(conn, month, reports, versions)
+                    users += len(reports)
+                    if progress:
+                        progress(users, sum(len(v) for _, v in connections.values()))
+    finally:
+        for conn, _ in connections.values():
+            conn.close()
+    return {'month': month, 'users': users, 'chunks': len(tasks),
+            'seconds': round(time.perf_counter() - started, 2)}
+
+
+def get_report(cursor, user_id, month):
+    cursor.execute('SELECT report, generated_at FROM reports WHERE user_id = ? AND month = ?',
+                   (user_id, month))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(json.loads(row[0]), generated_at=row[1])
+
+
+def database_paths(db_path, shard_count):
+    """Files holding expenses: the shards when sharded, else the database itself"""
+    if shard_count:
+        from shards import shard_paths
+        return shard_paths(db_path, shard_count)
+    return [db_path]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monthly spending reports for every user')
+    parser.add_argument('command', choices=['generate', 'show'])
+    parser.add_argument('--db', default='data/user_expenses.db')
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('EXPENSE_DB_SHARDS', '0')))
+    parser.add_argument('--month', help='YYYY-MM (default: last month)')
+    parser.add_argument('--history', type=int, default=REPORT_HISTORY_MONTHS,
+                        help='previous months in the trend')
+    parser.add_argument('--workers', type=int, help='processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='users per task')
+    parser.add_argument('--force', action='store_true', help='rebuild reports that are up to date')
+    parser.add_argument('--user', type=int)
+    args = parser.parse_args()
+    month = args.month or previous_month()
+    paths = database_paths(args.db, args.shards)
+
+    if args.command == 'generate':
+        # Creates (or upgrades) the schema of every file
+        from database import ExpenseDatabase
+        for path in paths:
+            ExpenseDatabase(path, seed_admin=False)
+
+        def progress(done, total):
+            print(f"\r📄 {done}/{total} users", end='', flush=True)
+
+        result = generate(paths, month, args.history, args.workers, args.chunk_size, args.force, progress)
+        print(f"\n✅ {result['users']} reports for {result['month']} in {result['chunks']} chunks, "
+              f"{result['seconds']}s")
+    else:
+        if args.user is None:
+            parser.error('show needs --user')
+        from shards import ShardRouter
+        path = ShardRouter(paths).shard_path(args.user) if args.shards else paths[0]
+        conn = sqlite3.connect(path)
+        report = get_report(conn.cursor(), args.user, month)
+        conn.close()
+        if report is None:
+            print(f"No report for user {args.user} in {month}")
+            sys.exit(1)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,143 @@
+# Daily rollup of expenses, maintained inside the write transactions.
+# One row per (user, day, category_id, payment_method, merchant, is_essential)
+# holds the sum and count of matching expenses, so any range at any
+# granularity is a primary-key range scan instead of a scan of expenses.
+
+from datetime import date
+
+from categories import UNCATEGORIZED, name_of
+
+GRANULARITIES = {
+    'day': "day",
+    'week': "date(day, 'weekday 0', '-6 days')",  # Monday of the week
+    'month': "substr(day, 1, 7)",
+    'year': "substr(day, 1, 4)"
+}
+
+GROUP_BY_COLUMNS = ('category', 'payment_method', 'merchant', 'is_essential')
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            merchant TEXT NOT NULL,
+            is_essential INTEGER NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, category_id, payment_method, merchant, is_essential)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _key(user_id, expense):
+    return (
+        user_id,
+        expense['date'],
+        expense.get('category_id') or UNCATEGORIZED,
+        expense.get('payment_method') or '',
+        expense.get('merchant') or '',
+        1 if expense.get('is_essential') else 0
+    )
+
+
+def add_expense(cursor, user_id, expense):
+    """Add one expense (dict with date, amount, category_id, ...) to the rollup"""
+    cursor.execute('''
+        INSERT INTO daily_rollup
+            (user_id, day, category_id, payment_method, merchant, is_essential, total, count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT (user_id, day, category_id, payment_method, merchant, is_essential)
+        DO UPDATE SET total = total + excluded.total, count = count + 1
+    ''', _key(user_id, expense) + (expense['amount'],))
+
+
+def remove_expense(cursor, user_id, expense):
+    """Take one expense back out of the rollup"""
+    key = _key(user_id, expense)
+    where = '''user_id = ? AND day = ? AND category_id = ? AND payment_method = ?
+               AND merchant = ? AND is_essential = ?'''
+    cursor.execute(f"UPDATE daily_rollup SET total = total - ?, count = count - 1 WHERE {where}",
+                   (expense['amount'],) + key)
+    cursor.execute(f"DELETE FROM daily_rollup WHERE {where} AND count <= 0", key)
+
+
+def rebuild(cursor, user_id=None):
+    """Recompute the rollup from the expenses table (all users or one)"""
+    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    cursor.execute(f"DELETE FROM daily_rollup {user_filter}", params)
+    cursor.execute(f'''
+        INSERT INTO daily_rollup
+            (user_id, day, category_id, payment_method, merchant, is_essential, total, count)
+        SELECT user_id, date, COALESCE(category_id, {UNCATEGORIZED}), COALESCE(payment_method, ''),
+               COALESCE(merchant, ''), CASE WHEN is_essential THEN 1 ELSE 0 END,
+               SUM(amount), COUNT(*)
+        FROM expenses
+        {user_filter}
+        GROUP BY 1, 2, 3, 4, 5, 6
+    ''', params)
+
+
+def aggregate(cursor, user_id, start, end, granularity='day', group_by=None, archived=None):
+    """Totals per period (and group) for start <= day <= end, both ISO dates.
+
+    archived: (sql, params) of more rows with the daily_rollup columns
+    (archive.rollup_source), added to the rollup's.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    if group_by and group_by not in GROUP_BY_COLUMNS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY_COLUMNS)}")
+
+    bucket = GRANULARITIES[granularity]
+    group_select = f", {group_by}" if group_by else ", NULL"
+    group_clause = f", {group_by}" if group_by else ""
+    if group_by == 'category':
+        # Grouped by id, named once per group
+        group_select = f", COALESCE({name_of()}, '') AS category"
+        group_clause = ", category_id"
+
+    source, params = 'daily_rollup', (user_id, start, end)
+    if archived:
+        archived_sql, archived_params = archived
+        source = f"(SELECT * FROM daily_rollup WHERE user_id = ? AND day >= ? AND day <= ? UNION ALL {archived_sql})"
+        params = params + tuple(archived_params) + params
+
+    # Ordered like the grouping, so SQLite sorts no more than GROUP BY already did
+    cursor.execute(f'''
+        SELECT {bucket} AS period {group_select}, SUM(total), SUM(count)
+        FROM {source}
+        WHERE user_id = ? AND day >= ? AND day <= ?
+        GROUP BY period {group_clause}
+        ORDER BY period {group_clause}
+    ''', params)
+    rows = cursor.fetchall()
+    if group_by == 'category':
+        # Grouped by id, listed by name
+        rows.sort(key=lambda row: (row[0], row[1]))
+
+    return [
+        {
+            'period': period,
+            'group': group,
+            'total': round(total, 2),
+            'count': count
+        }
+        for period, group, total, count in rows
+    ]
+
+
+def month_bounds(day=None):
+    """First day of the month containing `day` and first day of the next month"""
+    day = day or date.today()
+    start = day.replace(day=1)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.isoformat(), end.isoformat()
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+import traceback
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class JobScheduler:
+    """In-process background scheduler for maintenance jobs.
+
+    Every worker process starts one, but only the process holding the
+    lock file runs jobs; the others keep retrying the lock so a new
+    leader takes over when the old one exits.
+    """
+
+    def __init__(self, lock_path='data/scheduler.lock', lock_retry=60):
+        self.lock_path = lock_path
+        self.lock_retry = lock_retry
+        self.jobs = {}
+        self._lock_file = None
+        self._pid = None
+        self._wake = threading.Event()
+
+    def register(self, name, fn, interval, initial_delay=None):
+        """Run fn() every `interval` seconds (first run after initial_delay)"""
+        self.jobs[name] = {
+            'fn': fn,
+            'interval': interval,
+            'next_run': time.time() + (interval if initial_delay is None else initial_delay),
+            'runs': 0,
+            'failures': 0,
+            'running': False,
+            'last_run': None,
+            'last_duration': None,
+            'total_duration': 0.0,
+            'max_duration': 0.0,
+            'last_error': None
+        }
+
+    def job(self, name, interval, initial_delay=None):
+        """Decorator form of register()"""
+        def decorator(fn):
+            self.register(name, fn, interval, initial_delay)
+            return fn
+        return decorator
+
+    # Leader election through an exclusive, non-blocking file lock
+    def _try_lock(self):
+        if self._lock_file:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    @property
+    def is_leader(self):
+        return self._lock_file is not None and self._pid == os.getpid()
+
+    def start(self):
+        """Start the scheduler thread (once per process)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock_file = None  # a lock inherited through fork is not ours
+        thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+        thread.start()
+
+    def run_now(self, name):
+        """Make a job due immediately"""
+        self.jobs[name]['next_run'] = 0
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            if not self._try_lock():
+                time.sleep(self.lock_retry)
+                continue
+
+            now = time.time()
+            for name, job in self.jobs.items():
+                if job['next_run'] <= now:
+                    self._run_job(name, job)
+
+            next_run = min((job['next_run'] for job in self.jobs.values()), default=now + 60)
+            self._wake.wait(max(next_run - time.time(), 0.1))
+            self._wake.clear()
+
+    def _run_job(self, name, job):
+        job['running'] = True
+        started = time.perf_counter()
+        try:
+            job['fn']()
+            job['last_error'] = None
+        except Exception as e:
+            job['failures'] += 1
+            job['last_error'] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Job {name} failed: {e}")
+            traceback.print_exc()
+        finally:
+            duration = time.perf_counter() - started
+            job['running'] = False
+            job['runs'] += 1
+            job['last_run'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            job['last_duration'] = round(duration, 4)
+            job['total_duration'] += duration
+            job['max_duration'] = max(job['max_duration'], duration)
+            job['next_run'] = time.time() + job['interval']
+
+    def metrics(self):
+        """Per-job timing and failure counters"""
+        jobs = {}
+        for name, job in self.jobs.items():
+            jobs[name] = {
+                'interval_seconds': job['interval'],
+                'runs': job['runs'],
+                'failures': job['failures'],
+                'running': job['running'],
+                'last_run': job['last_run'],
+                'last_duration_seconds': job['last_duration'],
+                'avg_duration_seconds': round(job['total_duration'] / job['runs'], 4) if job['runs'] else None,
+                'max_duration_seconds': round(job['max_duration'], 4),
+                'next_run_in_seconds': max(round(job['next_run'] - time.time()), 0),
+                'last_error': job['last_error']
+            }
+        return {'pid': os.getpid(), 'leader': self.is_leader, 'jobs': jobs}
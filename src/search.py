@@ -0,0 +1,203 @@
+# Full-text search over expense descriptions, merchants and locations.
+# expenses_fts is an FTS5 index kept in sync with expenses by triggers.
+# Every row also carries an owner token (u<user_id>), so the user filter
+# is part of the MATCH and only that user's postings are ever read.
+
+import math
+import re
+import sqlite3
+
+import categories
+
+SEARCH_COLUMNS = ('description', 'merchant', 'location')
+RANK_WEIGHTS = (3.0, 2.0, 1.0)
+MAX_RESULTS = 200
+MAX_CANDIDATES = 5000   # matches ranked per query
+
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def create_table(cursor, table='expenses'):
+    """Create the index and its triggers on `table` (expense_rows in compact
+    storage), returns False without FTS5 support"""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5 (
+                description, merchant, location, owner,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4 5 6'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Full-text search unavailable: {e}")
+        return False
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO expenses_fts (rowid, description, merchant, location, owner)
+            VALUES (new.id, new.description, new.merchant, new.location, 'u' || new.user_id);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM expenses_fts WHERE rowid = old.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update
+        AFTER UPDATE OF description, merchant, location, user_id ON {table}
+        BEGIN
+            DELETE FROM expenses_fts WHERE rowid = old.id;
+            INSERT INTO expenses_fts (rowid, description, merchant, location, owner)
+            VALUES (new.id, new.description, new.merchant, new.location, 'u' || new.user_id);
+        END
+    ''')
+    return True
+
+
+def rebuild(cursor):
+    """Re-index every expense (for databases created before search existed)"""
+    cursor.execute("DELETE FROM expenses_fts")
+    cursor.execute('''
+        INSERT INTO expenses_fts (rowid, description, merchant, location, owner)
+        SELECT id, description, merchant, location, 'u' || user_id FROM expenses
+    ''')
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('optimize')")
+
+
+def optimize(cursor):
+    """Merge the index b-trees into one (faster queries after many writes)"""
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('optimize')")
+
+
+def build_query(text, prefix=True):
+    """Turn user input into a safe FTS5 expression.
+
+    "quoted text" is matched as a phrase, every other word as a prefix
+    (unless prefix=False); all parts must match unless joined by OR.
+    """
+    parts = []
+    operator = ' AND '
+    for phrase, word in _TOKEN.findall(text or ''):
+        if word == 'OR':
+            operator = ' OR '
+            continue
+        term = (phrase or word).replace('"', '').strip()
+        if not term:
+            continue
+        quoted = '"' + term + '"'
+        if parts:
+            parts.append(operator)
+        parts.append(quoted + '*' if word and prefix else quoted)
+        operator = ' AND '
+    if not parts:
+        raise ValueError('Search query is empty')
+    return ''.join(parts)
+
+
+def _score(highlighted):
+    # bm25() would read each term's posting list across all users to get
+    # document frequencies; counting marked hits per column stays per user
+    score = 0.0
+    for weight, text in zip(RANK_WEIGHTS, highlighted):
+        hits = text.count('\x01') if text else 0
+        if hits:
+            score += weight * hits / math.sqrt(len(text.split()))
+    return round(score, 4)
+
+
+def search(cursor, user_id, text, start=None, end=None, limit=50, prefix=True):
+    """The user's best matching expenses, optionally within start/end ISO dates"""
+    limit = max(1, min(int(limit), MAX_RESULTS))
+    match = f"owner : \"u{int(user_id)}\" AND {{{' '.join(SEARCH_COLUMNS)}}} : ({build_query(text, prefix)})"
+
+    filters, params = [], [match]
+    if start:
+        filters.append("e.date >= ?")
+        params.append(start)
+    if end:
+        filters.append("e.date <= ?")
+        params.append(end)
+    params.append(MAX_CANDIDATES)
+
+    highlights = ', '.join(f"highlight(expenses_fts, {i}, char(1), char(2))"
+                           for i in range(len(SEARCH_COLUMNS)))
+    cursor.execute(f'''
+        SELECT e.id, e.date, e.time, e.amount, e.description, {categories.name_of('e.category_id')},
+               e.payment_method, e.merchant, e.location, {highlights}
+        FROM expenses_fts
+        JOIN expenses e ON e.id = expenses_fts.rowid
+        WHERE expenses_fts MATCH ? {''.join(' AND ' + f for f in filters)}
+        LIMIT ?
+    ''', params)
+
+    columns = ['id', 'date', 'time', 'amount', 'description', 'category',
+               'payment_method', 'merchant', 'location']
+    results = []
+    for row in cursor.fetchall():
+        result = dict(zip(columns, row))
+        result['score'] = _score(row[len(columns):])
+        results.append(result)
+    # Best score first, newest first among equal scores
+    results.sort(key=lambda r: (r['date'] or '', r['time'] or ''), reverse=True)
+    results.sort(key=lambda r: -r['score'])
+    return results[:limit]
+
+
+def search_like(cursor, user_id, text, start=None, end=None, limit=50):
+    """Fallback for SQLite builds without FTS5 (scans the user's expenses)"""
+    limit = max(1, min(int(limit), MAX_RESULTS))
+    filters, params = [], [user_id]
+    for phrase, word in _TOKEN.findall(text or ''):
+        term = f"%{(phrase or word).lower()}%"
+        filters.append("(lower(description) LIKE ? OR lower(merchant) LIKE ? OR lower(location) LIKE ?)")
+        params.extend([term, term, term])
+    if not filters:
+        raise ValueError('Search query is empty')
+    if start:
+        filters.append("date >= ?")
+        params.append(start)
+    if end:
+        filters.append("date <= ?")
+        params.append(end)
+    params.append(limit)
+
+    cursor.execute(f'''
+        SELECT id, date, time, amount, description, {categories.name_of()},
+               payment_method, merchant, location
+        FROM expenses
+        WHERE user_id = ? AND {' AND '.join(filters)}
+        ORDER BY date DESC, time DESC
+        LIMIT ?
+    ''', params)
+    columns = ['id', 'date', 'time', 'amount', 'description', 'category',
+               'payment_method', 'merchant', 'location']
+    return [dict(zip(columns, row), score=None) for row in cursor.fetchall()]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    # python src/search.py rebuild [db_path]
+    if len(sys.argv) < 2 or sys.argv[1] not in ('rebuild', 'optimize'):
+        print("Usage: python src/search.py rebuild|optimize [db_path]")
+        sys.exit(1)
+
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'data/user_expenses.db'
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    if not create_table(cursor):
+        sys.exit(1)
+    if sys.argv[1] == 'rebuild':
+        rebuild(cursor)
+    else:
+        optimize(cursor)
+    conn.commit()
+    cursor.execute("SELECT COUNT(*) FROM expenses_fts")
+    print(f"✅ Search index {sys.argv[1]} done: {cursor.fetchone()[0]} expenses "
+          f"in {time.perf_counter() - started:.1f}s")
+    conn.close()
@@ -0,0 +1,39 @@
+import os
+import secrets
+
+
+def load_secret_key(key_path='data/.secret_key'):
+    """Load the Flask secret key shared by every worker process.
+
+    SECRET_KEY from the environment wins. Otherwise the key is read from
+    key_path, creating it on first start. The file is published with
+    os.link so workers racing on a fresh deploy all end up with the
+    same key instead of each generating their own.
+    """
+    env_key = os.environ.get('SECRET_KEY')
+    if env_key:
+        return env_key
+
+    if os.path.exists(key_path):
+        with open(key_path) as f:
+            return f.read().strip()
+
+    os.makedirs(os.path.dirname(key_path) or '.', exist_ok=True)
+    tmp_path = f"{key_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp_path, key_path)
+    except FileExistsError:
+        # Another worker won the race - use its key
+        pass
+    except OSError:
+        # Filesystem without hard links
+        if not os.path.exists(key_path):
+            os.replace(tmp_path, key_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with open(key_path) as f:
+        return f.read().strip()
@@ -0,0 +1,403 @@
+# Optional sharded storage (EXPENSE_DB_SHARDS=N).
+# Each user's expenses and derived tables live in one of N SQLite files,
+# so users on different shards never wait for the same write lock and no
+# single file grows without bound. Users and sessions stay in the
+# directory database (the original data/user_expenses.db). A user's shard
+# is chosen by rendezvous hashing on the shard name: stable across
+# restarts and processes, and adding a shard only moves ~1/N of the users.
+#
+# Moving an existing database onto shards, or onto a new shard count, is
+# done offline (app stopped) with:
+#     python src/shards.py rebalance --shards 4
+#     python src/shards.py status --shards 4
+
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import anomaly
+import archive
+import budgets
+import changes
+import rollup
+from database import ExpenseDatabase
+
+# Tables holding per-user rows; everything in them moves with the user
+USER_TABLES = ('expenses', 'categories', 'recurring_expenses', 'idempotency_keys',
+               'user_data_versions', 'daily_rollup', 'category_stats',
+               'monthly_category_totals', 'expense_changes', 'change_log_resets',
+               'category_versions', 'archived_months', 'archive_horizons', 'reports')
+
+# ExpenseDatabase methods taking user_id first, answered by the user's shard
+USER_METHODS = frozenset([
+    'prepare_expense', 'prepare_expenses', 'add_expense', 'add_default_categories',
+    'get_data_version', 'get_expense_history', 'get_expenses_list', 'get_expenses_columnar',
+    'delete_expense', 'update_expense', 'get_changes', 'get_monthly_stats', 'aggregate',
+    'scan_anomalies', 'get_budgets', 'set_budget', 'rename_category', 'get_recurring',
+    'set_recurring_active', 'get_monthly_report',
+    'search_expenses', 'apply_batch'
+])
+# Answered by the directory database
+DIRECTORY_METHODS = frozenset(['hash_password', 'authenticate_user', 'verify_session',
+                               'expire_sessions'])
+
+
+def shard_paths(directory_path, count):
+    """Shard files next to the directory database: data/shards/shard_00.db, ..."""
+    shard_dir = os.path.join(os.path.dirname(directory_path), 'shards')
+    return [os.path.join(shard_dir, f'shard_{i:02d}.db') for i in range(count)]
+
+
+class ShardRouter:
+    """Maps a user_id to one of the shard files (rendezvous hashing)"""
+
+    def __init__(self, paths):
+        if not paths:
+            raise ValueError('At least one shard is required')
+        self.paths = list(paths)
+        # Hash on the file name, not the position, so the list may be reordered
+        self._names = [os.path.basename(path).encode() for path in self.paths]
+
+    def shard_index(self, user_id):
+        key = str(int(user_id)).encode()
+        weights = [hashlib.blake2b(name + b':' + key, digest_size=8).digest() for name in self._names]
+        return weights.index(max(weights))
+
+    def shard_path(self, user_id):
+        return self.paths[self.shard_index(user_id)]
+
+
+class ShardedExpenseDatabase:
+    """ExpenseDatabase over a directory database and N expense shards.
+
+    Each shard is a full ExpenseDatabase with its own writer and readers;
+    per-user calls are forwarded to the user's shard, maintenance runs on
+    every shard.
+    """
+
+    def __init__(self, directory_path, paths):
+        self.router = ShardRouter(paths)
+        for path in self.router.paths:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.directory = ExpenseDatabase(directory_path, seed_admin=False)
+        self.shards = [ExpenseDatabase(path, seed_admin=False) for path in self.router.paths]
+        self.db_path = self.directory.db_path
+        self.expense_db_paths = list(self.router.paths)
+        self.create_default_user()
+
+    def shard(self, user_id):
+        return self.shards[self.router.shard_index(user_id)]
+
+    @property
+    def stores(self):
+        return [self.directory] + self.shards
+
+    def __getattr__(self, name):
+        if name in USER_METHODS:
+            return lambda user_id, *args, **kwargs: getattr(self.shard(user_id), name)(user_id, *args, **kwargs)
+        if name in DIRECTORY_METHODS:
+            return getattr(self.directory, name)
+        raise AttributeError(name)
+
+    # Users live in the directory, their categories in their shard
+    @property
+    def writer(self):
+        return self.directory.writer
+
+    @property
+    def reader(self):
+        return self.directory.reader
+
+    @property
+    def search_available(self):
+        return self.shards[0].search_available
+
+    def create_default_user(self):
+        with self.directory.reader.connect(live=True) as conn:
+            if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+                return
+        if self.create_user('admin', 'admin123', full_name='Administrator')['success']:
+            print("✅ Created default admin user: admin / admin123")
+
+    def create_user(self, username, password, email=None, full_name=None):
+        result = self.directory.create_user(username, password, email, full_name, default_categories=False)
+        if result['success']:
+            self.shard(result['user_id']).add_default_categories(result['user_id'])
+        return result
+
+    @property
+    def classification_cache(self):
+        return self.shards[0].classification_cache
+
+    def classify_expense(self, description, amount):
+        return self.shards[0].classify_expense(description, amount)
+
+    def warmup(self):
+        for store in self.stores:
+            store.warmup()
+
+    # Maintenance, all users of every shard
+    def detect_recurring(self, user_id=None):
+        if user_id is not None:
+            return self.shard(user_id).detect_recurring(user_id)
+        return sum(shard.detect_recurring() for shard in self.shards)
+
+    def materialize_recurring(self):
+        return sum(shard.materialize_recurring() for shard in self.shards)
+
+    def refresh_rollups(self, user_id=None):
+        for shard in ([self.shard(user_id)] if user_id is not None else self.shards):
+            shard.refresh_rollups(user_id)
+
+    def rebuild_category_stats(self, user_id=None):
+        for shard in ([self.shard(user_id)] if user_id is not None else self.shards):
+            shard.rebuild_category_stats(user_id)
+
+    def optimize_search_index(self):
+        for shard in self.shards:
+            shard.optimize_search_index()
+
+    def expire_idempotency_keys(self, *args):
+        return sum(shard.expire_idempotency_keys(*args) for shard in self.shards)
+
+    def purge_change_tombstones(self, *args):
+        return sum(shard.purge_change_tombstones(*args) for shard in self.shards)
+
+    def archive_expenses(self, *args):
+        return sum(shard.archive_expenses(*args) for shard in self.shards)
+
+    def optimize(self, analyze=False):
+        for store in self.stores:
+            store.optimize(analyze)
+
+    def vacuum(self):
+        for store in self.stores:
+            store.vacuum()
+
+    def checkpoint_wal(self):
+        return {store.db_path: store.checkpoint_wal() for store in self.stores}
+
+    # Admin reporting
+    def usage_summary(self, months=12):
+        """usage_summary of every file (queried in parallel), merged, plus per-shard totals"""
+        with ThreadPoolExecutor(max_workers=len(self.stores)) as pool:
+            summaries = list(pool.map(lambda store: store.usage_summary(months), self.stores))
+
+        merged = merge_summaries(summaries)
+        merged['shards'] = [
+            {
+                'path': store.db_path,
+                'active_users': summary['active_users'],
+                'expenses': summary['expenses'],
+                'total': round(summary['total'], 2),
+                'size_bytes': os.path.getsize(store.db_path),
+                'writer': store.writer.stats
+            }
+            for store, summary in zip(self.stores, summaries)
+        ]
+        return merged
+
+
+def merge_summaries(summaries):
+    """Add up usage_summary results of several database files"""
+    merged = {'registered_users': 0, 'active_users': 0, 'expenses': 0, 'archived_expenses': 0,
+              'total': 0, 'by_month': {}, 'by_category': {}}
+    for summary in summaries:
+        for key in ('registered_users', 'active_users', 'expenses', 'archived_expenses', 'total'):
+            merged[key] += summary[key]
+        for group in ('by_month', 'by_category'):
+            for name, values in summary[group].items():
+                entry = merged[group].setdefault(name, {'total': 0, 'count': 0})
+                entry['total'] += values['total']
+                entry['count'] += values['count']
+
+    merged['total'] = round(merged['total'], 2)
+    for group in ('by_month', 'by_category'):
+        merged[group] = {name: {'total': round(values['total'], 2), 'count': values['count']}
+                         for name, values in sorted(merged[group].items())}
+    return merged
+
+
+# Rebalancing
+def _columns(cursor, schema, table):
+    cursor.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def stored_users(cursor, schema='main'):
+    """Users owning any rows in a database file"""
+    cursor.execute(f'''
+        SELECT user_id FROM {schema}.expenses
+        UNION SELECT user_id FROM {schema}.categories
+        UNION SELECT user_id FROM {schema}.recurring_expenses
+        UNION SELECT user_id FROM {schema}.idempotency_keys
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def move_user(cursor, user_id):
+    """Move every row of a user from the attached `src` database into main.
+
+    Runs inside the caller's transaction. Rows get new ids in main (it may
+    already hold other users' rows with the same ids), so the user's sync
+    clients are told to reset and fetch everything again.
+    """
+    cursor.execute("SELECT seq FROM src.sqlite_sequence WHERE name = 'expense_changes'")
+    row = cursor.fetchone()
+    changes.adopt_user(cursor, user_id, row[0] if row else 0)
+
+    # Names and patterns are unique per user; rows already in main win
+    for table in ('categories', 'recurring_expenses'):
+        columns = [c for c in _columns(cursor, 'src', table) if c != 'id']
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO main.{table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM src.{table} WHERE user_id = ?
+        ''', (user_id,))
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM main.expenses")
+    last_id = cursor.fetchone()[0]
+    columns = [c for c in _columns(cursor, 'src', 'expenses')
+               if c != 'id' and c in _columns(cursor, 'main', 'expenses')]
+    # Category ids differ between files, matched by name
+    values = [c if c != 'category_id' else '''(
+                  SELECT m.id FROM main.categories m JOIN src.categories s ON s.name = m.name
+                  WHERE s.id = e.category_id AND m.user_id = e.user_id)''' for c in columns]
+    cursor.execute(f'''
+        INSERT INTO main.expenses ({', '.join(columns)})
+        SELECT {', '.join(values)} FROM src.expenses e WHERE user_id = ? ORDER BY id
+    ''', (user_id,))
+    # rowcount stays 0 when main.expenses is a compact-storage view
+    cursor.execute("SELECT COUNT(*) FROM main.expenses WHERE user_id = ? AND id > ?", (user_id, last_id))
+    moved = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO main.expense_changes (user_id, expense_id, op)
+        SELECT user_id, id, 'upsert' FROM main.expenses WHERE user_id = ? AND id > ? ORDER BY id
+    ''', (user_id, last_id))
+    cursor.execute('''
+        INSERT OR IGNORE INTO main.idempotency_keys
+        SELECT * FROM src.idempotency_keys WHERE user_id = ?
+    ''', (user_id,))
+
+    # Derived tables are recomputed from the merged expenses
+    rollup.rebuild(cursor, user_id)
+    budgets.rebuild(cursor, user_id)
+    anomaly.rebuild(cursor, user_id)
+    cursor.execute('''
+        INSERT INTO main.user_data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+
+    for table in USER_TABLES:
+        cursor.execute(f"DELETE FROM src.{table} WHERE user_id = ?", (user_id,))
+    return moved
+
+
+def rebalance(directory_path, count, dry_run=False):
+    """Move every user to the shard the router assigns for `count` shards.
+
+    Sources are the directory database (a single-file install) and any
+    existing shard file, including shards beyond `count`. Each user moves
+    in one transaction over both files (rollback journal during the move,
+    WAL transactions are not atomic across attached databases). Archived
+    expenses of a moving user go back into the source's expenses first and
+    move with the rest; the next archive run archives them on the target.
+    """
+    router = ShardRouter(shard_paths(directory_path, count))
+    # Creates (or upgrades) the schema of every file involved
+    ExpenseDatabase(directory_path)
+    for path in router.paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ExpenseDatabase(path, seed_admin=False)
+
+    shard_dir = os.path.dirname(router.paths[0])
+    sources = [directory_path] + sorted(glob.glob(os.path.join(shard_dir, 'shard_*.db')))
+    report = {'users_moved': 0, 'expenses_moved': 0, 'moves': []}
+
+    for source in sources:
+        conn = sqlite3.connect(source)
+        users = stored_users(conn.cursor())
+        conn.close()
+
+        plan = {}
+        for user_id in users:
+            target = router.shard_path(user_id)
+            if os.path.abspath(target) != os.path.abspath(source):
+                plan.setdefault(target, []).append(user_id)
+
+        for target, user_ids in plan.items():
+            if dry_run:
+                report['moves'].append({'from': source, 'to': target, 'users': len(user_ids)})
+                report['users_moved'] += len(user_ids)
+                continue
+            archive.restore_users(source, user_ids)
+            conn = sqlite3.connect(target, isolation_level=None, timeout=60)
+            cursor = conn.cursor()
+            try:
+                cursor.execute("ATTACH DATABASE ? AS src", (source,))
+                cursor.execute("PRAGMA main.journal_mode = DELETE")
+                cursor.execute("PRAGMA src.journal_mode = DELETE")
+                for user_id in user_ids:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    try:
+                        report['expenses_moved'] += move_user(cursor, user_id)
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+                report['moves'].append({'from': source, 'to': target, 'users': len(user_ids)})
+                report['users_moved'] += len(user_ids)
+            finally:
+                cursor.execute("PRAGMA src.journal_mode = WAL")
+                cursor.execute("PRAGMA main.journal_mode = WAL")
+                cursor.execute("DETACH DATABASE src")
+                conn.close()
+
+    # Shards beyond `count` are left in place once empty
+    report['empty_sources'] = [path for path in sources[1:] if path not in router.paths]
+    return report
+
+
+def status(directory_path, count):
+    """Users and expenses per file, and users not on their assigned shard"""
+    router = ShardRouter(shard_paths(directory_path, count))
+    shard_dir = os.path.dirname(router.paths[0])
+    rows = []
+    for path in [directory_path] + sorted(set(router.paths) | set(glob.glob(os.path.join(shard_dir, 'shard_*.db')))):
+        if not os.path.exists(path):
+            rows.append((path, 0, 0, 0, 0))
+            continue
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        users = stored_users(cursor)
+        expenses = cursor.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+        misplaced = sum(1 for user_id in users
+                        if os.path.abspath(router.shard_path(user_id)) != os.path.abspath(path))
+        conn.close()
+        rows.append((path, len(users), expenses, misplaced, os.path.getsize(path)))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move users between the directory database and shards')
+    parser.add_argument('command', choices=['rebalance', 'status'])
+    parser.add_argument('--db', default='data/user_expenses.db', help='directory database')
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('EXPENSE_DB_SHARDS', '0')))
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error('--shards (or EXPENSE_DB_SHARDS) must be at least 1')
+
+    if args.command == 'rebalance':
+        report = rebalance(args.db, args.shards, args.dry_run)
+        for move in report['moves']:
+            print(f"{'Would move' if args.dry_run else 'Moved'} {move['users']} users: {move['from']} -> {move['to']}")
+        print(f"✅ {report['users_moved']} users, {report['expenses_moved']} expenses moved")
+        for path in report['empty_sources']:
+            print(f"🗑️ {path} is no longer used and can be deleted")
+    else:
+        print(f"{'file':<40} {'users':>7} {'expenses':>10} {'misplaced':>10} {'size':>12}")
+        for path, users, expenses, misplaced, size in status(args.db, args.shards):
+            print(f"{path:<40} {users:>7} {expenses:>10} {misplaced:>10} {size:>12,}")
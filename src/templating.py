@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+import time
+
+from flask import before_render_template, has_request_context, template_rendered
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader
+
+# Whitespace is significant inside these, leave them untouched
+_PRESERVE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2>)', re.S | re.I)
+_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.S)
+_LINE_BREAK = re.compile(r'[ \t]*\n\s*')
+
+
+def minify_html(source):
+    """Drop HTML comments and indentation; a line break still separates words"""
+    parts = _PRESERVE.split(source)
+    out = []
+    # split() yields [text, block, tag name, text, block, tag name, ...]
+    for i in range(0, len(parts), 3):
+        out.append(_LINE_BREAK.sub('\n', _COMMENT.sub('', parts[i])))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return ''.join(out).strip() + '\n'
+
+
+class TemplateMetrics:
+    """Load (compile or bytecode cache) and render timings per template"""
+
+    def __init__(self):
+        self.templates = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        entry = self.templates.get(name)
+        if entry is None:
+            with self._lock:
+                entry = self.templates.setdefault(name, {
+                    'loads': 0, 'loads_during_request': 0, 'load_seconds': 0.0,
+                    'renders': 0, 'render_seconds': 0.0, 'max_render_seconds': 0.0
+                })
+        return entry
+
+    def record_load(self, name, seconds):
+        entry = self._entry(name)
+        entry['loads'] += 1
+        entry['load_seconds'] += seconds
+        if has_request_context():
+            # A user request paid for compiling this template
+            entry['loads_during_request'] += 1
+
+    def render_started(self, sender, template, context, **extra):
+        self._local.__dict__.setdefault('started', []).append(time.perf_counter())
+
+    def render_finished(self, sender, template, context, **extra):
+        started = self._local.__dict__.get('started')
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        entry = self._entry(template.name)
+        entry['renders'] += 1
+        entry['render_seconds'] += seconds
+        entry['max_render_seconds'] = max(entry['max_render_seconds'], seconds)
+
+    def snapshot(self):
+        return {
+            name: {
+                'loads': entry['loads'],
+                'loads_during_request': entry['loads_during_request'],
+                'load_ms': round(entry['load_seconds'] * 1000, 3),
+                'renders': entry['renders'],
+                'avg_render_ms': round(entry['render_seconds'] / entry['renders'] * 1000, 3) if entry['renders'] else None,
+                'max_render_ms': round(entry['max_render_seconds'] * 1000, 3)
+            }
+            for name, entry in sorted(self.templates.items())
+        }
+
+
+metrics = TemplateMetrics()
+
+
+class MinifyingLoader(FileSystemLoader):
+    """Template loader that minifies the HTML source before Jinja compiles it"""
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        if template.endswith('.html'):
+            source = minify_html(source)
+        return source, filename, uptodate
+
+    def load(self, environment, name, globals=None):
+        # Called on every miss of the environment's in-memory template cache
+        started = time.perf_counter()
+        try:
+            return super().load(environment, name, globals)
+        finally:
+            metrics.record_load(name, time.perf_counter() - started)
+
+
+def init_app(app, template_dir, cache_dir=None):
+    """Must run before the first render (the Jinja environment is created then)"""
+    options = dict(app.jinja_options, loader=MinifyingLoader(template_dir))
+    if cache_dir:
+        # Compiled templates survive worker restarts
+        os.makedirs(cache_dir, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+    before_render_template.connect(metrics.render_started, app)
+    template_rendered.connect(metrics.render_finished, app)
+    return app
+
+
+def precompile(app):
+    """Load every template now instead of on its first request"""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
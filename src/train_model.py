@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import pandas as pd
+from predict import MODEL_PATH
+from categories import name_of
+from compiled_model import COMPILED_PATH, CompiledTree, export_pipeline, file_digest, verify
+
+CATEGORICAL_FEATURES = ['category', 'subcategory', 'payment_method', 'merchant', 'location']
+NUMERICAL_FEATURES = ['amount', 'is_weekend', 'is_month_end', 'day_of_week',
+                      'month', 'day_of_month', 'is_large_expense']
+
+MIN_TRAINING_ROWS = 200
+
+
+def load_training_data(db_paths):
+    """Labelled expenses from the database (or every shard) with the notebook's features"""
+    if isinstance(db_paths, str):
+        db_paths = [db_paths]
+    # Stored columns; the category name comes from the categories table
+    columns = [f"{name_of()} AS category" if c == 'category' else c
+               for c in CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+               if c not in ('day_of_month', 'is_large_expense')]
+    frames = []
+    for db_path in db_paths:
+        conn = sqlite3.connect(db_path)
+        try:
+            frames.append(pd.read_sql_query(f'''
+                SELECT date, {', '.join(columns)}, is_essential
+                FROM expenses
+                WHERE is_essential IS NOT NULL
+            ''', conn))
+        finally:
+            conn.close()
+    # Empty shards would only muddle the column dtypes
+    df = pd.concat([frame for frame in frames if len(frame)] or frames, ignore_index=True)
+
+    df['day_of_month'] = pd.to_datetime(df['date']).dt.day
+    df['is_large_expense'] = (df['amount'] > df['amount'].quantile(0.75)).astype(int)
+    return df
+
+
+def build_pipeline(max_depth=3):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+
+    categorical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
+    ])
+    numerical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', numerical_transformer, NUMERICAL_FEATURES),
+        ('cat', categorical_transformer, CATEGORICAL_FEATURES)
+    ])
+    return Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', DecisionTreeClassifier(max_depth=max_depth, random_state=42))
+    ])
+
+
+def train_model(db_paths, model_path=MODEL_PATH, compiled_path=COMPILED_PATH, min_rows=MIN_TRAINING_ROWS):
+    """Retrain the essential/non-essential classifier and swap it in atomically.
+
+    Returns training metrics, or None when there is not enough data.
+    """
+    import joblib
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+
+    df = load_training_data(db_paths)
+    y = df['is_essential'].astype(int)
+    if len(df) < min_rows or y.nunique() < 2:
+        return None
+
+    X = df[CATEGORICAL_FEATURES + NUMERICAL_FEATURES]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    pipeline = build_pipeline()
+    pipeline.fit(X_train, y_train)
+    accuracy = accuracy_score(y_test, pipeline.predict(X_test))
+
+    # Refit on everything, then replace the file in one step
+    pipeline.fit(X, y)
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    joblib.dump(pipeline, tmp_path)
+
+    # The sklearn-free export served by predict.load_model, checked against the pipeline
+    compiled_tmp = f"{compiled_path}.{os.getpid()}.tmp.npz"
+    export_pipeline(pipeline, compiled_tmp, source_digest=file_digest(tmp_path))
+    mismatches = verify(pipeline, CompiledTree(compiled_tmp), X)
+    if len(mismatches):
+        os.remove(tmp_path)
+        os.remove(compiled_tmp)
+        raise RuntimeError(f"compiled model disagrees with the pipeline on {len(mismatches)} rows")
+    os.replace(tmp_path, model_path)
+    os.replace(compiled_tmp, compiled_path)
+
+    return {'rows': len(df), 'test_accuracy': round(float(accuracy), 4), 'model_path': model_path}
+
+
+if __name__ == '__main__':
+    import sys
+    # One database, or every shard file
+    db_paths = sys.argv[1:] or ['data/user_expenses.db']
+    result = train_model(db_paths)
+    if result:
+        print(f"✅ Model retrained on {result['rows']} expenses "
+              f"(test accuracy {result['test_accuracy']:.2%})")
+    else:
+        print(f"⚠️ Need at least {MIN_TRAINING_ROWS} labelled expenses to retrain")
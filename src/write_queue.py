@@ -0,0 +1,169 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    """Single writer thread that group-commits database mutations.
+
+    Callers hand over a function taking a cursor. The writer drains
+    whatever is queued, runs each function in its own SAVEPOINT inside
+    one transaction, commits once and then wakes every caller of the
+    batch. One fsync is shared by the whole batch and writers never
+    fight each other for the SQLite lock inside a process.
+
+    If the writer thread dies, every write still queued fails instead of
+    waiting forever, and the next execute() starts a new writer. Callers
+    wait at most `timeout` seconds; a write that times out may still
+    commit later.
+    """
+
+    def __init__(self, db_path, max_batch=128, max_wait=0.0, enabled=True, timeout=120):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.timeout = timeout
+        self.stats = {'batches': 0, 'writes': 0, 'failed': 0, 'largest_batch': 0}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None,
+                               check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        # Safe with WAL: a crash can lose the last commits but never corrupts
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so restart the writer in each worker
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid == os.getpid():
+                # Writes queued while the dead writer was exiting
+                self._fail_pending(self._queue, RuntimeError("Database writer thread stopped"))
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name='expense-db-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def execute(self, fn):
+        """Run fn(cursor) in a write transaction and return its result once committed"""
+        if not self.enabled:
+            return self._execute_direct(fn)
+
+        self._ensure_started()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("WriteQueue.execute called from the writer thread")
+
+        future = Future()
+        self._queue.put((fn, future))
+        return future.result(timeout=self.timeout)
+
+    def _execute_direct(self, fn):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            result = fn(cursor)
+            cursor.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        pending = self._queue  # replaced only once this thread is dead
+        conn = None
+        batch = []
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            while True:
+                batch = self._next_batch()
+                self._commit_batch(conn, cursor, batch)
+        except BaseException as e:
+            if conn is not None:
+                # Rolls back a transaction left open, or the next writer waits on its lock
+                conn.close()
+            error = RuntimeError("Database writer thread stopped")
+            error.__cause__ = e
+            for fn, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            self._fail_pending(pending, error)
+            raise
+
+    @staticmethod
+    def _fail_pending(pending, error):
+        while True:
+            try:
+                fn, future = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.done():
+                future.set_exception(error)
+
+    def _commit_batch(self, conn, cursor, batch):
+        outcomes = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                cursor.execute("SAVEPOINT write_op")
+                try:
+                    result = fn(cursor)
+                    cursor.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    # Undo only this caller's changes, keep the rest of the batch
+                    cursor.execute("ROLLBACK TO write_op")
+                    cursor.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+            cursor.execute("COMMIT")
+        except Exception as e:
+            try:
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            self.stats['failed'] += len(batch)
+            for fn, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats['batches'] += 1
+        self.stats['writes'] += len(batch)
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+        for future, result, error in outcomes:
+            if error is not None:
+                self.stats['failed'] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
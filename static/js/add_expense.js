@@ -0,0 +1,209 @@
+    document.addEventListener('DOMContentLoaded', function() {
+        // Check if user is logged in
+        fetch('/api/check-session')
+            .then(response => response.json())
+            .then(data => {
+                if (!data.logged_in) {
+                    window.location.href = '/login';
+                }
+            })
+            .catch(() => {
+                // If API fails, still show the page
+            });
+    });
+
+    document.getElementById('expenseForm').addEventListener('submit', async (e) => {
+e.preventDefault();
+
+    const expenseData = {
+        amount: parseFloat(document.getElementById('amount').value),
+        description: document.getElementById('description').value,
+        payment_method: document.getElementById('payment_method').value
+    };
+
+    // Add optional fields
+    const category = document.getElementById('category').value;
+    const merchant = document.getElementById('merchant').value;
+    const location = document.getElementById('location').value;
+
+    if (category) expenseData.category = category;
+    if (merchant) expenseData.merchant = merchant;
+    if (location) expenseData.location = location;
+
+});
+    document.getElementById('expenseForm').addEventListener('submit', async (e) => {
+        e.preventDefault();
+
+        const submitBtn = document.getElementById('submitBtn');
+        const originalText = submitBtn.innerHTML;
+
+        // Show loading
+        submitBtn.innerHTML = '<span class="loader"></span> Saving...';
+        submitBtn.disabled = true;
+
+        const amount = document.getElementById('amount').value;
+        const description = document.getElementById('description').value;
+        const paymentMethod = document.getElementById('payment_method').value;
+
+        if (!amount || !description || !paymentMethod) {
+            showAlert('Please fill all required fields', 'danger');
+            submitBtn.innerHTML = originalText;
+            submitBtn.disabled = false;
+            return;
+        }
+
+        const expenseData = {
+            amount: parseFloat(amount),
+            description: description,
+            payment_method: paymentMethod
+        };
+
+        try {
+            const response = await fetch('/api/add', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(expenseData)
+            });
+
+            const result = await response.json();
+
+            if (result.success) {
+                // Show AI analysis
+                const analysis = result.prediction;
+                document.getElementById('analysisResult').innerHTML = `
+                    <div class="alert alert-success border-0">
+                        <div class="d-flex align-items-center mb-2">
+                            <i class="fas fa-check-circle fa-2x me-3 text-success"></i>
+                            <div>
+                                <h5 class="fw-bold mb-0">✅ Expense Saved!</h5>
+                                <small class="text-muted">AI analyzed successfully</small>
+                            </div>
+                        </div>
+                        <hr>
+                        <div class="row">
+                            <div class="col-6">
+                                <div class="text-center p-2">
+                                    <div class="badge bg-primary p-2 mb-2">Category</div>
+                                    <p class="fw-bold mb-0">${analysis.predicted_category}</p>
+                                </div>
+                            </div>
+                            <div class="col-6">
+                                <div class="text-center p-2">
+                                    <div class="badge ${analysis.is_essential ? 'bg-success' : 'bg-warning'} p-2 mb-2">
+                                        ${analysis.is_essential ? 'Essential' : 'Non-essential'}
+                                    </div>
+                                    <p class="fw-bold mb-0">${analysis.is_essential ? '✅ Need' : '⚠️ Want'}</p>
+                                </div>
+                            </div>
+                        </div>
+                        <div class="mt-3">
+                            <p class="mb-2"><i class="fas fa-brain text-primary"></i> <strong>AI Confidence:</strong> ${(analysis.confidence * 100).toFixed(1)}%</p>
+                            <p class="mb-0"><i class="fas fa-bell text-warning"></i> ${analysis.alert[0]}</p>
+                        </div>
+                    </div>
+                `;
+
+                // Show success message
+                showAlert('Expense added successfully! Redirecting...', 'success');
+
+                // Clear form
+                document.getElementById('expenseForm').reset();
+
+                // Redirect after 2 seconds
+                setTimeout(() => {
+                    window.location.href = '/dashboard';
+                }, 2000);
+
+            } else {
+                document.getElementById('analysisResult').innerHTML = `
+                    <div class="alert alert-danger">
+                        <i class="fas fa-exclamation-triangle"></i>
+                        <strong>Error:</strong> ${result.error || 'Failed to save expense'}
+                    </div>
+                `;
+                showAlert('Failed to save expense', 'danger');
+            }
+
+        } catch (error) {
+            console.error('Error:', error);
+            document.getElementById('analysisResult').innerHTML = `
+                <div class="alert alert-danger">
+                    <i class="fas fa-wifi-slash"></i>
+                    <strong>Network Error:</strong> Please check your connection
+                </div>
+            `;
+            showAlert('Network error. Please try again.', 'danger');
+        } finally {
+            submitBtn.innerHTML = originalText;
+            submitBtn.disabled = false;
+        }
+    });
+
+    function quickAdd(description, amount) {
+        document.getElementById('description').value = description;
+        document.getElementById('amount').value = amount;
+        document.getElementById('payment_method').value = 'Cash';
+
+        // Show preview analysis
+        const analysisDiv = document.getElementById('analysisResult');
+        if (amount > 5000) {
+            analysisDiv.innerHTML = `
+                <div class="alert alert-warning">
+                    <div class="d-flex align-items-center">
+                        <i class="fas fa-exclamation-triangle fa-2x me-3 text-warning"></i>
+                        <div>
+                            <h6 class="fw-bold mb-1">⚠️ Large Expense Detected</h6>
+                            <p class="mb-0 small">This appears to be a significant expense (₹${amount}).</p>
+                        </div>
+                    </div>
+                    <hr class="my-2">
+                    <p class="mb-0 small"><i class="fas fa-lightbulb"></i> Consider if this is essential spending.</p>
+                </div>
+            `;
+        } else {
+            analysisDiv.innerHTML = `
+                <div class="alert alert-info">
+                    <div class="d-flex align-items-center">
+                        <i class="fas fa-clipboard-check fa-2x me-3 text-info"></i>
+                        <div>
+                            <h6 class="fw-bold mb-1">📝 Ready to Save</h6>
+                            <p class="mb-0 small">Click "Save Expense" to add this record.</p>
+                        </div>
+                    </div>
+                    <hr class="my-2">
+                    <p class="mb-0 small">
+                        <i class="fas fa-rupee-sign"></i> <strong>Amount:</strong> ₹${amount}<br>
+                        <i class="fas fa-align-left"></i> <strong>Description:</strong> ${description}
+                    </p>
+                </div>
+            `;
+        }
+    }
+
+    function showAlert(message, type) {
+        const alertDiv = document.createElement('div');
+        alertDiv.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+        alertDiv.style.cssText = `
+            position: fixed;
+            top: 20px;
+            left: 50%;
+            transform: translateX(-50%);
+            z-index: 9999;
+            max-width: 90%;
+            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+        `;
+        alertDiv.innerHTML = `
+            ${message}
+            <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+        `;
+        document.body.appendChild(alertDiv);
+
+        setTimeout(() => {
+            alertDiv.remove();
+        }, 3000);
+    }
+
+    // Auto-focus amount input
+    document.addEventListener('DOMContentLoaded', () => {
+        document.getElementById('amount').focus();
+    });
@@ -0,0 +1,70 @@
+// Charts from the columnar analytics API
+async function loadCharts() {
+    const container = document.getElementById('charts');
+    if (!container) return;
+
+    const response = await fetch('/api/analytics');
+    const data = await response.json();
+    if (!data.total_transactions) return;
+
+    const layout = (title) => ({ title: title, margin: { t: 40, l: 50, r: 20, b: 40 }, height: 320 });
+    const config = { responsive: true, displayModeBar: false };
+
+    Plotly.newPlot('chart-categories', [{
+        type: 'pie', hole: 0.4,
+        labels: data.categories.labels, values: data.categories.totals
+    }], layout('Spending by Category'), config);
+
+    Plotly.newPlot('chart-essential', [{
+        type: 'pie', hole: 0.4,
+        labels: ['Essential', 'Non-essential'],
+        values: [data.essential_split.essential, data.essential_split.non_essential],
+        marker: { colors: ['#10b981', '#f59e0b'] }
+    }], layout('Essential vs Non-essential'), config);
+
+    Plotly.newPlot('chart-trend', [{
+        type: 'scatter', mode: 'lines+markers',
+        x: data.monthly_trend.labels, y: data.monthly_trend.totals
+    }], layout('Monthly Trend (last 12 months)'), config);
+
+    Plotly.newPlot('chart-pivot', data.category_by_month.categories.map((name, i) => ({
+        type: 'bar', name: name,
+        x: data.monthly_trend.labels, y: data.category_by_month.values[i]
+    })), Object.assign(layout('Categories by Month'), { barmode: 'stack' }), config);
+
+    Plotly.newPlot('chart-weekday', [{
+        type: 'bar',
+        x: data.weekday_profile.labels, y: data.weekday_profile.averages
+    }], layout('Average Expense by Weekday'), config);
+
+    Plotly.newPlot('chart-daily', [
+        { type: 'bar', name: 'Daily', x: data.daily.labels, y: data.daily.totals, opacity: 0.4 },
+        { type: 'scatter', mode: 'lines', name: '7-day avg', x: data.daily.labels, y: data.daily.rolling_7 },
+        { type: 'scatter', mode: 'lines', name: '30-day avg', x: data.daily.labels, y: data.daily.rolling_30 }
+    ], layout('Last 90 Days'), config);
+
+    document.getElementById('charts-loading').style.display = 'none';
+    container.style.display = '';
+}
+
+// Add interactive tooltips for ML features
+document.addEventListener('DOMContentLoaded', function() {
+    loadCharts().catch(err => console.error('Chart loading failed:', err));
+
+    // Tooltip for AI badges
+    const aiBadges = document.querySelectorAll('.badge');
+    aiBadges.forEach(badge => {
+        if (badge.textContent.includes('AI') || badge.textContent.includes('ML')) {
+            badge.style.cursor = 'pointer';
+            badge.title = 'This feature uses Machine Learning algorithms to analyze your spending patterns and provide intelligent insights.';
+        }
+    });
+
+    // Show loading animation
+    const loadingEl = document.getElementById('loading');
+    if (loadingEl) {
+        setTimeout(() => {
+            loadingEl.style.display = 'none';
+        }, 1000);
+    }
+});
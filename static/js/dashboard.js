@@ -0,0 +1,310 @@
+// Make it a PWA
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/sw.js', { updateViaCache: 'none' })
+            .then(registration => {
+                console.log('ServiceWorker registered');
+            })
+            .catch(err => {
+                console.log('ServiceWorker registration failed:', err);
+            });
+    });
+}
+
+// Add to Home Screen prompt
+let deferredPrompt;
+window.addEventListener('beforeinstallprompt', (e) => {
+    e.preventDefault();
+    deferredPrompt = e;
+
+    // Show install button
+    setTimeout(() => {
+        if (deferredPrompt && confirm('Install SpendWise for quick access?')) {
+            deferredPrompt.prompt();
+            deferredPrompt.userChoice.then((choiceResult) => {
+                if (choiceResult.outcome === 'accepted') {
+                    console.log('User installed the app');
+                }
+                deferredPrompt = null;
+            });
+        }
+    }, 3000);
+});
+
+// Bottom nav active state
+document.addEventListener('DOMContentLoaded', function() {
+    const currentPage = window.location.pathname;
+    const navItems = document.querySelectorAll('.nav-item');
+
+    navItems.forEach(item => {
+        item.classList.remove('active');
+        const link = item.querySelector('a');
+        if (link.getAttribute('href') === currentPage) {
+            item.classList.add('active');
+        }
+    });
+});
+
+// Show expense details (for future enhancement)
+function showExpenseDetails(id) {
+    alert('Expense details feature coming soon!');
+}
+
+// More options menu
+function showMoreOptions() {
+    const options = `
+        <div class="list-group">
+            <a href="/analytics" class="list-group-item list-group-item-action">
+                <i class="fas fa-chart-pie text-primary"></i> Detailed Reports
+            </a>
+            <a href="#" class="list-group-item list-group-item-action" onclick="shareApp()">
+                <i class="fas fa-share-alt text-success"></i> Share with Friends
+            </a>
+            <a href="#" class="list-group-item list-group-item-action" onclick="exportData()">
+                <i class="fas fa-download text-info"></i> Export Data
+            </a>
+            <a href="/logout" class="list-group-item list-group-item-action">
+                <i class="fas fa-sign-out-alt text-danger"></i> Logout
+            </a>
+            <a href="#" class="list-group-item list-group-item-action" onclick="showAbout()">
+                <i class="fas fa-info-circle text-warning"></i> About
+            </a>
+        </div>
+    `;
+
+    // Create modal
+    const modal = document.createElement('div');
+    modal.className = 'modal fade';
+    modal.innerHTML = `
+        <div class="modal-dialog modal-dialog-centered">
+            <div class="modal-content">
+                <div class="modal-header">
+                    <h5 class="modal-title"><i class="fas fa-cog"></i> More Options</h5>
+                    <button type="button" class="btn-close" data-bs-dismiss="modal"></button>
+                </div>
+                <div class="modal-body">
+                    ${options}
+                </div>
+            </div>
+        </div>
+    `;
+
+    document.body.appendChild(modal);
+    const bsModal = new bootstrap.Modal(modal);
+    bsModal.show();
+
+    modal.addEventListener('hidden.bs.modal', function () {
+        document.body.removeChild(modal);
+    });
+}
+
+// Share app function
+function shareApp() {
+    if (navigator.share) {
+        navigator.share({
+            title: 'SpendWise Expense Tracker',
+            text: 'Track your expenses with AI-powered insights!',
+            url: window.location.href
+        });
+    } else {
+        // Fallback for browsers without Web Share API
+        navigator.clipboard.writeText(window.location.href);
+        alert('Link copied to clipboard! Share it with your friends.');
+    }
+}
+
+// Export data function
+async function exportData() {
+    try {
+        const response = await fetch('/api/expenses');
+        const data = await response.json();
+
+        // Convert to CSV
+        const csv = [
+            ['Date', 'Amount', 'Description', 'Category', 'Payment Method', 'Essential'],
+            ...data.map(expense => [
+                expense.date,
+                expense.amount,
+                expense.description,
+                expense.category,
+                expense.payment_method,
+                expense.is_essential ? 'Yes' : 'No'
+            ])
+        ].map(row => row.join(',')).join('\n');
+
+        // Download file
+        const blob = new Blob([csv], { type: 'text/csv' });
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = 'expenses.csv';
+        a.click();
+
+        alert('Data exported successfully!');
+    } catch (error) {
+        alert('Error exporting data: ' + error.message);
+    }
+}
+
+setInterval(() => {
+    fetch('/api/check-session')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.logged_in) {
+                alert('Session expired. Please login again.');
+                window.location.href = '/login';
+            }
+        });
+}, 300000);
+
+// Show about info
+function showAbout() {
+    alert('SpendWise v1.0\nAI-Powered Expense Tracker\nBuilt with Machine Learning\nShare with friends to track together!');
+}
+
+// Online/offline detection
+window.addEventListener('online', () => {
+    showNotification('Back online! Syncing data...', 'success');
+});
+
+window.addEventListener('offline', () => {
+    showNotification('You are offline. Data will sync when back online.', 'warning');
+});
+
+function showNotification(message, type) {
+    const notification = document.createElement('div');
+    notification.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        z-index: 9999;
+        max-width: 300px;
+    `;
+    notification.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+    document.body.appendChild(notification);
+
+    setTimeout(() => {
+        notification.remove();
+    }, 3000);
+}
+
+// Delete expense function (IMPORTANT: Add this function)
+async function deleteExpense(expenseId) {
+    if (!confirm('Are you sure you want to delete this expense?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/expense/${expenseId}`, {
+            method: 'DELETE',
+            headers: {
+                'Content-Type': 'application/json'
+            }
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Remove the expense item from UI with animation
+            const expenseElement = document.getElementById(`expense-${expenseId}`);
+            if (expenseElement) {
+                expenseElement.style.opacity = '0';
+                expenseElement.style.transform = 'translateX(-100px)';
+                expenseElement.style.transition = 'all 0.3s ease';
+
+                setTimeout(() => {
+                    expenseElement.remove();
+
+                    // Update the transaction count in stats card
+                    const transactionElement = document.querySelector('.icon-trans + h5 + h3.fw-bold');
+                    if (transactionElement) {
+                        const currentCount = parseInt(transactionElement.textContent);
+                        transactionElement.textContent = Math.max(0, currentCount - 1);
+                    }
+
+                    // Update total spent
+                    const totalElement = document.querySelector('.icon-spend + h5 + h3.fw-bold');
+                    if (totalElement) {
+                        const expenseAmount = parseFloat(expenseElement.querySelector('h6.fw-bold').textContent.replace('₹', ''));
+                        const currentTotal = parseFloat(totalElement.textContent.replace('₹', ''));
+                        totalElement.textContent = '₹' + (currentTotal - expenseAmount).toFixed(2);
+                    }
+
+                    // Update badge count
+                    const badgeElement = document.querySelector('.card-header .badge');
+                    if (badgeElement) {
+                        const badgeCount = parseInt(badgeElement.textContent);
+                        badgeElement.textContent = Math.max(0, badgeCount - 1);
+                    }
+
+                    // Show success message with better notification
+                    showCustomNotification('✅ Expense deleted successfully', 'success');
+                }, 300);
+            }
+        } else {
+            alert('Failed to delete: ' + result.error);
+        }
+    } catch (error) {
+        alert('Error deleting expense: ' + error.message);
+    }
+}
+
+// Better notification function
+function showCustomNotification(message, type) {
+    // Remove existing notifications
+    const existing = document.querySelector('.custom-notification');
+    if (existing) existing.remove();
+
+    const notification = document.createElement('div');
+    notification.className = `custom-notification alert alert-${type}`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        z-index: 9999;
+        padding: 15px 20px;
+        border-radius: 10px;
+        box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+        animation: slideIn 0.3s ease;
+    `;
+
+    notification.innerHTML = `
+        <strong>${type === 'success' ? '✅' : '⚠️'}</strong> ${message}
+    `;
+
+    document.body.appendChild(notification);
+
+    // Auto-remove after 3 seconds
+    setTimeout(() => {
+        notification.style.animation = 'slideOut 0.3s ease';
+        setTimeout(() => notification.remove(), 300);
+    }, 3000);
+
+    // Add CSS animations if not already added
+    if (!document.querySelector('#notification-styles')) {
+        const style = document.createElement('style');
+        style.id = 'notification-styles';
+        style.textContent = `
+            @keyframes slideIn {
+                from { transform: translateX(100%); opacity: 0; }
+                to { transform: translateX(0); opacity: 1; }
+            }
+            @keyframes slideOut {
+                from { transform: translateX(0); opacity: 1; }
+                to { transform: translateX(100%); opacity: 0; }
+            }
+        `;
+        document.head.appendChild(style);
+    }
+}
+
+// Auto-refresh data every 60 seconds
+setInterval(() => {
+    if (navigator.onLine) {
+        window.location.reload();
+    }
+}, 60000);
@@ -0,0 +1,52 @@
+document.getElementById('loginForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const btn = document.getElementById('loginBtn');
+    const originalText = btn.innerHTML;
+    btn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Logging in...';
+    btn.disabled = true;
+
+    const username = document.getElementById('username').value;
+    const password = document.getElementById('password').value;
+
+    try {
+        const response = await fetch('/api/login', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ username, password })
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Store login state
+            sessionStorage.setItem('loggedIn', 'true');
+            sessionStorage.setItem('username', username);
+
+            window.location.href = result.redirect || '/dashboard';
+        } else {
+            alert('Login failed: ' + result.error);
+            btn.innerHTML = originalText;
+            btn.disabled = false;
+        }
+    } catch (error) {
+        alert('Network error. Please try again.');
+        btn.innerHTML = originalText;
+        btn.disabled = false;
+    }
+});
+
+// Check if already logged in
+document.addEventListener('DOMContentLoaded', function() {
+    // Try to get session from server
+    fetch('/api/check-session')
+        .then(response => response.json())
+        .then(data => {
+            if (data.logged_in) {
+                window.location.href = '/dashboard';
+            }
+        })
+        .catch(() => {
+            // If API doesn't exist, continue
+        });
+});
@@ -0,0 +1,63 @@
+document.getElementById('registerForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const password = document.getElementById('password').value;
+    const confirmPassword = document.getElementById('confirm_password').value;
+
+    if (password !== confirmPassword) {
+        alert('Passwords do not match!');
+        return;
+    }
+
+    const btn = document.getElementById('registerBtn');
+    const originalText = btn.innerHTML;
+    btn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Creating account...';
+    btn.disabled = true;
+
+    const userData = {
+        username: document.getElementById('username').value,
+        password: password,
+        email: document.getElementById('email').value,
+        full_name: document.getElementById('full_name').value
+    };
+
+    try {
+        const response = await fetch('/api/register', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(userData)
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Store login state
+            sessionStorage.setItem('loggedIn', 'true');
+            sessionStorage.setItem('username', userData.username);
+
+            window.location.href = result.redirect || '/dashboard';
+        } else {
+            alert('Registration failed: ' + result.error);
+            btn.innerHTML = originalText;
+            btn.disabled = false;
+        }
+    } catch (error) {
+        alert('Network error. Please try again.');
+        btn.innerHTML = originalText;
+        btn.disabled = false;
+    }
+});
+
+// Check if already logged in
+document.addEventListener('DOMContentLoaded', function() {
+    fetch('/api/check-session')
+        .then(response => response.json())
+        .then(data => {
+            if (data.logged_in) {
+                window.location.href = '/dashboard';
+            }
+        })
+        .catch(() => {
+            // If API doesn't exist, continue
+        });
+});
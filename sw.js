@@ -1,49 +1,122 @@
 // sw.js - Service Worker for Offline Support
-const CACHE_NAME = 'spendwise-v1';
-const urlsToCache = [
-  '/',
-  '/add',
-  '/analytics',
-  '/static/style.css'
-];
+// Served by the app at /sw.js with the cache version and the precache
+// manifest (content-hashed static URLs) filled in, so every deploy that
+// changes a static file, template or this worker installs a new version.
+const CACHE_VERSION = '__CACHE_VERSION__';
+const PRECACHE_URLS = __PRECACHE_URLS__;
+
+const STATIC_CACHE = `spendwise-static-${CACHE_VERSION}`;
+const PAGES_CACHE = `spendwise-pages-${CACHE_VERSION}`;
+const API_CACHE = 'spendwise-api';
+const CDN_CACHE = 'spendwise-cdn';
+const CURRENT_CACHES = [STATIC_CACHE, PAGES_CACHE, API_CACHE, CDN_CACHE];
+
+const PAGES = ['/dashboard', '/add', '/analytics', '/insights'];
+const NETWORK_FIRST_APIS = ['/api/expenses'];
+// Versioned URLs (bootstrap@5.1.3, plotly-2.24.1, ...), safe to keep
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com', 'cdn.plot.ly',
+                   'fonts.googleapis.com', 'fonts.gstatic.com'];
 
 // Install service worker
 self.addEventListener('install', event => {
   event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then(cache => {
-        console.log('Opened cache');
-        return cache.addAll(urlsToCache);
-      })
-  );
-});
-
-// Fetch resources
-self.addEventListener('fetch', event => {
-  event.respondWith(
-    caches.match(event.request)
-      .then(response => {
-        // Cache hit - return response
-        if (response) {
-          return response;
-        }
-        return fetch(event.request);
-      })
+    caches.open(STATIC_CACHE)
+      .then(cache => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
   );
 });
 
-// Update service worker
+// Drop caches of previous versions
 self.addEventListener('activate', event => {
-  const cacheWhitelist = [CACHE_NAME];
   event.waitUntil(
-    caches.keys().then(cacheNames => {
-      return Promise.all(
-        cacheNames.map(cacheName => {
-          if (cacheWhitelist.indexOf(cacheName) === -1) {
-            return caches.delete(cacheName);
-          }
-        })
-      );
-    })
+    caches.keys()
+      .then(cacheNames => Promise.all(
+        cacheNames
+          .filter(cacheName => !CURRENT_CACHES.includes(cacheName))
+          .map(cacheName => caches.delete(cacheName))
+      ))
+      .then(() => self.clients.claim())
   );
-});
\ No newline at end of file
+});
+
+function isCacheable(response) {
+  // Redirects (e.g. to /login) and errors must never be replayed
+  return response && (response.ok || response.type === 'opaque') && !response.redirected;
+}
+
+// Hashed static files never change: cache first
+function cacheFirst(request, cacheName) {
+  return caches.match(request).then(cached => cached || fetch(request).then(response => {
+    if (isCacheable(response)) {
+      const copy = response.clone();
+      caches.open(cacheName).then(cache => cache.put(request, copy));
+    }
+    return response;
+  }));
+}
+
+// Pages: answer from cache instantly, refresh the copy in the background
+function staleWhileRevalidate(event, cacheName) {
+  const request = event.request;
+  const network = fetch(request).then(response => {
+    if (isCacheable(response)) {
+      const copy = response.clone();
+      event.waitUntil(caches.open(cacheName).then(cache => cache.put(request, copy)));
+    } else if (response.redirected) {
+      // Logged out on the server: forget the page
+      event.waitUntil(caches.open(cacheName).then(cache => cache.delete(request)));
+    }
+    return response;
+  });
+  return caches.open(cacheName).then(cache => cache.match(request)).then(cached => {
+    if (cached) {
+      event.waitUntil(network.catch(() => {}));
+      return cached;
+    }
+    return network;
+  });
+}
+
+// Data: fresh when online, last copy when offline
+function networkFirst(request, cacheName) {
+  return fetch(request).then(response => {
+    if (isCacheable(response)) {
+      const copy = response.clone();
+      caches.open(cacheName).then(cache => cache.put(request, copy));
+    }
+    return response;
+  }).catch(() => caches.open(cacheName)
+    .then(cache => cache.match(request))
+    .then(cached => cached || Response.error()));
+}
+
+// Fetch resources
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+
+  const url = new URL(request.url);
+
+  if (url.origin !== self.location.origin) {
+    if (CDN_HOSTS.includes(url.hostname)) {
+      event.respondWith(cacheFirst(request, CDN_CACHE));
+    }
+    return;
+  }
+
+  if (url.pathname === '/logout') {
+    // Nothing of this user may be shown to the next one
+    event.waitUntil(Promise.all([caches.delete(PAGES_CACHE), caches.delete(API_CACHE)]));
+    return;
+  }
+
+  if (url.pathname.startsWith('/static/')) {
+    event.respondWith(cacheFirst(request, STATIC_CACHE));
+  } else if (NETWORK_FIRST_APIS.includes(url.pathname)) {
+    event.respondWith(networkFirst(request, API_CACHE));
+  } else if (PAGES.includes(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event, PAGES_CACHE));
+  }
+});